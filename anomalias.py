@@ -0,0 +1,147 @@
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import streamlit as st
+from historico_faturas import (
+    obter_indice_transacoes, obter_versao_dados, classificar_transacao,
+    normalizar_estabelecimento, ordinal_mes, mes_do_ordinal
+)
+
+# Meses anteriores usados na faixa móvel de cada categoria
+JANELA_CATEGORIA = 6
+# Mínimo de meses anteriores com fatura para avaliar uma categoria
+MINIMO_MESES = 3
+# Largura da faixa em desvios robustos (MAD escalado)
+LIMITE_DESVIOS = 3.0
+# Desvio mínimo em centavos (R$ 50), para categorias pouco usadas ou muito estáveis
+PISO_DESVIO = 5000
+# Cobrança considerada fora do padrão quando passa deste múltiplo da mediana do estabelecimento
+FATOR_ESTABELECIMENTO = 3.0
+# Cobranças anteriores do estabelecimento usadas na mediana de cada cobrança
+JANELA_ESTABELECIMENTO = 12
+# Mínimo de cobranças anteriores do estabelecimento para comparar com a mediana
+MINIMO_COBRANCAS = 3
+
+def _anomalias_categorias(meses, categorias, valores, meses_com_fatura):
+    """
+    Compara o total de cada categoria em cada mês com a mediana e o MAD dos
+    meses anteriores (janela móvel) e devolve os meses acima da faixa.
+    """
+    nomes, codigos = np.unique(categorias, return_inverse=True)
+    primeiro = int(meses_com_fatura.min())
+    num_meses = int(meses_com_fatura.max()) - primeiro + 1
+
+    # Matriz categoria x mês com os totais, somados em centavos inteiros;
+    # em float só depois, para os meses sem fatura ficarem como NaN
+    somas = np.zeros((len(nomes), num_meses), dtype=np.int64)
+    np.add.at(somas, (codigos, meses - primeiro), valores)
+    totais = somas.astype(float)
+    sem_fatura = np.ones(num_meses, dtype=bool)
+    sem_fatura[meses_com_fatura - primeiro] = False
+    totais[:, sem_fatura] = np.nan
+
+    # Janela com os JANELA_CATEGORIA meses anteriores a cada mês
+    preenchido = np.concatenate([np.full((len(nomes), JANELA_CATEGORIA), np.nan), totais], axis=1)
+    janelas = sliding_window_view(preenchido, JANELA_CATEGORIA, axis=1)[:, :num_meses, :]
+    meses_validos = np.sum(~np.isnan(janelas), axis=2)
+
+    # Janelas formadas só por NaN geram aviso do NumPy; o resultado NaN é o esperado
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        medianas = np.nanmedian(janelas, axis=2)
+        mad = np.nanmedian(np.abs(janelas - medianas[:, :, None]), axis=2)
+
+    # Piso no desvio para categorias muito estáveis (MAD zero)
+    desvio = np.maximum(np.maximum(1.4826 * mad, 0.1 * np.abs(medianas)), PISO_DESVIO)
+    limites = medianas + LIMITE_DESVIOS * desvio
+    acima = (meses_validos >= MINIMO_MESES) & (totais > limites)
+
+    resultado = {}
+    for codigo, indice_mes in zip(*np.nonzero(acima)):
+        ano, mes = mes_do_ordinal(primeiro + int(indice_mes))
+        resultado[(ano, mes, str(nomes[codigo]))] = {
+            'total': float(totais[codigo, indice_mes]),
+            'mediana': float(medianas[codigo, indice_mes]),
+            'limite': float(limites[codigo, indice_mes])
+        }
+    return resultado
+
+def _anomalias_estabelecimentos(registros, estabelecimentos, valores):
+    """
+    Marca as cobranças muito acima da mediana das cobranças anteriores do
+    próprio estabelecimento (janela das JANELA_ESTABELECIMENTO últimas).
+    Os registros chegam em ordem de data, como no índice de transações.
+    """
+    nomes, codigos = np.unique(estabelecimentos, return_inverse=True)
+    # Ordenação estável por estabelecimento: dentro de cada um, segue a ordem de data
+    ordem = np.argsort(codigos, kind='stable')
+    grupos = codigos[ordem]
+    ordenados = valores[ordem].astype(float)
+
+    # Janela com as JANELA_ESTABELECIMENTO cobranças anteriores a cada uma,
+    # descartando as que são de outro estabelecimento
+    preenchido = np.concatenate([np.full(JANELA_ESTABELECIMENTO, np.nan), ordenados])
+    grupos_preenchido = np.concatenate([np.full(JANELA_ESTABELECIMENTO, -1), grupos])
+    janelas = sliding_window_view(preenchido, JANELA_ESTABELECIMENTO)[:len(ordenados)].copy()
+    mesmos = sliding_window_view(grupos_preenchido, JANELA_ESTABELECIMENTO)[:len(ordenados)] == grupos[:, None]
+    janelas[~mesmos] = np.nan
+    anteriores = mesmos.sum(axis=1)
+
+    # Sem cobranças anteriores a janela é só NaN; o resultado NaN é o esperado
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        medianas = np.nanmedian(janelas, axis=1)
+        mad = np.nanmedian(np.abs(janelas - medianas[:, None]), axis=1)
+
+    with np.errstate(all='ignore'):
+        razao = ordenados / medianas
+        escore = (ordenados - medianas) / (1.4826 * mad)
+    fora = (anteriores >= MINIMO_COBRANCAS) & (medianas > 0) & (razao >= FATOR_ESTABELECIMENTO)
+
+    resultado = {}
+    for posicao in np.nonzero(fora)[0]:
+        registro = registros[ordem[posicao]]
+        chave = (registro['ano_fatura'], registro['mes_fatura'], registro['descricao'], registro['valor'])
+        resultado[chave] = {
+            'estabelecimento': str(nomes[grupos[posicao]]),
+            'mediana': float(medianas[posicao]),
+            'razao': float(razao[posicao]),
+            'escore': float(escore[posicao]) if np.isfinite(escore[posicao]) else None
+        }
+    return resultado
+
+def detectar_anomalias(indice):
+    """
+    Detecta meses com gasto acima do normal por categoria e cobranças fora
+    do padrão por estabelecimento, sobre todo o histórico de uma vez. Cada
+    mês e cada cobrança são comparados só com o que veio antes deles.
+
+    Returns:
+        dict: 'categorias' com chaves (ano, mes, categoria) e 'transacoes'
+              com chaves (ano, mes, descricao, valor); valores em centavos
+    """
+    registros = [r for r in indice['transacoes'] if r.get('categoria') != 'ENTRADA']
+    if not registros:
+        return {'categorias': {}, 'transacoes': {}}
+
+    meses = np.array([ordinal_mes(r['ano_fatura'], r['mes_fatura']) for r in registros], dtype=np.int64)
+    valores = np.array([r['valor'] for r in registros], dtype=np.int64)
+    categorias = np.array([r.get('categoria') or classificar_transacao(r['descricao']) for r in registros])
+    estabelecimentos = np.array([normalizar_estabelecimento(r['descricao']) for r in registros])
+    meses_com_fatura = np.array(
+        sorted(ordinal_mes(ano, mes) for ano, mes in indice['faturas_por_mes']), dtype=np.int64
+    )
+
+    return {
+        'categorias': _anomalias_categorias(meses, categorias, valores, meses_com_fatura),
+        'transacoes': _anomalias_estabelecimentos(registros, estabelecimentos, valores)
+    }
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _anomalias_em_cache(versao):
+    """Guarda as anomalias calculadas para uma versão específica dos dados"""
+    return detectar_anomalias(obter_indice_transacoes())
+
+def obter_anomalias():
+    """Retorna as anomalias do histórico, recalculando apenas quando os dados mudam"""
+    return _anomalias_em_cache(obter_versao_dados())
@@ -1,8 +1,4 @@
 import streamlit as st
-import pandas as pd
-import pdfplumber
-import plotly.express as px
-import plotly.graph_objects as go
 import re
 from datetime import datetime, date
 import calendar
@@ -11,24 +7,37 @@ from historico_faturas import (
     calcular_variacao, formatar_variacao,
     limpar_historico, limpar_fatura,
     adicionar_gasto_fixo, remover_gasto_fixo,
-    obter_gastos_fixos, carregar_dados, salvar_dados,
-    adicionar_entrada, remover_entrada, obter_entradas,
+    obter_gastos_fixos, carregar_dados,
+    adicionar_entrada, remover_entrada,
     adicionar_parcela, remover_parcela, marcar_parcela_paga,
     obter_parcelas_mes, calcular_total_parcelas_futuras,
     obter_parcelas_futuras, obter_historico_gastos_mensais,
     obter_historico_categorias, obter_media_gastos_categoria,
-    obter_evolucao_gastos
+    obter_evolucao_gastos, resolver_datas_fatura,
+    obter_versao_dados, SnapshotDados,
+    atualizar_dados, get_user_data_file,
+    para_centavos, para_reais,
+    indice_por_id, localizar_transacao
 )
+from graficos import obter_figura
+from tarefas import iniciar_tarefa, painel_tarefas, acompanhar_tarefa, obter_tarefa
+from envio_faturas import (
+    ler_transacoes_pdf, hash_conteudo, preparar_fatura, duplicadas_atuais, transacoes_para_salvar,
+    preparar_lote, duplicadas_do_lote, assinatura_classificacao
+)
+from exportacao import painel_exportacao
+from perfil import iniciar_rerun, finalizar_rerun, secao, contar, medir_fragmento
+# pandas, Plotly, pdfplumber e os módulos com NumPy (previsao, anomalias, recorrencias)
+# são importados só quando usados, para a tela de login abrir mais rápido
+from dependencias import pandas, plotly_go
 import json
 import yaml
 from yaml.loader import SafeLoader
 import streamlit_authenticator as stauth
 from pathlib import Path
-import time
 import os
 from dateutil.relativedelta import relativedelta
 from collections import defaultdict
-import hashlib
 
 # Lista de categorias padrão
 CATEGORIAS_PADRAO = ["Alimentação", "Transporte", "Entretenimento", "Self Care", "Roupas"]
@@ -148,18 +157,14 @@ def salvar_gastos_fixos(gastos_fixos):
     with open('gastos_fixos.json', 'w') as f:
         json.dump(gastos_fixos, f, indent=4)
 
-def remover_transacao(fatura_mes, fatura_ano, descricao, valor):
-    """Remove uma transação específica da fatura"""
-    dados = carregar_dados()
-    faturas = dados.get('faturas', [])
-    
-    for fatura in faturas:
-        if fatura['mes'] == fatura_mes and fatura['ano'] == fatura_ano:
-            fatura['transacoes'] = [t for t in fatura['transacoes'] 
-                                  if not (t['descricao'] == descricao and abs(t['valor'] - valor) < 0.01)]
-            break
-    
-    salvar_dados(dados)
+def remover_transacao(id_transacao):
+    """Remove uma transação pelo id"""
+    def remover(dados):
+        fatura, posicao = localizar_transacao(dados, id_transacao, indice_por_id(dados, obter_versao_dados()))
+        if fatura is not None:
+            del fatura['transacoes'][posicao]
+
+    atualizar_dados(remover)
 
 def inicializar_classificacoes_base():
     """
@@ -264,22 +269,18 @@ def atualizar_classificacao_salva(descricao, categoria):
     classificacoes[descricao_norm] = categoria
     salvar_classificacoes(classificacoes)
 
-def editar_categoria_transacao(fatura_mes, fatura_ano, descricao, valor, nova_categoria):
+def editar_categoria_transacao(id_transacao, nova_categoria):
     """
-    Edita a categoria de uma transação.
+    Edita a categoria de uma transação, encontrada pelo id.
     """
-    dados = carregar_dados()
-    faturas = dados.get('faturas', [])
-    
-    for fatura in faturas:
-        if fatura['mes'] == fatura_mes and fatura['ano'] == fatura_ano:
-            for transacao in fatura['transacoes']:
-                if transacao['descricao'] == descricao and abs(transacao['valor'] - valor) < 0.01:
-                    transacao['categoria'] = nova_categoria
-                    break
-    
-    salvar_dados(dados)
+    def editar(dados):
+        fatura, posicao = localizar_transacao(dados, id_transacao, indice_por_id(dados, obter_versao_dados()))
+        if fatura is not None:
+            fatura['transacoes'][posicao]['categoria'] = nova_categoria
 
+    atualizar_dados(editar)
+
+@contar
 def classificar_transacao(descricao):
     """
     Classifica automaticamente uma transação com base em sua descrição.
@@ -472,52 +473,74 @@ def classificar_transacao(descricao):
 
 def adicionar_fatura(fatura):
     """Adiciona uma nova fatura ao histórico"""
-    dados = carregar_dados()
-    faturas = dados.get('faturas', [])
-    
-    # Classificar transações e separar entradas de despesas
-    transacoes_despesas = []
-    entradas = dados.get('entradas', [])
-    
-    for transacao in fatura['transacoes']:
-        descricao_lower = transacao['descricao'].lower()
-        
-        # VERIFICAR PRIMEIRO se é estorno/desconto (vai para entradas)
-        if 'estorno' in descricao_lower or 'desconto' in descricao_lower:
-            entrada = {
-                'descricao': transacao['descricao'],
-                'valor': transacao['valor'],
-                'mes': fatura['mes'],
-                'ano': fatura['ano']
-            }
-            entradas.append(entrada)
-        else:
-            # Se não for entrada, classificar normalmente e manter como despesa
-            if 'categoria' not in transacao:
-                transacao['categoria'] = classificar_transacao(transacao['descricao'])
-            transacoes_despesas.append(transacao)
-    
-    # Atualizar a fatura apenas com despesas
-    fatura['transacoes'] = transacoes_despesas
-    dados['entradas'] = entradas
-    
-    # Verificar se já existe uma fatura para este mês/ano
-    for i, f in enumerate(faturas):
-        if f['mes'] == fatura['mes'] and f['ano'] == fatura['ano']:
-            faturas[i] = fatura
-            dados['faturas'] = faturas
-            salvar_dados(dados)
-            return
-    
-    # Se não existe, adicionar nova fatura
-    faturas.append(fatura)
-    dados['faturas'] = faturas
-    salvar_dados(dados)
+    adicionar_faturas([fatura])
+
+def adicionar_faturas(faturas_novas):
+    """
+    Adiciona várias faturas ao histórico com uma única gravação.
+
+    Cada fatura substitui a que já existir no mesmo mês/ano. Estornos e
+    descontos vão para as entradas do mês; as demais transações sem
+    categoria são classificadas.
+    """
+    from recorrencias import sincronizar_recorrencias
+    # Classificação feita antes de travar o arquivo; só a junção fica sob a trava
+    entradas_novas = []
+    for fatura in faturas_novas:
+        # Classificar transações e separar entradas de despesas
+        transacoes_despesas = []
+
+        for transacao in fatura['transacoes']:
+            descricao_lower = transacao['descricao'].lower()
+
+            # VERIFICAR PRIMEIRO se é estorno/desconto (vai para entradas)
+            if 'estorno' in descricao_lower or 'desconto' in descricao_lower:
+                entrada = {
+                    'descricao': transacao['descricao'],
+                    'valor': transacao['valor'],
+                    'mes': fatura['mes'],
+                    'ano': fatura['ano']
+                }
+                entradas_novas.append(entrada)
+            else:
+                # Se não for entrada, classificar normalmente e manter como despesa
+                if 'categoria' not in transacao:
+                    transacao['categoria'] = classificar_transacao(transacao['descricao'])
+                transacoes_despesas.append(transacao)
+
+        # Atualizar a fatura apenas com despesas
+        fatura['transacoes'] = transacoes_despesas
+        resolver_datas_fatura(fatura)
+
+    def adicionar(dados):
+        faturas = dados.setdefault('faturas', [])
+        dados.setdefault('entradas', []).extend(entradas_novas)
+        posicoes = {(f['mes'], f['ano']): i for i, f in enumerate(faturas)}
+        for fatura in faturas_novas:
+            # Substituir a fatura do mesmo mês/ano, se já existir
+            chave = (fatura['mes'], fatura['ano'])
+            if chave in posicoes:
+                faturas[posicoes[chave]] = fatura
+            else:
+                posicoes[chave] = len(faturas)
+                faturas.append(fatura)
+        return dados
+
+    dados = atualizar_dados(adicionar)
+    # Atualizar o detector de recorrências só com as faturas alteradas
+    sincronizar_recorrencias(dados)
 
 # Função auxiliar para formatar valores
-def formatar_valor(valor):
-    """Formata um valor monetário com pontos para milhares e vírgula para decimais"""
-    return f"R$ {valor:,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
+def formatar_valor(centavos):
+    """
+    Formata um valor em centavos com pontos para milhares e vírgula para
+    decimais (ex: 123456 -> "R$ 1.234,56"). Médias e projeções chegam como
+    float e são arredondadas para o centavo.
+    """
+    centavos = int(round(centavos))
+    sinal = '-' if centavos < 0 else ''
+    reais, resto = divmod(abs(centavos), 100)
+    return f"R$ {sinal}{reais:,}".replace(",", ".") + f",{resto:02d}"
 
 def adicionar_gasto_fixo_novo(transacao):
     """Adiciona um novo gasto fixo"""
@@ -541,70 +564,76 @@ def corrigir_classificacoes_99app():
     """
     Corrige todas as classificações incorretas do 99app que estão como 'Roupas' para 'Transporte'.
     """
-    dados = carregar_dados()
-    faturas = dados.get('faturas', [])
-    
-    corrigidas = 0
-    for fatura in faturas:
-        for transacao in fatura.get('transacoes', []):
-            descricao = transacao.get('descricao', '').lower()
-            # Verifica se é uma transação do 99app e se está classificada incorretamente
-            if ('99app' in descricao or ('99' in descricao and 'app' in descricao) or '99 app' in descricao):
-                if transacao.get('categoria') == 'Roupas':
-                    transacao['categoria'] = 'Transporte'
-                    corrigidas += 1
-                    print(f"Corrigindo classificação de '{transacao['descricao']}' para Transporte")
-                    # Salva a classificação correta
-                    atualizar_classificacao_salva(descricao, 'Transporte')
-    
-    salvar_dados(dados)
-    return corrigidas
+    def corrigir(dados):
+        corrigidas = 0
+        for fatura in dados.get('faturas', []):
+            for transacao in fatura.get('transacoes', []):
+                descricao = transacao.get('descricao', '').lower()
+                # Verifica se é uma transação do 99app e se está classificada incorretamente
+                if ('99app' in descricao or ('99' in descricao and 'app' in descricao) or '99 app' in descricao):
+                    if transacao.get('categoria') == 'Roupas':
+                        transacao['categoria'] = 'Transporte'
+                        corrigidas += 1
+                        print(f"Corrigindo classificação de '{transacao['descricao']}' para Transporte")
+                        # Salva a classificação correta
+                        atualizar_classificacao_salva(descricao, 'Transporte')
+        return corrigidas
+
+    return atualizar_dados(corrigir)
 
 def corrigir_classificacoes_restaurantes():
     """
     Corrige todas as classificações incorretas de restaurantes que estão como 'Roupas' ou 'Outros' para 'Alimentação'.
     """
-    dados = carregar_dados()
-    faturas = dados.get('faturas', [])
-    
-    # Lista de restaurantes conhecidos
-    restaurantes_conhecidos = [
-        'bendita chica', 'bendita', 'amen gavea', 'amen', 'art food',
-        'abbraccio', 'braseiro', 'gavea', 'nama', 'nanquim', 'posi mozza',
-        'posi', 'mozza', 'smoov', 'sucos', 'katzsu', 'eleninha', 'buddario',
-        'dri', 'jobi', 'scarpi', 'tintin', 'choperiakaraoke', 'chopp',
-        'alemao', 'tabacaria', 'woods wine', 'woods', 'wine', 'reserva 11',
-        'beach club', 'zig', 'caza', 'lagoa', 'sheesh', 'downtown',
-        'galeto', 'rainha', 'leblon', 'natural delli', 'buffet', 'absurda',
-        'confeitaria', 'zona sul', 'restaurante', 'bar', 'cafeteria'
-    ]
-    
-    corrigidas = 0
-    for fatura in faturas:
-        for transacao in fatura.get('transacoes', []):
-            descricao = transacao.get('descricao', '').lower()
-            categoria_atual = transacao.get('categoria', '')
+    def corrigir(dados):
+        # Lista de restaurantes conhecidos
+        restaurantes_conhecidos = [
+            'bendita chica', 'bendita', 'amen gavea', 'amen', 'art food',
+            'abbraccio', 'braseiro', 'gavea', 'nama', 'nanquim', 'posi mozza',
+            'posi', 'mozza', 'smoov', 'sucos', 'katzsu', 'eleninha', 'buddario',
+            'dri', 'jobi', 'scarpi', 'tintin', 'choperiakaraoke', 'chopp',
+            'alemao', 'tabacaria', 'woods wine', 'woods', 'wine', 'reserva 11',
+            'beach club', 'zig', 'caza', 'lagoa', 'sheesh', 'downtown',
+            'galeto', 'rainha', 'leblon', 'natural delli', 'buffet', 'absurda',
+            'confeitaria', 'zona sul', 'restaurante', 'bar', 'cafeteria'
+        ]
+        
+        corrigidas = 0
+        for fatura in dados.get('faturas', []):
+            for transacao in fatura.get('transacoes', []):
+                descricao = transacao.get('descricao', '').lower()
+                categoria_atual = transacao.get('categoria', '')
             
-            # Verifica se é um restaurante e se está classificado incorretamente
-            if any(rest in descricao for rest in restaurantes_conhecidos):
-                if categoria_atual == 'Roupas':
-                    transacao['categoria'] = 'Alimentação'
-                    corrigidas += 1
-                    print(f"Corrigindo classificação de '{transacao['descricao']}' para Alimentação")
-                    # Salva a classificação correta
-                    atualizar_classificacao_salva(descricao, 'Alimentação')
-    
-    salvar_dados(dados)
-    return corrigidas
-
-def reaplicar_classificacao_todas_transacoes():
+                # Verifica se é um restaurante e se está classificado incorretamente
+                if any(rest in descricao for rest in restaurantes_conhecidos):
+                    if categoria_atual == 'Roupas':
+                        transacao['categoria'] = 'Alimentação'
+                        corrigidas += 1
+                        print(f"Corrigindo classificação de '{transacao['descricao']}' para Alimentação")
+                        # Salva a classificação correta
+                        atualizar_classificacao_salva(descricao, 'Alimentação')
+        return corrigidas
+
+    return atualizar_dados(corrigir)
+
+def reaplicar_classificacao_todas_transacoes(arquivo=None, tarefa=None):
     """
     Reaplica a classificação automática a todas as transações usando a nova lógica melhorada.
+
+    Pode rodar como tarefa em segundo plano: a classificação é feita sobre uma
+    cópia dos dados e só as categorias alteradas são gravadas no fim.
+
+    Args:
+        arquivo: Caminho do arquivo de dados (obrigatório fora da thread do script)
+        tarefa (Tarefa): Recebe o progresso e atende o cancelamento
     """
-    dados = carregar_dados()
+    dados = carregar_dados(arquivo)
     faturas = dados.get('faturas', [])
+    total = sum(len(fatura.get('transacoes', [])) for fatura in faturas) or 1
     
-    transacoes_atualizadas = 0
+    # (id da transação, descrição, categoria lida, nova categoria)
+    alteracoes = []
+    processadas = 0
     
     for fatura in faturas:
         for transacao in fatura.get('transacoes', []):
@@ -613,16 +642,29 @@ def reaplicar_classificacao_todas_transacoes():
             
             # Só atualiza se a categoria mudou
             if categoria_original != categoria_nova:
-                transacao['categoria'] = categoria_nova
-                transacoes_atualizadas += 1
-                print(f"Reclassificando '{transacao['descricao']}' de '{categoria_original}' para '{categoria_nova}'")
-                
-                # Salva a nova classificação
-                atualizar_classificacao_salva(transacao['descricao'].lower(), categoria_nova)
+                alteracoes.append((transacao['id'], transacao['descricao'], categoria_original, categoria_nova))
+        processadas += len(fatura.get('transacoes', []))
+        if tarefa:
+            tarefa.informar(processadas / total, f"{fatura['mes']:02d}/{fatura['ano']}", parcial={'atualizadas': len(alteracoes)})
     
-    salvar_dados(dados)
-    return transacoes_atualizadas
-
+    def aplicar(dados_atuais):
+        indice = indice_por_id(dados_atuais)
+        atualizadas = 0
+        for id_transacao, descricao, categoria_original, categoria_nova in alteracoes:
+            # A transação pode ter sido excluída ou recategorizada pelo usuário enquanto a tarefa rodava
+            fatura, posicao = localizar_transacao(dados_atuais, id_transacao, indice)
+            if fatura is None or fatura['transacoes'][posicao].get('categoria', '') != categoria_original:
+                continue
+            fatura['transacoes'][posicao]['categoria'] = categoria_nova
+            atualizadas += 1
+            # Salva a nova classificação
+            atualizar_classificacao_salva(descricao.lower(), categoria_nova)
+        return atualizadas
+    
+    atualizadas = atualizar_dados(aplicar, arquivo)
+    if tarefa:
+        tarefa.mensagem = f"{atualizadas} transações reclassificadas"
+    return atualizadas
 
 def limpar_fatura(mes, ano):
     """
@@ -631,1077 +673,1268 @@ def limpar_fatura(mes, ano):
     IMPORTANTE: O indicador visual (check verde) aparece apenas quando há FATURAS,
     mas este botão remove todos os tipos de dados.
     """
-    dados = carregar_dados()
-    
-    # Contar itens antes da remoção
-    faturas_removidas = 0
-    entradas_removidas = 0
-    gastos_fixos_removidos = 0
-    
-    # Contar faturas que serão removidas
-    for fatura in dados.get('faturas', []):
-        if fatura['mes'] == mes and fatura['ano'] == ano:
-            faturas_removidas += len(fatura.get('transacoes', []))
-    
-    # Contar entradas que serão removidas
-    if 'entradas' in dados:
-        entradas_removidas = len([
-            entrada for entrada in dados['entradas']
-            if entrada.get('mes') == mes and entrada.get('ano') == ano
-        ])
-    
-    # Contar gastos fixos
-    gastos_fixos_removidos = len(dados.get('gastos_fixos', []))
-    
-    # Encontrar e remover a fatura específica
-    dados['faturas'] = [
-        fatura for fatura in dados['faturas']
-        if not (fatura['mes'] == mes and fatura['ano'] == ano)
-    ]
-    
-    # Remover entradas específicas do mês
-    if 'entradas' in dados:
-        dados['entradas'] = [
-            entrada for entrada in dados['entradas']
-            if not (entrada.get('mes') == mes and entrada.get('ano') == ano)
+    def limpar(dados):
+        # Contar itens antes da remoção
+        faturas_removidas = 0
+        entradas_removidas = 0
+        gastos_fixos_removidos = 0
+        
+        # Contar faturas que serão removidas
+        for fatura in dados.get('faturas', []):
+            if fatura['mes'] == mes and fatura['ano'] == ano:
+                faturas_removidas += len(fatura.get('transacoes', []))
+        
+        # Contar entradas que serão removidas
+        if 'entradas' in dados:
+            entradas_removidas = len([
+                entrada for entrada in dados['entradas']
+                if entrada.get('mes') == mes and entrada.get('ano') == ano
+            ])
+        
+        # Contar gastos fixos
+        gastos_fixos_removidos = len(dados.get('gastos_fixos', []))
+        
+        # Encontrar e remover a fatura específica
+        dados['faturas'] = [
+            fatura for fatura in dados['faturas']
+            if not (fatura['mes'] == mes and fatura['ano'] == ano)
         ]
+        
+        # Remover entradas específicas do mês
+        if 'entradas' in dados:
+            dados['entradas'] = [
+                entrada for entrada in dados['entradas']
+                if not (entrada.get('mes') == mes and entrada.get('ano') == ano)
+            ]
+        
+        # Remover gastos fixos específicos do mês (se tiverem referência de mês/ano)
+        # ou simplesmente limpar todos os gastos fixos (caso não tenham referência temporal)
+        if 'gastos_fixos' in dados:
+            # Como gastos fixos geralmente não têm referência temporal específica,
+            # vamos limpar todos os gastos fixos quando limpar o mês
+            dados['gastos_fixos'] = []
+        return faturas_removidas, entradas_removidas, gastos_fixos_removidos
+
+    faturas_removidas, entradas_removidas, gastos_fixos_removidos = atualizar_dados(limpar)
     
-    # Remover gastos fixos específicos do mês (se tiverem referência de mês/ano)
-    # ou simplesmente limpar todos os gastos fixos (caso não tenham referência temporal)
-    if 'gastos_fixos' in dados:
-        # Como gastos fixos geralmente não têm referência temporal específica,
-        # vamos limpar todos os gastos fixos quando limpar o mês
-        dados['gastos_fixos'] = []
-    
-    # Salvar os dados atualizados
-    salvar_dados(dados)
-    
-    # Exibir mensagens de sucesso com detalhes
-    st.success(f"✓ Todos os dados de {mes}/{ano} removidos com sucesso!")
+    # Exibir mensagens de sucesso com detalhes (toasts continuam visíveis após o rerun)
+    st.toast(f"✓ Todos os dados de {mes}/{ano} removidos com sucesso!")
     
     if faturas_removidas > 0:
-        st.success(f"  - {faturas_removidas} transações da fatura removidas")
-    else:
-        st.info("  - Nenhuma transação encontrada para remover")
+        st.toast(f"{faturas_removidas} transações da fatura removidas")
     
     if entradas_removidas > 0:
-        st.success(f"  - {entradas_removidas} entradas do mês removidas")
-    else:
-        st.info("  - Nenhuma entrada encontrada para remover")
+        st.toast(f"{entradas_removidas} entradas do mês removidas")
     
     if gastos_fixos_removidos > 0:
-        st.success(f"  - {gastos_fixos_removidos} gastos fixos removidos")
-    else:
-        st.info("  - Nenhum gasto fixo encontrado para remover")
+        st.toast(f"{gastos_fixos_removidos} gastos fixos removidos")
     
-    time.sleep(0.5)
     st.rerun()
 
-def reaplicar_regras_todas_transacoes():
+def reaplicar_regras_todas_transacoes(arquivo=None, tarefa=None):
     """
     Reaplica todas as regras de classificação às transações existentes.
+
+    Pode rodar como tarefa em segundo plano: as regras são aplicadas sobre uma
+    cópia dos dados e só as alterações são gravadas no fim, sob a trava do
+    arquivo, sem desfazer o que o usuário mudou enquanto isso.
+
+    Args:
+        arquivo: Caminho do arquivo de dados (obrigatório fora da thread do script)
+        tarefa (Tarefa): Recebe o progresso e atende o cancelamento
+
+    Returns:
+        dict: {'atualizadas': quantidade de transações alteradas}
     """
-    dados = carregar_dados()
-    transacoes_atualizadas = 0
-    entradas = dados.get('entradas', [])
+    dados = carregar_dados(arquivo)
+    faturas = dados.get('faturas', [])
+    total = sum(len(fatura.get('transacoes', [])) for fatura in faturas) or 1
+    
+    # (id da transação, categoria lida, nova categoria ou None para mover para entradas)
+    alteracoes = []
+    processadas = 0
     
     # Aplicar regras às faturas
-    for fatura in dados.get('faturas', []):
-        transacoes_para_remover = []
-        
-        for i, transacao in enumerate(fatura.get('transacoes', [])):
+    for fatura in faturas:
+        for transacao in fatura.get('transacoes', []):
             descricao_lower = transacao['descricao'].lower().strip()
             
             # Verificar se deve ir para entradas
             if 'estorno' in descricao_lower or 'desconto' in descricao_lower:
-                # Mover para entradas
-                entrada = {
-                    'descricao': transacao['descricao'],
-                    'valor': transacao['valor'],
-                    'mes': fatura['mes'],
-                    'ano': fatura['ano']
-                }
-                entradas.append(entrada)
-                transacoes_para_remover.append(i)
-                transacoes_atualizadas += 1
+                alteracoes.append((transacao['id'], transacao.get('categoria', ''), None))
             else:
                 # Aplicar nova classificação
                 categoria_original = transacao.get('categoria', '')
                 categoria_nova = classificar_transacao(transacao['descricao'])
                 
                 if categoria_original != categoria_nova:
-                    transacao['categoria'] = categoria_nova
-                    transacoes_atualizadas += 1
+                    alteracoes.append((transacao['id'], categoria_original, categoria_nova))
+        processadas += len(fatura.get('transacoes', []))
+        if tarefa:
+            tarefa.informar(processadas / total, f"{fatura['mes']:02d}/{fatura['ano']}", parcial={'atualizadas': len(alteracoes)})
+    
+    def aplicar(dados_atuais):
+        indice = indice_por_id(dados_atuais)
+        entradas = dados_atuais.setdefault('entradas', [])
+        transacoes_para_remover = {}
+        atualizadas = 0
+        
+        for id_transacao, categoria_original, categoria_nova in alteracoes:
+            # A transação pode ter sido excluída ou recategorizada pelo usuário enquanto a tarefa rodava
+            fatura, posicao = localizar_transacao(dados_atuais, id_transacao, indice)
+            if fatura is None:
+                continue
+            transacao = fatura['transacoes'][posicao]
+            if transacao.get('categoria', '') != categoria_original:
+                continue
+            if categoria_nova is None:
+                # Mover para entradas
+                entradas.append({
+                    'descricao': transacao['descricao'],
+                    'valor': transacao['valor'],
+                    'mes': fatura['mes'],
+                    'ano': fatura['ano']
+                })
+                transacoes_para_remover.setdefault((fatura['ano'], fatura['mes']), (fatura, set()))[1].add(id_transacao)
+            else:
+                transacao['categoria'] = categoria_nova
+            atualizadas += 1
         
         # Remover transações que foram movidas para entradas
-        for i in reversed(transacoes_para_remover):
-            del fatura['transacoes'][i]
-    
-    # Atualizar entradas nos dados
-    dados['entradas'] = entradas
+        for fatura, ids in transacoes_para_remover.values():
+            fatura['transacoes'] = [t for t in fatura['transacoes'] if t['id'] not in ids]
+        
+        return atualizadas
     
-    # Salvar os dados atualizados
-    salvar_dados(dados)
+    atualizadas = atualizar_dados(aplicar, arquivo)
+    if tarefa:
+        tarefa.mensagem = (f"{atualizadas} transações atualizadas" if atualizadas
+                           else "todas já estavam classificadas corretamente")
     
     # Retornar informações sobre o que foi feito
     return {
-        'atualizadas': transacoes_atualizadas
+        'atualizadas': atualizadas
     }
 
+def iniciar_reaplicacao_regras():
+    """Coloca a reaplicação das regras na fila de tarefas do usuário; o progresso aparece na barra lateral"""
+    iniciar_tarefa(
+        st.session_state['username'], 'reaplicar_regras', "Reaplicar regras",
+        reaplicar_regras_todas_transacoes, arquivo=get_user_data_file()
+    )
+    st.toast("Reaplicando regras em segundo plano; acompanhe na barra lateral")
+
+# Seleção do mês com indicadores visuais
+mes_options_base = {
+    'Janeiro': 1, 'Fevereiro': 2, 'Março': 3, 'Abril': 4,
+    'Maio': 5, 'Junho': 6, 'Julho': 7, 'Agosto': 8,
+    'Setembro': 9, 'Outubro': 10, 'Novembro': 11, 'Dezembro': 12
+}
+
+# Funções de processamento
+@st.cache_data(ttl=600)
+def processar_pdf(arquivo_pdf):
+    """Processa o arquivo PDF da fatura"""
+    try:
+        transacoes, linhas_com_erro, _ = ler_transacoes_pdf(arquivo_pdf)
+        for linha in linhas_com_erro:
+            st.warning(f"Erro ao processar linha: {linha}")
 
+        if not transacoes:
+            st.error("Não foi possível encontrar transações no arquivo. Certifique-se de que este é um arquivo de fatura do Nubank.")
+            return None
 
-# Configuração da página
-st.set_page_config(
-    page_title="Análise Faturas Nubank",
-    page_icon="📊",
-    layout="wide",
-)
-
-# Inicializar variáveis de sessão
-if 'user_data_dir' not in st.session_state:
-    st.session_state['user_data_dir'] = 'data/default'
-
-# Carregar configurações de autenticação
-with open('config.yaml') as file:
-    config = yaml.load(file, Loader=SafeLoader)
-
-# Criar o autenticador
-authenticator = stauth.Authenticate(
-    config['credentials'],
-    config['cookie']['name'],
-    config['cookie']['key'],
-    config['cookie']['expiry_days']
-)
-
-# Adicionar login
-name, authentication_status, username = authenticator.login('Login')
-
-if authentication_status == False:
-    st.error('Username/password is incorrect')
-elif authentication_status == None:
-    st.warning('Please enter your username and password')
-elif authentication_status:
-    # Criar diretório do usuário se não existir
-    user_dir = Path(f"data/{username}")
-    user_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Configurar caminhos específicos do usuário
-    st.session_state['user_data_dir'] = str(user_dir)
-    
-    # Adicionar logout na sidebar
-    with st.sidebar:
-        authenticator.logout('Logout')
-    
-    # Título principal
-    st.markdown(f"<h1 class='main-header'>Análise</h1>", unsafe_allow_html=True)
-    
-    # Inicializar estados
-    if 'checkbox_states' not in st.session_state:
-        st.session_state.checkbox_states = {}
-
-    # Configurações de estilo
-    st.markdown("""
-        <style>
-        .main-header {
-            font-size: 2.5rem;
-            color: #4B0082;
-            margin-bottom: 2rem;
-        }
-        .stButton > button {
-            background-color: #4B0082;
-            color: white;
-        }
-        .stButton > button:hover {
-            background-color: #3B0062;
-            color: white;
-        }
-        div[data-testid="stMetricValue"] {
-            color: #4B0082;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+        # Retornar DataFrame para exibição
+        return pandas().DataFrame(transacoes)
+    except Exception as e:
+        st.error(f"Erro ao processar o PDF: {str(e)}")
+        return None
 
-    # Função para verificar se há faturas para um mês específico
-    def tem_fatura_mes(mes, ano):
-        """
-        Verifica se há fatura salva para um mês específico.
-        
-        IMPORTANTE: Esta função determina se o check verde (✅) aparece no seletor de mês.
-        Verifica APENAS faturas, não entradas nem gastos fixos.
-        
-        Args:
-            mes (int): Número do mês (1-12)
-            ano (int): Ano (ex: 2024)
-            
-        Returns:
-            bool: True se há fatura salva para o mês/ano, False caso contrário
-        """
-        dados = carregar_dados()
+def gerar_chave_transacao(transacao, prefixo=""):
+    """Gera uma chave de widget única para a transação a partir do seu id"""
+    return f"{prefixo}_{transacao['id']}" if prefixo else transacao['id']
+
+
+# Dados das abas calculados uma vez por versão dos dados e reaproveitados ao voltar à aba
+@st.cache_data(max_entries=16, show_spinner=False)
+def _totais_categoria_por_mes_em_cache(versao, _faturas):
+    """Guarda os totais por categoria de cada fatura (sem ENTRADA), em ordem cronológica"""
+    totais_por_mes = []
+    for fatura in _faturas:
+        totais = {}
+        for transacao in fatura['transacoes']:
+            categoria = transacao.get('categoria') or classificar_transacao(transacao['descricao'])
+            if categoria != 'ENTRADA':
+                totais[categoria] = totais.get(categoria, 0) + transacao['valor']
+        totais_por_mes.append((fatura['ano'], fatura['mes'], totais))
+    return sorted(totais_por_mes, key=lambda item: (item[0], item[1]))
+
+def obter_totais_categoria_por_mes(snapshot):
+    """Retorna os totais por categoria de cada fatura, recalculando apenas quando os dados mudam"""
+    return _totais_categoria_por_mes_em_cache(snapshot.versao, snapshot.faturas)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _compras_parceladas_em_cache(versao, _faturas):
+    """Guarda as compras parceladas encontradas nas descrições de todas as faturas (com os ids das parcelas)"""
+    todas_parcelas = {}  # Dicionário para agrupar parcelas por descrição
+    for fatura in _faturas:
+        for transacao in fatura['transacoes']:
+            descricao = transacao['descricao'].lower()
         
-        # Verificar apenas faturas (não entradas nem gastos fixos)
-        tem_faturas = any(
-            f['mes'] == mes and f['ano'] == ano 
-            for f in dados.get('faturas', [])
-        )
+            # Pular transações do 99app e antecipadas para evitar detecção incorreta de parcelas
+            if any(termo in descricao for termo in ['99app', '99 app', '99app *99app', 'antecipada']):
+                continue
         
-        return tem_faturas
-    
-    # Seleção do mês com indicadores visuais
-    mes_options_base = {
-        'Janeiro': 1, 'Fevereiro': 2, 'Março': 3, 'Abril': 4,
-        'Maio': 5, 'Junho': 6, 'Julho': 7, 'Agosto': 8,
-        'Setembro': 9, 'Outubro': 10, 'Novembro': 11, 'Dezembro': 12
-    }
-    
-    # Inicializar opções básicas de mês (serão atualizadas após seleção do ano)
-    mes_options = {nome: num for nome, num in mes_options_base.items()}
-
-    # Funções de processamento
-    @st.cache_data(ttl=600)
-    def processar_pdf(arquivo_pdf):
-        """Processa o arquivo PDF da fatura"""
-        try:
-            texto_completo = []
-            with pdfplumber.open(arquivo_pdf) as pdf:
-                for pagina in pdf.pages:
-                    texto_completo.append(pagina.extract_text())
-            
-            texto_completo = '\n'.join(texto_completo)
-            linhas = texto_completo.split('\n')
+            # Procurar padrões de parcelas usando regex mais específica
+            # Aceita: "1/12", "01/12", "1 de 12", "parcela 1 de 12", etc.
+            padrao_parcela = re.search(r'(?:parcela\s+)?(\d{1,2})(?:\s*[/de]\s*|\s+de\s+)(\d{1,2})', descricao)
+            if padrao_parcela:
+                parcela_atual = int(padrao_parcela.group(1))
+                total_parcelas = int(padrao_parcela.group(2))
             
-            transacoes = []
-            for linha in linhas:
-                if re.search(r'\d{2} [A-Z]{3}', linha):
-                    try:
-                        # Ignorar linhas de IOF e totais
-                        if any(termo in linha.lower() for termo in [
-                            'iof de', 'total de', 'pagamento em'
-                        ]):
-                            continue
-                            
-                        data = re.search(r'\d{2} [A-Z]{3}', linha).group()
-                        valor = re.search(r'R\$ \d+[.,]\d{2}', linha)
-                        if valor:
-                            valor = float(valor.group().replace('R$ ', '').replace('.', '').replace(',', '.'))
-                            descricao = re.sub(r'\d{2} [A-Z]{3}|R\$ \d+[.,]\d{2}', '', linha).strip()
-                            
-                            # Limpar números de cartão da descrição
-                            descricao = re.sub(r'•{4} \d{4}', '', descricao).strip()
-                            
-                            # Ignorar se a descrição estiver vazia após limpeza
-                            if not descricao:
-                                continue
-                                
-                            transacoes.append({
-                                'data': data,
-                                'descricao': descricao,
-                                'valor': valor
-                            })
-                    except Exception as e:
-                        st.warning(f"Erro ao processar linha: {linha}")
-                        continue
-            
-            if not transacoes:
-                st.error("Não foi possível encontrar transações no arquivo. Certifique-se de que este é um arquivo de fatura do Nubank.")
-                return None
+                # Validações para evitar falsos positivos
+                if (parcela_atual < 1 or parcela_atual > total_parcelas or 
+                    total_parcelas < 2 or total_parcelas > 60):
+                    continue
             
-            # Criar fatura
-            mes_num = mes_options[mes_selecionado]
-            fatura = {
-                'mes': mes_num,
-                'ano': ano_selecionado,
-                'transacoes': transacoes
-            }
+                # Criar chave única para a compra (removendo o padrão de parcela)
+                chave = re.sub(r'(?:parcela\s+)?\d{1,2}(?:\s*[/de]\s*|\s+de\s+)\d{1,2}', '', descricao).strip()
             
-            # Retornar DataFrame para exibição
-            return pd.DataFrame(transacoes)
-        except Exception as e:
-            st.error(f"Erro ao processar o PDF: {str(e)}")
-            return None
+                if chave not in todas_parcelas:
+                    todas_parcelas[chave] = {
+                        'descricao': chave,
+                        'valor_parcela': transacao['valor'],
+                        'total_parcelas': total_parcelas,
+                        'parcelas_vistas': {parcela_atual},
+                        'primeira_parcela': {
+                            'mes': fatura['mes'],
+                            'ano': fatura['ano']
+                        },
+                        'ids': {transacao.get('id')}
+                    }
+                else:
+                    todas_parcelas[chave]['parcelas_vistas'].add(parcela_atual)
+                    todas_parcelas[chave]['ids'].add(transacao.get('id'))
+    return todas_parcelas
+
+def obter_compras_parceladas(snapshot):
+    """Retorna as compras parceladas das faturas, recalculando apenas quando os dados mudam"""
+    return _compras_parceladas_em_cache(snapshot.versao, snapshot.faturas)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _totais_mensais_em_cache(versao, _faturas):
+    """Guarda o total de cada fatura em ordem cronológica"""
+    historico = []
+    for fatura in _faturas:
+        # Usar nomes de mês limpos (sem checks) para o histórico
+        mes_nome = list(mes_options_base.keys())[int(fatura['mes'])-1]
+        historico.append({
+            'Mês': f"{mes_nome}/{fatura['ano']}",
+            'Total': sum(t['valor'] for t in fatura['transacoes']),
+            'mes_num': fatura['mes'],
+            'ano': fatura['ano']
+        })
+    return sorted(historico, key=lambda item: (item['ano'], item['mes_num']))
+
+def obter_totais_mensais(snapshot):
+    """Retorna o total de cada fatura, recalculando apenas quando os dados mudam"""
+    return _totais_mensais_em_cache(snapshot.versao, snapshot.faturas)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _transacoes_mes_em_cache(versao, mes, ano, _fatura):
+    """Guarda o DataFrame de transações do mês já classificado e sem ENTRADA"""
+    pd = pandas()
+    df = pd.DataFrame(_fatura['transacoes'])
+    if df.empty:
+        return pd.DataFrame(columns=['id', 'data', 'descricao', 'valor', 'categoria'])
+
+    # Usar as categorias já salvas e classificar apenas as que faltam
+    df['categoria'] = [
+        transacao['categoria'] if 'categoria' in transacao else classificar_transacao(transacao['descricao'])
+        for transacao in _fatura['transacoes']
+    ]
 
-    # Usar a função global classificar_transacao que tem toda a lógica necessária
+    # Filtrar transações com categoria ENTRADA (não devem aparecer na análise)
+    return df[df['categoria'] != 'ENTRADA']
+
+def obter_transacoes_mes(snapshot, mes, ano):
+    """Retorna as transações do mês (coluna 'id' identifica cada uma), recalculando apenas quando os dados mudam"""
+    return _transacoes_mes_em_cache(snapshot.versao, mes, ano, snapshot.fatura(mes, ano))
+
+# Ordenações disponíveis nas listas de transações
+ORDENACOES_TRANSACOES = {
+    'Maior valor': (['valor'], [False]),
+    'Menor valor': (['valor'], [True]),
+    'Data': (['data_completa', 'valor'], [True, False]),
+    'Descrição': (['descricao'], [True])
+}
+
+def ordenar_transacoes(df, ordenacao):
+    """Ordena o DataFrame de transações pela opção escolhida"""
+    colunas, crescente = ORDENACOES_TRANSACOES[ordenacao]
+    if not set(colunas) <= set(df.columns):
+        colunas, crescente = ['data', 'valor'], [True, False]
+    return df.sort_values(colunas, ascending=crescente, kind='stable')
+
+def paginar(itens, chave, tamanho_pagina):
+    """
+    Mostra o controle de página (quando há mais de uma) e retorna só os itens da página atual.
 
-    # Função auxiliar para formatar valores
-    def formatar_valor(valor):
-        """Formata um valor monetário com pontos para milhares e vírgula para decimais"""
-        return f"R$ {valor:,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
+    Args:
+        itens: Lista ou DataFrame já filtrado e ordenado
+        chave (str): Chave única do controle no session_state
+        tamanho_pagina (int): Itens por página
 
-    def adicionar_gasto_fixo_novo(transacao):
-        """Adiciona um novo gasto fixo"""
-        gasto = {
-            'descricao': transacao['descricao'],
-            'valor': transacao['valor'],
-            'categoria': transacao.get('categoria', 'Roupas'),
-            'data_adicao': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        adicionar_gasto_fixo(gasto)
-        st.success('✅ Gasto fixo adicionado com sucesso!')
-        st.experimental_rerun()
-
-    def remover_gasto_fixo_novo(descricao, valor):
-        """Remove um gasto fixo"""
-        remover_gasto_fixo(descricao, valor)
-        st.success('✅ Gasto fixo removido com sucesso!')
-        st.experimental_rerun()
-
-    def gerar_chave_transacao(transacao, prefixo=""):
-        """Gera uma chave única para a transação baseada em seus atributos"""
-        # Criar uma string com todos os atributos relevantes
-        chave_base = f"{transacao['descricao']}_{transacao['valor']}_{prefixo}"
-        # Gerar um hash curto (8 caracteres) para garantir unicidade
-        return hashlib.md5(chave_base.encode()).hexdigest()[:8]
-
-    # Criar seleção de mês e ano
-    col1, col2 = st.columns([2, 1])
-    
-    with col2:
-        ano_atual = datetime.now().year
-        ano_selecionado = st.selectbox(
-            "Ano",
-            options=range(ano_atual-2, ano_atual+1),
-            index=2,
-            key="ano_selecionado"
-        )
-    
-    # Recriar opções do mês com base no ano selecionado
-    mes_options = {}
-    for nome_mes, num_mes in mes_options_base.items():
-        if tem_fatura_mes(num_mes, ano_selecionado):
-            mes_options[f"✅ {nome_mes}"] = num_mes
-        else:
-            mes_options[f"⚪ {nome_mes}"] = num_mes
+    Returns:
+        Fatia de itens da página selecionada
+    """
+    total_paginas = max(1, -(-len(itens) // tamanho_pagina))
+    if total_paginas == 1:
+        return itens
 
+    # Corrigir página fora do intervalo (ex: depois de filtrar ou excluir itens)
+    if st.session_state.get(chave, 1) > total_paginas:
+        st.session_state[chave] = total_paginas
+
+    col1, col2 = st.columns([1, 3])
     with col1:
-        opcoes_mes = list(mes_options.keys())
-        
-        # Verificar se há uma solicitação para manter um mês específico (após upload)
-        if 'mes_manter_selecao' in st.session_state:
-            mes_para_manter = st.session_state['mes_manter_selecao']
-            # Procurar o mês nas opções (pode estar com ✅ ou ⚪)
-            for opcao in opcoes_mes:
-                if mes_para_manter in opcao:
-                    st.session_state.mes_selecionado = opcao
-                    break
-            # Limpar a flag
-            del st.session_state['mes_manter_selecao']
-        
-        # Inicializar com mês atual apenas se não existir no session_state
-        elif 'mes_selecionado' not in st.session_state:
-            mes_atual = datetime.now().month
-            nome_mes_atual = list(mes_options_base.keys())[mes_atual - 1]
-            
-            # Procurar a opção do mês atual (com ou sem check)
-            for opcao in opcoes_mes:
-                if nome_mes_atual in opcao:
-                    st.session_state.mes_selecionado = opcao
-                    break
-            else:
-                # Se não encontrar, usar o primeiro da lista
-                st.session_state.mes_selecionado = opcoes_mes[0]
-        
-        # Verificar se a seleção atual ainda existe nas opções (após mudança de ano)
-        elif st.session_state.mes_selecionado not in opcoes_mes:
-            # Se a seleção atual não existe mais, encontrar equivalente sem/com check
-            mes_limpo = st.session_state.mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
-            for opcao in opcoes_mes:
-                if mes_limpo in opcao:
-                    st.session_state.mes_selecionado = opcao
-                    break
-            else:
-                st.session_state.mes_selecionado = opcoes_mes[0]
-        
-        mes_selecionado = st.selectbox(
-            "Selecione o Mês",
-            options=opcoes_mes,
-            help="✅ indica meses com faturas salvas",
-            key="mes_selecionado"
+        pagina = st.number_input("Página", min_value=1, max_value=total_paginas, step=1, key=chave)
+    with col2:
+        inicio = (pagina - 1) * tamanho_pagina
+        fim = min(inicio + tamanho_pagina, len(itens))
+        st.caption(f"Mostrando {inicio + 1}–{fim} de {len(itens)} (página {pagina} de {total_paginas})")
+
+    if isinstance(itens, pandas().DataFrame):
+        return itens.iloc[inicio:fim]
+    return itens[inicio:fim]
+
+
+def iniciar_leitura(nome, titulo, funcao, *args):
+    """
+    Lê um envio em segundo plano, ou reaproveita a leitura já concluída, e
+    mostra o progresso.
+
+    O nome da tarefa inclui a assinatura da classificação: se as regras
+    mudarem, o envio é classificado de novo. A última tarefa de cada envio
+    fica registrada na sessão; se ela foi cancelada ou terminou com erro, a
+    leitura só recomeça quando o usuário pede, em vez de a cada rerun.
+
+    Returns:
+        Tarefa: A tarefa da leitura (concluída quando o resultado está pronto)
+    """
+    usuario = st.session_state['username']
+    nome = f"{nome}_{'-'.join(str(marca) for marca in assinatura_classificacao())}"
+    leituras = st.session_state.setdefault('leituras_envio', {})
+    anterior = obter_tarefa(usuario, leituras.get(nome))
+    if anterior is not None and anterior.estado in ('cancelada', 'erro'):
+        acompanhar_tarefa(anterior)
+        if not st.button("Ler novamente", key=f"reler_{nome}"):
+            return anterior
+
+    tarefa = iniciar_tarefa(usuario, nome, titulo, funcao, *args, painel=False, reaproveitar=True)
+    leituras[nome] = tarefa.id
+    acompanhar_tarefa(tarefa)
+    return tarefa
+
+@st.fragment
+@medir_fragmento
+def aba_inserir_fatura(snapshot, mes_num, ano_selecionado, mes_selecionado):
+    """Conteúdo da aba de inserção de faturas"""
+    snapshot.sincronizar()
+    st.subheader("Inserir Nova Fatura")
+
+    if st.toggle("Enviar várias faturas de uma vez", key="envio_em_lote",
+                 help="O mês de cada fatura é identificado pelo próprio PDF"):
+        envio_em_lote(snapshot, ano_selecionado)
+        return
+
+    # Upload do arquivo
+    arquivo = st.file_uploader("Faça upload da sua fatura (PDF)", type=['pdf'])
+
+    # Leitura, classificação e conferência de duplicadas rodam em segundo plano;
+    # o resultado fica guardado pelo hash do arquivo e é reaproveitado nos próximos reruns
+    preparada = None
+    duplicadas = {}
+    if arquivo is not None:
+        conteudo = arquivo.getvalue()
+        tarefa = iniciar_leitura(
+            f"envio_{hash_conteudo(conteudo)}", f"Fatura {arquivo.name}",
+            preparar_fatura, conteudo, arquivo.name, get_user_data_file(), classificar_transacao,
+            mes_num, ano_selecionado
         )
-        # Definir mes_num logo após a seleção
-        mes_num = mes_options[mes_selecionado]
-
-    # Criar tabs
-    tab_inserir, tab_entradas, tab_analise, tab_parcelas, tab_fixos, tab_historico, tab_teste = st.tabs([
-        "📥 Inserir Fatura",
-        "💰 Entradas do Mês",
-        "📊 Análise",
-        "🔄 Parcelas Futuras",
-        "📌 Gastos Fixos",
-        "📈 Histórico",
-        "🧪 Teste Classificação"
-    ])
-
-    # Aba de Inserir Fatura
-    with tab_inserir:
-        st.subheader("Inserir Nova Fatura")
-        
-        # Upload do arquivo
-        arquivo = st.file_uploader("Faça upload da sua fatura (PDF)", type=['pdf'])
-        
-        if arquivo is not None:
-            df = processar_pdf(arquivo)
-            if df is not None:
-                # Aplicar categorização inicial
-                df['categoria'] = df['descricao'].apply(classificar_transacao)
+        if tarefa.estado == 'concluída':
+            preparada = tarefa.resultado
+            duplicadas = duplicadas_atuais(preparada, snapshot, mes_num, ano_selecionado)
+            outros_meses = sorted({
+                chave for meses in duplicadas.values() for chave in meses
+                if chave != (ano_selecionado, mes_num)
+            })
+            if outros_meses:
+                repetidas = sum(1 for meses in duplicadas.values() if any(chave in outros_meses for chave in meses))
+                meses_texto = ', '.join(f"{mes:02d}/{ano}" for ano, mes in outros_meses)
+                st.warning(f"{repetidas} transações já estão salvas em {meses_texto} e serão ignoradas ao salvar.")
+            for linha in preparada['linhas_com_erro']:
+                st.warning(f"Erro ao processar linha: {linha}")
 
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.button("💾 Salvar Fatura", use_container_width=True):
-                if arquivo is not None:
-                    if df is not None:
+    col1, col2 = st.columns(2)
+
+    with col1:
+        if st.button("💾 Salvar Fatura", use_container_width=True):
+            if arquivo is not None:
+                if preparada is None:
+                    st.info("A fatura ainda está sendo lida; aguarde o fim da leitura para salvar.")
+                else:
+                    transacoes = transacoes_para_salvar(preparada, mes_num, ano_selecionado, duplicadas)
+                    if not transacoes:
+                        st.warning("Todas as transações desta fatura já estão salvas em outro mês; nada foi gravado.")
+                    else:
                         try:
                             fatura = {
                                 'mes': mes_num,
                                 'ano': ano_selecionado,
-                                'transacoes': df.to_dict('records')
+                                'transacoes': transacoes
                             }
                             adicionar_fatura(fatura)
                             # Limpar nome do mês de checks visuais para exibição
                             nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
-                            st.success(f"Fatura de {nome_mes_limpo}/{ano_selecionado} salva com sucesso!")
-                            
+                            st.toast(f"Fatura de {nome_mes_limpo}/{ano_selecionado} salva com sucesso!")
+                        
                             # Manter a seleção do mês atual (nome limpo) para o próximo rerun
                             st.session_state['mes_manter_selecao'] = nome_mes_limpo
                             st.rerun()  # Atualizar indicadores visuais
                         except Exception as e:
                             st.error(f"Erro ao salvar fatura: {str(e)}")
-                else:
-                    st.warning("Por favor, faça upload de uma fatura primeiro.")
-        
-        with col2:
-            # Contar dados existentes para o mês selecionado
-            dados_existentes = carregar_dados()
-            
-            # Contar itens do mês atual
-            transacoes_mes = 0
-            for fatura in dados_existentes.get('faturas', []):
-                if fatura['mes'] == mes_num and fatura['ano'] == ano_selecionado:
-                    transacoes_mes += len(fatura.get('transacoes', []))
-            
-            entradas_mes = len([
-                e for e in dados_existentes.get('entradas', [])
-                if e.get('mes') == mes_num and e.get('ano') == ano_selecionado
-            ])
-            
-            gastos_fixos_total = len(dados_existentes.get('gastos_fixos', []))
-            
-            # Verificar se há fatura (para mostrar estado correto do botão)
-            tem_fatura = tem_fatura_mes(mes_num, ano_selecionado)
-            
-            # Inicializar estado do botão de confirmação
-            if f'confirm_clear_{mes_num}_{ano_selecionado}' not in st.session_state:
-                st.session_state[f'confirm_clear_{mes_num}_{ano_selecionado}'] = False
-            
-            if not st.session_state[f'confirm_clear_{mes_num}_{ano_selecionado}']:
-                # Mostrar botão com preview dos dados
-                total_itens = transacoes_mes + entradas_mes + gastos_fixos_total
-                
-                if total_itens > 0:
-                    # Diferentes textos baseados no que tem
-                    if tem_fatura:
-                        botao_texto = f"🗑️ Limpar TODOS os Dados do Mês ({total_itens} itens)"
-                    else:
-                        botao_texto = f"🗑️ Limpar Dados do Mês ({total_itens} itens - sem fatura)"
-                    
-                    if st.button(botao_texto, use_container_width=True, type="secondary"):
-                        st.session_state[f'confirm_clear_{mes_num}_{ano_selecionado}'] = True
-                        st.rerun()
-                else:
-                    st.button("🗑️ Limpar TODOS os Dados do Mês (vazio)", use_container_width=True, disabled=True)
             else:
-                st.error("⚠️ **CONFIRMAÇÃO NECESSÁRIA**")
-                # Limpar nome do mês de checks visuais para exibição
-                nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
-                st.warning(f"Isso vai apagar TODOS os dados de {nome_mes_limpo}/{ano_selecionado}:")
-                if transacoes_mes > 0:
-                    st.write(f"• {transacoes_mes} transações da fatura")
-                if entradas_mes > 0:
-                    st.write(f"• {entradas_mes} entradas registradas")
-                if gastos_fixos_total > 0:
-                    st.write(f"• {gastos_fixos_total} gastos fixos")
-                if transacoes_mes == 0 and entradas_mes == 0 and gastos_fixos_total == 0:
-                    st.write("• Nenhum dado encontrado para remover")
-                st.write("")
-                
-                col2a, col2b = st.columns(2)
-                with col2a:
-                    if st.button("✅ SIM, Apagar Tudo", use_container_width=True, type="primary"):
-                        limpar_fatura(mes_num, ano_selecionado)
-                        st.session_state[f'confirm_clear_{mes_num}_{ano_selecionado}'] = False
-                with col2b:
-                    if st.button("❌ Cancelar", use_container_width=True):
-                        st.session_state[f'confirm_clear_{mes_num}_{ano_selecionado}'] = False
-                        st.rerun()
+                st.warning("Por favor, faça upload de uma fatura primeiro.")
 
-    # Na aba de Entradas do Mês
-    with tab_entradas:
-        st.header("💰 Entradas do Mês")
+    with col2:
+        # Contar itens do mês atual a partir do índice de disponibilidade
+        disponibilidade = snapshot.disponibilidade()
+        contagem_mes = disponibilidade['contagens'].get((ano_selecionado, mes_num), {})
+        transacoes_mes = contagem_mes.get('transacoes', 0)
+        entradas_mes = contagem_mes.get('entradas', 0)
+        gastos_fixos_total = disponibilidade['gastos_fixos']
+    
+        # Verificar se há fatura (para mostrar estado correto do botão)
+        tem_fatura = (ano_selecionado, mes_num) in disponibilidade['meses_com_fatura']
+    
+        # Inicializar estado do botão de confirmação
+        if f'confirm_clear_{mes_num}_{ano_selecionado}' not in st.session_state:
+            st.session_state[f'confirm_clear_{mes_num}_{ano_selecionado}'] = False
+    
+        if not st.session_state[f'confirm_clear_{mes_num}_{ano_selecionado}']:
+            # Mostrar botão com preview dos dados
+            total_itens = transacoes_mes + entradas_mes + gastos_fixos_total
         
-        # Formulário para adicionar entrada
-        with st.form("form_entrada"):
-            col1, col2, col3, col4 = st.columns([2, 3, 1.5, 1])
+            if total_itens > 0:
+                # Diferentes textos baseados no que tem
+                if tem_fatura:
+                    botao_texto = f"🗑️ Limpar TODOS os Dados do Mês ({total_itens} itens)"
+                else:
+                    botao_texto = f"🗑️ Limpar Dados do Mês ({total_itens} itens - sem fatura)"
             
+                if st.button(botao_texto, use_container_width=True, type="secondary"):
+                    st.session_state[f'confirm_clear_{mes_num}_{ano_selecionado}'] = True
+                    st.rerun(scope="fragment")
+            else:
+                st.button("🗑️ Limpar TODOS os Dados do Mês (vazio)", use_container_width=True, disabled=True)
+        else:
+            st.error("⚠️ **CONFIRMAÇÃO NECESSÁRIA**")
+            # Limpar nome do mês de checks visuais para exibição
+            nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
+            st.warning(f"Isso vai apagar TODOS os dados de {nome_mes_limpo}/{ano_selecionado}:")
+            if transacoes_mes > 0:
+                st.write(f"• {transacoes_mes} transações da fatura")
+            if entradas_mes > 0:
+                st.write(f"• {entradas_mes} entradas registradas")
+            if gastos_fixos_total > 0:
+                st.write(f"• {gastos_fixos_total} gastos fixos")
+            if transacoes_mes == 0 and entradas_mes == 0 and gastos_fixos_total == 0:
+                st.write("• Nenhum dado encontrado para remover")
+            st.write("")
+        
+            col2a, col2b = st.columns(2)
+            with col2a:
+                if st.button("✅ SIM, Apagar Tudo", use_container_width=True, type="primary"):
+                    st.session_state[f'confirm_clear_{mes_num}_{ano_selecionado}'] = False
+                    limpar_fatura(mes_num, ano_selecionado)
+            with col2b:
+                if st.button("❌ Cancelar", use_container_width=True):
+                    st.session_state[f'confirm_clear_{mes_num}_{ano_selecionado}'] = False
+                    st.rerun(scope="fragment")
+
+
+def envio_em_lote(snapshot, ano_padrao):
+    """Envio de várias faturas: leitura em segundo plano, revisão consolidada e uma única gravação"""
+    # O contador troca a chave do upload para esvaziá-lo depois de salvar
+    rodada = st.session_state.setdefault('rodada_envio_lote', 0)
+    arquivos = st.file_uploader("Faça upload das faturas (PDF)", type=['pdf'],
+                                accept_multiple_files=True, key=f"arquivos_lote_{rodada}")
+    if not arquivos:
+        st.info("Selecione os PDFs das faturas; o mês de cada uma é identificado automaticamente "
+                "e pode ser corrigido na revisão antes de salvar.")
+        return
+
+    conteudos = [(arquivo.name, arquivo.getvalue()) for arquivo in arquivos]
+    id_lote = hash_conteudo(''.join(hash_conteudo(conteudo) for _, conteudo in conteudos).encode())
+    tarefa = iniciar_leitura(
+        f"lote_{id_lote}", f"Lote de {len(conteudos)} faturas",
+        preparar_lote, conteudos, get_user_data_file(), classificar_transacao
+    )
+    if tarefa.estado != 'concluída':
+        return
+
+    lote = tarefa.resultado
+    for nome, mensagem in lote['erros']:
+        st.error(f"{nome}: {mensagem}")
+    if lote['repetidos']:
+        st.warning(f"Arquivos repetidos no lote, enviados uma vez só: {', '.join(lote['repetidos'])}")
+    if not lote['faturas']:
+        return
+
+    # Revisão: o mês e o ano deduzidos do PDF podem ser corrigidos antes de salvar
+    nomes_meses = list(mes_options_base.keys())
+    linhas = []
+    for preparada in lote['faturas']:
+        ano, mes = preparada['referencia'] or (None, None)
+        linhas.append({
+            'Arquivo': preparada['nome'],
+            'Mês': nomes_meses[mes - 1] if mes else None,
+            'Ano': ano or ano_padrao,
+            'Transações': len(preparada['transacoes']),
+            'Total': para_reais(sum(t['valor'] for t in preparada['transacoes']))
+        })
+    st.write("**Revisão do lote**")
+    revisao = st.data_editor(
+        pandas().DataFrame(linhas),
+        key=f"revisao_lote_{id_lote}",
+        hide_index=True,
+        use_container_width=True,
+        disabled=['Arquivo', 'Transações', 'Total'],
+        column_config={
+            'Mês': st.column_config.SelectboxColumn('Mês', options=nomes_meses, required=True),
+            'Ano': st.column_config.NumberColumn('Ano', min_value=2000, max_value=2100, step=1, format="%d"),
+            'Total': st.column_config.NumberColumn('Total', format="R$ %.2f")
+        }
+    ).to_dict('records')
+
+    disponibilidade = snapshot.disponibilidade()
+    escolhidos = [
+        (int(linha['Ano']), mes_options_base[linha['Mês']]) if linha['Mês'] and linha['Ano'] else None
+        for linha in revisao
+    ]
+    todas_duplicadas = duplicadas_do_lote(lote, snapshot, escolhidos)
+    faturas = []
+    meses_no_lote = {}
+    ignoradas = 0
+    for preparada, duplicadas, linha, escolhido in zip(lote['faturas'], todas_duplicadas, revisao, escolhidos):
+        if escolhido is None:
+            st.warning(f"{linha['Arquivo']}: não foi possível identificar o mês; escolha-o na revisão.")
+            continue
+        ano, mes = escolhido
+        meses_no_lote.setdefault((ano, mes), []).append(linha['Arquivo'])
+        transacoes = transacoes_para_salvar(preparada, mes, ano, duplicadas)
+        ignoradas += len(preparada['transacoes']) - len(transacoes)
+        if transacoes:
+            faturas.append({'mes': mes, 'ano': ano, 'transacoes': transacoes})
+
+    conflitos = {chave: nomes for chave, nomes in meses_no_lote.items() if len(nomes) > 1}
+    for (ano, mes), nomes in sorted(conflitos.items()):
+        st.error(f"{mes:02d}/{ano} aparece em mais de um arquivo: {', '.join(nomes)}")
+    substituidas = sorted(chave for chave in meses_no_lote if chave in disponibilidade['meses_com_fatura'])
+    if substituidas:
+        st.warning("Já existe fatura salva em " + ', '.join(f"{mes:02d}/{ano}" for ano, mes in substituidas) +
+                   "; ela será substituída.")
+    if ignoradas:
+        st.info(f"{ignoradas} transações já estão salvas em outros meses e serão ignoradas ao salvar.")
+
+    total_transacoes = sum(len(f['transacoes']) for f in faturas)
+    bloqueado = bool(conflitos) or len(meses_no_lote) < len(lote['faturas']) or not faturas
+    if st.button(f"💾 Salvar {len(faturas)} faturas ({total_transacoes} transações)",
+                 use_container_width=True, disabled=bloqueado):
+        try:
+            adicionar_faturas(faturas)
+            st.toast(f"{len(faturas)} faturas salvas com sucesso!")
+            st.session_state['rodada_envio_lote'] = rodada + 1
+            st.rerun()  # Atualizar indicadores visuais
+        except Exception as e:
+            st.error(f"Erro ao salvar faturas: {str(e)}")
+
+@st.fragment
+@medir_fragmento
+def aba_entradas(snapshot, mes_num, ano_selecionado, mes_selecionado):
+    """Conteúdo da aba de entradas do mês"""
+    snapshot.sincronizar()
+    st.header("💰 Entradas do Mês")
+
+    # Formulário para adicionar entrada
+    with st.form("form_entrada"):
+        col1, col2, col3, col4 = st.columns([2, 3, 1.5, 1])
+    
+        with col1:
+            valor_entrada = st.number_input("Valor", min_value=0.0, format="%.2f")
+    
+        with col2:
+            descricao_entrada = st.text_input("Descrição")
+    
+        with col3:
+            tipo_entrada = st.selectbox(
+                "Tipo",
+                                        options=["Salário", "Freelance"]
+            )
+    
+        with col4:
+            st.write("")  # Espaço para alinhar
+            if st.form_submit_button("Adicionar Entrada", use_container_width=True):
+                if valor_entrada > 0 and descricao_entrada:
+                    adicionar_entrada(mes_num, ano_selecionado, para_centavos(valor_entrada), descricao_entrada, tipo_entrada)
+                    st.toast("✓ Entrada adicionada com sucesso!")
+                    # Manter a seleção do mês atual
+                    nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
+                    st.session_state['mes_manter_selecao'] = nome_mes_limpo
+                    st.rerun()  # Atualizar indicadores visuais
+                else:
+                    st.error("Por favor, preencha todos os campos.")
+
+    # Mostrar entradas existentes
+    entradas_existentes = snapshot.entradas(mes_num, ano_selecionado)
+    if entradas_existentes:
+        # Mostrar total em cima
+        total_entradas = sum(e['valor'] for e in entradas_existentes)
+        st.metric("Total de Entradas", formatar_valor(total_entradas))
+    
+        # Mostrar tabela
+        st.write("### Entradas Registradas")
+        for idx, entrada in enumerate(entradas_existentes):
+            col1, col2, col3, col4 = st.columns([1.5, 3, 1.5, 0.5])
             with col1:
-                valor_entrada = st.number_input("Valor", min_value=0.0, format="%.2f")
-            
+                st.write(formatar_valor(entrada['valor']))
             with col2:
-                descricao_entrada = st.text_input("Descrição")
-            
+                st.write(entrada['descricao'])
             with col3:
-                tipo_entrada = st.selectbox(
-                    "Tipo",
-                                            options=["Salário", "Freelance"]
-                )
-            
+                st.write(entrada.get('tipo', 'Salário'))
             with col4:
-                st.write("")  # Espaço para alinhar
-                if st.form_submit_button("Adicionar Entrada", use_container_width=True):
-                    if valor_entrada > 0 and descricao_entrada:
-                        adicionar_entrada(mes_num, ano_selecionado, valor_entrada, descricao_entrada, tipo_entrada)
-                        st.success("✓ Entrada adicionada com sucesso!")
-                        # Manter a seleção do mês atual
-                        nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
-                        st.session_state['mes_manter_selecao'] = nome_mes_limpo
-                        st.rerun()  # Atualizar indicadores visuais
+                if st.button("🗑️", key=f"del_entrada_{idx}", help="Deletar entrada"):
+                    remover_entrada(
+                        entrada['mes'],
+                        entrada['ano'],
+                        entrada['valor'],
+                        entrada['descricao'],
+                        entrada.get('tipo', 'Salário')
+                    )
+                    # Manter a seleção do mês atual
+                    nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
+                    st.session_state['mes_manter_selecao'] = nome_mes_limpo
+                    st.rerun()
+                
+            # Linha fina entre itens
+            if idx < len(entradas_existentes) - 1:
+                st.markdown("<hr style='margin: 0.5rem 0; border: 0.5px solid #ddd;'>", unsafe_allow_html=True)
+    else:
+        st.info("Nenhuma entrada registrada para este mês.")
+
+
+def chave_gasto_fixo(descricao, valor):
+    """Chave usada para saber se uma transação já está cadastrada como gasto fixo"""
+    return (descricao, int(valor))
+
+@st.fragment
+@medir_fragmento
+def expander_categoria(categoria, total, total_atual, df, snapshot, categorias, anomalias, mes_num, ano_selecionado,
+                       ordenacao='Maior valor', tamanho_pagina=25):
+    """Expander com as transações de uma categoria, atualizado de forma independente"""
+    dados = snapshot.dados
+    # Usar o estado para controlar se o expander está aberto
+    is_open = st.session_state.categoria_aberta == categoria
+    anomalia_categoria = anomalias['categorias'].get((ano_selecionado, mes_num, categoria))
+    badge = " ⚠️" if anomalia_categoria else ""
+    with st.expander(
+        f"📁 {categoria} - {formatar_valor(total)} ({(total/total_atual*100):.1f}%){badge}",
+        expanded=is_open
+    ):
+        if anomalia_categoria:
+            st.caption(
+                f"⚠️ Gasto acima do normal para {categoria}: "
+                f"mediana dos meses anteriores {formatar_valor(anomalia_categoria['mediana'])}, "
+                f"limite esperado {formatar_valor(anomalia_categoria['limite'])}"
+            )
+
+        gastos_categoria = ordenar_transacoes(df[df['categoria'] == categoria], ordenacao)
+        gastos_categoria = paginar(gastos_categoria, f"pagina_{categoria}_{mes_num}_{ano_selecionado}", tamanho_pagina)
+        fixos = {chave_gasto_fixo(g['descricao'], g['valor']) for g in dados.get('gastos_fixos', [])}
+
+        # Criar container para reduzir espaçamento
+        with st.container():
+            for _, transacao in gastos_categoria.iterrows():
+                # Widgets e alterações endereçam a transação pelo id, não pela posição
+                idx = transacao['id']
+                # Layout mais compacto
+                cols = st.columns([1, 3, 2, 0.5, 0.5, 0.5])
+
+                with cols[0]:
+                    st.write(transacao['data'])
+
+                with cols[1]:
+                    st.write(transacao['descricao'])
+
+                with cols[2]:
+                    anomalia = anomalias['transacoes'].get(
+                        (ano_selecionado, mes_num, transacao['descricao'], transacao['valor'])
+                    )
+                    if anomalia:
+                        st.write(f"{formatar_valor(transacao['valor'])} 🔺 {anomalia['razao']:.1f}× a mediana")
                     else:
-                        st.error("Por favor, preencha todos os campos.")
-
-        # Mostrar entradas existentes
-        entradas_existentes = obter_entradas(mes_num, ano_selecionado)
-        if entradas_existentes:
-            # Mostrar total em cima
-            total_entradas = sum(e['valor'] for e in entradas_existentes)
-            st.metric("Total de Entradas", formatar_valor(total_entradas))
-            
-            # Criar DataFrame para tabela organizada
-            df_entradas = pd.DataFrame([{
-                'Valor': formatar_valor(entrada['valor']),
-                'Descrição': entrada['descricao'],
-                'Tipo': entrada.get('tipo', 'Salário'),
-                'Ações': f"del_entrada_{idx}"
-            } for idx, entrada in enumerate(entradas_existentes)])
-            
-            # Mostrar tabela
-            st.write("### Entradas Registradas")
-            for idx, entrada in enumerate(entradas_existentes):
-                col1, col2, col3, col4 = st.columns([1.5, 3, 1.5, 0.5])
-                with col1:
-                    st.write(formatar_valor(entrada['valor']))
-                with col2:
-                    st.write(entrada['descricao'])
-                with col3:
-                    st.write(entrada.get('tipo', 'Salário'))
-                with col4:
-                    if st.button("🗑️", key=f"del_entrada_{idx}", help="Deletar entrada"):
-                        remover_entrada(
-                            entrada['mes'],
-                            entrada['ano'],
-                            entrada['valor'],
-                            entrada['descricao'],
-                            entrada.get('tipo', 'Salário')
-                        )
-                        # Manter a seleção do mês atual
-                        nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
-                        st.session_state['mes_manter_selecao'] = nome_mes_limpo
+                        st.write(formatar_valor(transacao['valor']))
+
+                with cols[3]:
+                    if chave_gasto_fixo(transacao['descricao'], transacao['valor']) in fixos:
+                        st.write("📌")
+
+                with cols[4]:
+                    if st.button("✏️", key=f"edit_{idx}"):
+                        st.session_state[f'editing_{idx}'] = True
+                        # Salvar a categoria atual para manter aberta
+                        st.session_state.categoria_aberta = categoria
+
+                with cols[5]:
+                    if st.button("🗑️", key=f"del_{idx}"):
+                        # Salvar a categoria atual para manter aberta
+                        st.session_state.categoria_aberta = categoria
+                        remover_transacao(idx)
+                        st.toast("✓ Transação excluída com sucesso!")
                         st.rerun()
-                        
-                # Linha fina entre itens
-                if idx < len(entradas_existentes) - 1:
-                    st.markdown("<hr style='margin: 0.5rem 0; border: 0.5px solid #ddd;'>", unsafe_allow_html=True)
-        else:
-            st.info("Nenhuma entrada registrada para este mês.")
 
-    # Na aba de Análise
-    with tab_analise:
-        # Inicializar session_state para categoria aberta
-        if 'categoria_aberta' not in st.session_state:
-            st.session_state.categoria_aberta = None
+                # Se o botão de edição foi clicado, mostrar o formulário
+                if st.session_state.get(f'editing_{idx}', False):
+                    with st.form(f"form_transacao_{idx}", clear_on_submit=True):
+                        # Garantir que a categoria existe na lista
+                        categoria_atual = transacao['categoria']
+                        try:
+                            index_categoria = categorias.index(categoria_atual)
+                        except ValueError:
+                            # Se a categoria não existir, adicionar à lista e usar como índice
+                            categorias.append(categoria_atual)
+                            salvar_categorias(categorias)
+                            index_categoria = len(categorias) - 1
+
+                        nova_categoria = st.selectbox(
+                            "Categoria",
+                            options=categorias,  # Usar categorias do arquivo
+                            key=f"cat_{idx}",
+                            index=index_categoria
+                        )
 
-        # Carregar categorias do arquivo
-        categorias = carregar_categorias()
+                        is_fixo = st.checkbox("Marcar como gasto fixo", key=f"fix_{idx}")
 
-        # Botão para gerenciar classificações
-        with st.expander("⚙️ Gerenciar Classificações"):
-            tab1, tab2, tab3 = st.tabs(["Criar/Deletar Categorias", "Regras Automáticas", "Regras Existentes"])
-            
-            with tab1:
-                col1, col2 = st.columns([1, 1])
-                
-                with col1:
-                    st.write("**Criar Nova Classificação**")
-                    with st.form("nova_classificacao", clear_on_submit=True):
-                        nova_cat = st.text_input("Nome da Nova Classificação")
-                        if st.form_submit_button("Criar"):
-                            if nova_cat:
-                                categorias = carregar_categorias()
-                                if nova_cat not in categorias:
-                                    categorias.append(nova_cat)
-                                    salvar_categorias(categorias)
-                                    st.success(f"✓ Classificação '{nova_cat}' criada com sucesso!")
-                                    time.sleep(0.5)
+                        col1, col2 = st.columns([1, 1])
+                        with col1:
+                            if st.form_submit_button("💾 Salvar"):
+                                try:
+                                    def salvar_edicao(dados_atuais):
+                                        # Atualizar categoria na transação
+                                        fatura, posicao = localizar_transacao(
+                                            dados_atuais, idx, indice_por_id(dados_atuais, obter_versao_dados())
+                                        )
+                                        if fatura is None:
+                                            return False
+                                        fatura['transacoes'][posicao]['categoria'] = nova_categoria
+
+                                        # Atualizar gastos fixos
+                                        chave = chave_gasto_fixo(transacao['descricao'], transacao['valor'])
+                                        gastos_fixos = dados_atuais.setdefault('gastos_fixos', [])
+                                        if is_fixo:
+                                            if not any(chave_gasto_fixo(g['descricao'], g['valor']) == chave for g in gastos_fixos):
+                                                gastos_fixos.append({
+                                                    'descricao': transacao['descricao'],
+                                                    'valor': transacao['valor'],
+                                                    'categoria': nova_categoria,
+                                                    'data_adicao': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                                                })
+                                        else:
+                                            dados_atuais['gastos_fixos'] = [
+                                                g for g in gastos_fixos
+                                                if chave_gasto_fixo(g['descricao'], g['valor']) != chave
+                                            ]
+                                        return True
+
+                                    # Salvar todas as alterações sobre os dados atuais, sob a trava do arquivo
+                                    if not atualizar_dados(salvar_edicao):
+                                        st.error("Esta transação não existe mais; recarregue a página.")
+                                        return
+                                    st.session_state[f'editing_{idx}'] = False
+                                    # Manter a categoria aberta após salvar
+                                    st.session_state.categoria_aberta = categoria
+                                    st.toast("✓ Alterações salvas!")
                                     st.rerun()
-                                else:
-                                    st.error("Esta classificação já existe!")
-                
-                with col2:
-                    st.write("**Deletar Classificação**")
-                    with st.form("deletar_classificacao", clear_on_submit=True):
-                        if categorias:
-                            cat_deletar = st.selectbox("Categoria para Deletar", options=categorias)
-                            if st.form_submit_button("🗑️ Deletar", type="secondary"):
-                                if remover_categoria(cat_deletar):
-                                    st.success(f"✓ Classificação '{cat_deletar}' deletada com sucesso!")
-                                    time.sleep(0.5)
-                                    st.rerun()
-                                else:
-                                    st.error("Erro ao deletar classificação!")
+                                except Exception as e:
+                                    st.error(f"Erro ao salvar alterações: {str(e)}")
+
+                        with col2:
+                            if st.form_submit_button("❌ Cancelar"):
+                                st.session_state[f'editing_{idx}'] = False
+                                # Manter a categoria aberta após cancelar
+                                st.session_state.categoria_aberta = categoria
+                                st.rerun(scope="fragment")
+
+                st.markdown("---")
+
+
+@st.fragment
+@medir_fragmento
+def editor_grade_fatura(df, snapshot, categorias, anomalias, mes_num, ano_selecionado):
+    """
+    Edição em lote das transações do mês em uma única tabela.
+    As alterações são aplicadas de uma vez e gravadas com um único salvar_dados.
+    """
+    dados = snapshot.dados
+    fixos = {chave_gasto_fixo(g['descricao'], g['valor']) for g in dados.get('gastos_fixos', [])}
+
+    # Linhas indexadas pelo id da transação
+    grade = df.set_index('id')[['data', 'descricao', 'valor', 'categoria']].copy()
+    grade['gasto_fixo'] = [chave_gasto_fixo(d, v) in fixos for d, v in zip(grade['descricao'], grade['valor'])]
+    alertas = []
+    for descricao, valor in zip(grade['descricao'], grade['valor']):
+        anomalia = anomalias['transacoes'].get((ano_selecionado, mes_num, descricao, valor))
+        alertas.append(f"🔺 {anomalia['razao']:.1f}×" if anomalia else "")
+    grade['alerta'] = alertas
+    grade['excluir'] = False
+    grade = grade.sort_values(['categoria', 'valor'], ascending=[True, False])
+    # Exibição em reais; as alterações são aplicadas pelo id, não pelo valor
+    grade['valor'] = grade['valor'].map(para_reais)
+
+    # Categorias que aparecem na fatura mas não estão no arquivo continuam selecionáveis
+    opcoes_categoria = categorias + sorted(set(grade['categoria']) - set(categorias))
+
+    with st.form(f"grade_transacoes_{mes_num}_{ano_selecionado}"):
+        editado = st.data_editor(
+            grade,
+            hide_index=True,
+            use_container_width=True,
+            disabled=['data', 'descricao', 'valor', 'alerta'],
+            column_config={
+                "data": st.column_config.TextColumn("Data", width="small"),
+                "descricao": st.column_config.TextColumn("Descrição", width="large"),
+                "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+                "categoria": st.column_config.SelectboxColumn("Categoria", options=opcoes_categoria, required=True),
+                "gasto_fixo": st.column_config.CheckboxColumn("📌 Fixo"),
+                "alerta": st.column_config.TextColumn("Alerta", width="small"),
+                "excluir": st.column_config.CheckboxColumn("🗑️ Excluir")
+            },
+            key=f"editor_grade_{mes_num}_{ano_selecionado}"
+        )
+        salvar = st.form_submit_button("💾 Salvar alterações", type="primary")
+
+    if not salvar:
+        return
+
+    # Diferença entre a tabela original e a editada (o índice é o id da transação)
+    editado = editado.loc[grade.index]
+    mudou_categoria = editado['categoria'] != grade['categoria']
+    mudou_fixo = editado['gasto_fixo'] != grade['gasto_fixo']
+    excluir = editado['excluir']
+    if not (mudou_categoria.any() or mudou_fixo.any() or excluir.any()):
+        st.info("Nenhuma alteração para salvar.")
+        return
+
+    categorias_novas = {idx: editado.at[idx, 'categoria'] for idx in editado.index[mudou_categoria & ~excluir]}
+    fixos_alterados = {idx: bool(editado.at[idx, 'gasto_fixo']) for idx in editado.index[mudou_fixo & ~excluir]}
+    excluidas = set(editado.index[excluir])
+
+    def aplicar(dados_atuais):
+        """Aplica as alterações da grade aos dados atuais, sob a trava do arquivo"""
+        indice = indice_por_id(dados_atuais, obter_versao_dados())
+
+        def transacao_por_id(id_transacao):
+            fatura, posicao = localizar_transacao(dados_atuais, id_transacao, indice)
+            return fatura['transacoes'][posicao] if fatura is not None else None
+
+        for idx, categoria_nova in categorias_novas.items():
+            transacao = transacao_por_id(idx)
+            if transacao is not None:
+                transacao['categoria'] = categoria_nova
+
+        gastos_fixos = dados_atuais.setdefault('gastos_fixos', [])
+        fixos_atuais = {chave_gasto_fixo(g['descricao'], g['valor']) for g in gastos_fixos}
+        remover_fixos = set()
+        for idx, fixo in fixos_alterados.items():
+            transacao = transacao_por_id(idx)
+            if transacao is None:
+                continue
+            chave = chave_gasto_fixo(transacao['descricao'], transacao['valor'])
+            if fixo:
+                if chave not in fixos_atuais:
+                    gastos_fixos.append({
+                        'descricao': transacao['descricao'],
+                        'valor': transacao['valor'],
+                        'categoria': transacao.get('categoria', editado.at[idx, 'categoria']),
+                        'data_adicao': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    })
+                    fixos_atuais.add(chave)
+            else:
+                remover_fixos.add(chave)
+        if remover_fixos:
+            dados_atuais['gastos_fixos'] = [
+                g for g in gastos_fixos
+                if chave_gasto_fixo(g['descricao'], g['valor']) not in remover_fixos
+            ]
+
+        if excluidas:
+            for fatura in dados_atuais.get('faturas', []):
+                if fatura['mes'] == mes_num and fatura['ano'] == ano_selecionado:
+                    fatura['transacoes'] = [t for t in fatura['transacoes'] if t['id'] not in excluidas]
+
+    atualizar_dados(aplicar)
+    st.toast(
+        f"✓ {int((mudou_categoria & ~excluir).sum())} categorias, "
+        f"{int((mudou_fixo & ~excluir).sum())} gastos fixos e {len(excluidas)} exclusões salvos!"
+    )
+    st.rerun()
+
+
+@st.fragment
+@medir_fragmento
+def aba_analise(snapshot, mes_num, ano_selecionado, mes_selecionado, mes_options):
+    """Conteúdo da aba de análise do mês"""
+    snapshot.sincronizar()
+    # Inicializar session_state para categoria aberta
+    if 'categoria_aberta' not in st.session_state:
+        st.session_state.categoria_aberta = None
+
+    # Carregar categorias do arquivo
+    categorias = carregar_categorias()
+
+    # Botão para gerenciar classificações
+    with st.expander("⚙️ Gerenciar Classificações"):
+        tab1, tab2, tab3 = st.tabs(["Criar/Deletar Categorias", "Regras Automáticas", "Regras Existentes"])
+    
+        with tab1:
+            col1, col2 = st.columns([1, 1])
+        
+            with col1:
+                st.write("**Criar Nova Classificação**")
+                with st.form("nova_classificacao", clear_on_submit=True):
+                    nova_cat = st.text_input("Nome da Nova Classificação")
+                    if st.form_submit_button("Criar"):
+                        if nova_cat:
+                            categorias = carregar_categorias()
+                            if nova_cat not in categorias:
+                                categorias.append(nova_cat)
+                                salvar_categorias(categorias)
+                                st.toast(f"✓ Classificação '{nova_cat}' criada com sucesso!")
+                                st.rerun(scope="fragment")
+                            else:
+                                st.error("Esta classificação já existe!")
+        
+            with col2:
+                st.write("**Deletar Classificação**")
+                with st.form("deletar_classificacao", clear_on_submit=True):
+                    if categorias:
+                        cat_deletar = st.selectbox("Categoria para Deletar", options=categorias)
+                        if st.form_submit_button("🗑️ Deletar", type="secondary"):
+                            if remover_categoria(cat_deletar):
+                                st.toast(f"✓ Classificação '{cat_deletar}' deletada com sucesso!")
+                                st.rerun(scope="fragment")
+                            else:
+                                st.error("Erro ao deletar classificação!")
+                    else:
+                        st.info("Nenhuma categoria disponível para deletar")
+                        # Botão desabilitado quando não há categorias para deletar
+                        st.form_submit_button("🗑️ Deletar", disabled=True)
+    
+        with tab2:
+            st.write("**Criar Nova Regra Automática**")
+            st.info("💡 Defina palavras-chave para classificar automaticamente suas transações")
+        
+            with st.form("nova_regra_auto", clear_on_submit=True):
+                col1, col2, col3 = st.columns([2, 2, 1])
+            
+                with col1:
+                    palavra_chave = st.text_input("Palavra-chave", placeholder="ex: ifood, uber, netflix")
+            
+                with col2:
+                    categoria_regra = st.selectbox("Classificar como:", options=categorias)
+            
+                with col3:
+                    st.write("")  # Espaço para alinhamento
+                    if st.form_submit_button("Adicionar Regra"):
+                        if palavra_chave and categoria_regra:
+                            if adicionar_regra_classificacao(palavra_chave, categoria_regra):
+                                st.toast(f"✓ Regra criada: '{palavra_chave}' → {categoria_regra}")
+                            
+                                # Aplicar a regra às transações existentes em segundo plano
+                                iniciar_reaplicacao_regras()
+                            
+                                # Manter a seleção do mês atual
+                                nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
+                                st.session_state['mes_manter_selecao'] = nome_mes_limpo
+                                st.rerun()
+                            else:
+                                st.error("Erro ao criar regra!")
                         else:
-                            st.info("Nenhuma categoria disponível para deletar")
-                            # Botão desabilitado quando não há categorias para deletar
-                            st.form_submit_button("🗑️ Deletar", disabled=True)
+                            st.error("Por favor, preencha todos os campos!")
+        
+            st.markdown("---")
+            st.write("**Exemplo de uso:**")
+            st.write("- Palavra-chave: `ifood` → Classificação: `Alimentação`")
+            st.write("- Palavra-chave: `uber` → Classificação: `Transporte`")
+            st.write("- Palavra-chave: `netflix` → Classificação: `Entretenimento`")
+    
+        with tab3:
+            st.write("**Regras Automáticas Existentes**")
+            regras = carregar_regras_classificacao()
+        
+            if regras:
+                st.write(f"Total de regras: {len(regras)}")
             
-            with tab2:
-                st.write("**Criar Nova Regra Automática**")
-                st.info("💡 Defina palavras-chave para classificar automaticamente suas transações")
-                
-                with st.form("nova_regra_auto", clear_on_submit=True):
+                for idx, regra in enumerate(regras):
                     col1, col2, col3 = st.columns([2, 2, 1])
-                    
+                
                     with col1:
-                        palavra_chave = st.text_input("Palavra-chave", placeholder="ex: ifood, uber, netflix")
-                    
+                        st.write(f"**{regra['palavra_chave']}**")
+                
                     with col2:
-                        categoria_regra = st.selectbox("Classificar como:", options=categorias)
-                    
+                        st.write(f"→ {regra['categoria']}")
+                
                     with col3:
-                        st.write("")  # Espaço para alinhamento
-                        if st.form_submit_button("Adicionar Regra"):
-                            if palavra_chave and categoria_regra:
-                                if adicionar_regra_classificacao(palavra_chave, categoria_regra):
-                                    st.success(f"✓ Regra criada: '{palavra_chave}' → {categoria_regra}")
-                                    
-                                    # Aplicar a regra imediatamente às transações existentes
-                                    with st.spinner("Aplicando regra às transações existentes..."):
-                                        resultado = reaplicar_regras_todas_transacoes()
-                                        if resultado['atualizadas'] > 0:
-                                            st.success(f"✓ Regra aplicada a {resultado['atualizadas']} transações!")
-                                    
-                                    # Manter a seleção do mês atual
-                                    nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
-                                    st.session_state['mes_manter_selecao'] = nome_mes_limpo
-                                    
-                                    time.sleep(0.5)
-                                    st.rerun()
-                                else:
-                                    st.error("Erro ao criar regra!")
-                            else:
-                                st.error("Por favor, preencha todos os campos!")
+                        if st.button("🗑️", key=f"del_regra_{idx}", help="Deletar regra"):
+                            if remover_regra_classificacao(regra['palavra_chave']):
+                                st.toast(f"✓ Regra '{regra['palavra_chave']}' deletada!")
+                                st.rerun(scope="fragment")
                 
-                st.markdown("---")
-                st.write("**Exemplo de uso:**")
-                st.write("- Palavra-chave: `ifood` → Classificação: `Alimentação`")
-                st.write("- Palavra-chave: `uber` → Classificação: `Transporte`")
-                st.write("- Palavra-chave: `netflix` → Classificação: `Entretenimento`")
-            
-            with tab3:
-                st.write("**Regras Automáticas Existentes**")
-                regras = carregar_regras_classificacao()
+                    if idx < len(regras) - 1:
+                        st.markdown("<hr style='margin: 0.5rem 0; border: 0.5px solid #ddd;'>", unsafe_allow_html=True)
+            else:
+                st.info("Nenhuma regra automática criada ainda.")
+                st.write("Use a aba 'Regras Automáticas' para criar sua primeira regra!")
+        
+            # Teste das regras - mostrar quantas transações seriam afetadas
+            st.markdown("---")
+            if st.button("🔍 Testar Regras nas Transações Atuais", use_container_width=True):
+                with st.spinner("Testando regras..."):
+                    dados = snapshot.dados
+                    regras = carregar_regras_classificacao()
                 
-                if regras:
-                    st.write(f"Total de regras: {len(regras)}")
+                    if not regras:
+                        st.warning("❌ Nenhuma regra criada ainda!")
+                    else:
+                        st.write("### Teste das Regras:")
                     
-                    for idx, regra in enumerate(regras):
-                        col1, col2, col3 = st.columns([2, 2, 1])
-                        
-                        with col1:
-                            st.write(f"**{regra['palavra_chave']}**")
-                        
-                        with col2:
-                            st.write(f"→ {regra['categoria']}")
-                        
-                        with col3:
-                            if st.button("🗑️", key=f"del_regra_{idx}", help="Deletar regra"):
-                                if remover_regra_classificacao(regra['palavra_chave']):
-                                    st.success(f"✓ Regra '{regra['palavra_chave']}' deletada!")
-                                    time.sleep(0.5)
-                                    st.rerun()
-                        
-                        if idx < len(regras) - 1:
-                            st.markdown("<hr style='margin: 0.5rem 0; border: 0.5px solid #ddd;'>", unsafe_allow_html=True)
-                else:
-                    st.info("Nenhuma regra automática criada ainda.")
-                    st.write("Use a aba 'Regras Automáticas' para criar sua primeira regra!")
-                
-                # Teste das regras - mostrar quantas transações seriam afetadas
-                st.markdown("---")
-                if st.button("🔍 Testar Regras nas Transações Atuais", use_container_width=True):
-                    with st.spinner("Testando regras..."):
-                        dados = carregar_dados()
-                        regras = carregar_regras_classificacao()
+                        for regra in regras:
+                            st.write(f"**Regra:** '{regra['palavra_chave']}' → {regra['categoria']}")
                         
-                        if not regras:
-                            st.warning("❌ Nenhuma regra criada ainda!")
-                        else:
-                            st.write("### Teste das Regras:")
-                            
-                            for regra in regras:
-                                st.write(f"**Regra:** '{regra['palavra_chave']}' → {regra['categoria']}")
-                                
-                                # Contar transações que batem com esta regra
-                                transacoes_encontradas = []
-                                for fatura in dados.get('faturas', []):
-                                    for transacao in fatura.get('transacoes', []):
-                                        desc = transacao['descricao'].lower().strip()
-                                        palavra = regra['palavra_chave'].lower().strip()
-                                        if palavra in desc:
-                                            transacoes_encontradas.append({
-                                                'descricao': transacao['descricao'],
-                                                'categoria_atual': transacao.get('categoria', 'Não definida'),
-                                                'mes': fatura['mes'],
-                                                'ano': fatura['ano']
-                                            })
-                                
-                                if transacoes_encontradas:
-                                    st.success(f"✅ {len(transacoes_encontradas)} transações encontradas:")
-                                    for i, t in enumerate(transacoes_encontradas[:5]):  # Mostrar apenas as 5 primeiras
-                                        categoria_icon = "🔒" if t['categoria_atual'] == regra['categoria'] else "📝"
-                                        st.write(f"  {categoria_icon} {t['descricao']} (atual: {t['categoria_atual']})")
-                                    if len(transacoes_encontradas) > 5:
-                                        st.write(f"  ... e mais {len(transacoes_encontradas) - 5} transações")
-                                else:
-                                    st.info(f"ℹ️ Nenhuma transação encontrada com '{regra['palavra_chave']}'")
-                                st.write("")
-                
-                # Botão para reaplicar regras
-                if st.button("🔄 Reaplicar Regras a Todas as Transações", use_container_width=True):
-                    with st.spinner("Reaplicando regras..."):
-                        # Limpar cache para garantir que as regras mais recentes sejam carregadas
-                        st.cache_data.clear()
-                        
-                        resultado = reaplicar_regras_todas_transacoes()
-                        
-                        # Mostrar resultado detalhado
-                        if resultado['atualizadas'] > 0:
-                            st.success(f"✅ Reaplicação concluída!")
-                            st.success(f"📝 {resultado['atualizadas']} transações foram atualizadas com novas regras")
-                                
-                            # Mostrar quais regras foram aplicadas
-                            regras = carregar_regras_classificacao()
-                            if regras:
-                                st.write("**Regras aplicadas:**")
-                                for regra in regras:
-                                    st.write(f"• '{regra['palavra_chave']}' → {regra['categoria']}")
-                        else:
-                            st.info("ℹ️ Nenhuma transação foi modificada - todas já estão classificadas corretamente!")
+                            # Contar transações que batem com esta regra
+                            transacoes_encontradas = []
+                            for fatura in dados.get('faturas', []):
+                                for transacao in fatura.get('transacoes', []):
+                                    desc = transacao['descricao'].lower().strip()
+                                    palavra = regra['palavra_chave'].lower().strip()
+                                    if palavra in desc:
+                                        transacoes_encontradas.append({
+                                            'descricao': transacao['descricao'],
+                                            'categoria_atual': transacao.get('categoria', 'Não definida'),
+                                            'mes': fatura['mes'],
+                                            'ano': fatura['ano']
+                                        })
                         
-                        # Manter a seleção do mês atual
-                        nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
-                        st.session_state['mes_manter_selecao'] = nome_mes_limpo
-                        st.rerun()
-        
-        # Carregar dados
-        dados = carregar_dados()
-        faturas = dados.get('faturas', [])
-        
-        # Filtrar fatura atual e anterior
-        fatura_atual = None
-        fatura_anterior = None
-        mes_anterior = mes_num - 1 if mes_num > 1 else 12
-        ano_anterior = ano_selecionado if mes_num > 1 else ano_selecionado - 1
-        
-        for fatura in faturas:
-            if fatura['mes'] == mes_num and fatura['ano'] == ano_selecionado:
-                fatura_atual = fatura
-            elif fatura['mes'] == mes_anterior and fatura['ano'] == ano_anterior:
-                fatura_anterior = fatura
-        
-        if not fatura_atual:
-            st.warning("Nenhuma fatura encontrada para este mês.")
-            st.stop()
-        
-        # Calcular dados para métricas
-        df = pd.DataFrame(fatura_atual['transacoes'])
-        
-        # Atualizar categorias com as já salvas
-        for i, transacao in enumerate(fatura_atual['transacoes']):
-            if 'categoria' in transacao:
-                df.loc[i, 'categoria'] = transacao['categoria']
-            else:
-                df.loc[i, 'categoria'] = classificar_transacao(transacao['descricao'])
-        
-        # Filtrar transações com categoria ENTRADA (não devem aparecer na análise)
-        df = df[df['categoria'] != 'ENTRADA']
-        
-        # Calcular totais por categoria (filtrar ENTRADA se existir)
-        totais_categoria = df.groupby('categoria')['valor'].sum().sort_values(ascending=False)
+                            if transacoes_encontradas:
+                                st.success(f"✅ {len(transacoes_encontradas)} transações encontradas:")
+                                for i, t in enumerate(transacoes_encontradas[:5]):  # Mostrar apenas as 5 primeiras
+                                    categoria_icon = "🔒" if t['categoria_atual'] == regra['categoria'] else "📝"
+                                    st.write(f"  {categoria_icon} {t['descricao']} (atual: {t['categoria_atual']})")
+                                if len(transacoes_encontradas) > 5:
+                                    st.write(f"  ... e mais {len(transacoes_encontradas) - 5} transações")
+                            else:
+                                st.info(f"ℹ️ Nenhuma transação encontrada com '{regra['palavra_chave']}'")
+                            st.write("")
         
-        # Remover categoria ENTRADA se existir (não deve aparecer na análise)
-        if 'ENTRADA' in totais_categoria.index:
-            totais_categoria = totais_categoria.drop('ENTRADA')
+            # Botão para reaplicar regras
+            if st.button("🔄 Reaplicar Regras a Todas as Transações", use_container_width=True):
+                # Limpar cache para garantir que as regras mais recentes sejam carregadas
+                st.cache_data.clear()
+                iniciar_reaplicacao_regras()
+                
+                # Manter a seleção do mês atual
+                nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
+                st.session_state['mes_manter_selecao'] = nome_mes_limpo
+                st.rerun()
 
-        # Calcular total geral
-        total_atual = totais_categoria.sum()
-        
-        # Calcular entradas do mês atual
-        entradas_mes = obter_entradas(mes_num, ano_selecionado)
-        total_entradas = sum(e['valor'] for e in entradas_mes)
-        
-        # Calcular total anterior
-        total_anterior = 0
+    # Dados carregados neste rerun
+    dados = snapshot.dados
+
+    # Filtrar fatura atual e anterior
+    mes_anterior = mes_num - 1 if mes_num > 1 else 12
+    ano_anterior = ano_selecionado if mes_num > 1 else ano_selecionado - 1
+    fatura_atual = snapshot.fatura(mes_num, ano_selecionado)
+    fatura_anterior = snapshot.fatura(mes_anterior, ano_anterior)
+
+    if not fatura_atual:
+        st.warning("Nenhuma fatura encontrada para este mês.")
+        return
+
+    # Calcular dados para métricas (transações classificadas, sem ENTRADA)
+    df = obter_transacoes_mes(snapshot, mes_num, ano_selecionado)
+
+    # Calcular totais por categoria (filtrar ENTRADA se existir)
+    totais_categoria = df.groupby('categoria')['valor'].sum().sort_values(ascending=False)
+
+    # Remover categoria ENTRADA se existir (não deve aparecer na análise)
+    if 'ENTRADA' in totais_categoria.index:
+        totais_categoria = totais_categoria.drop('ENTRADA')
+
+    # Calcular total geral
+    total_atual = totais_categoria.sum()
+
+    # Calcular entradas do mês atual
+    entradas_mes = snapshot.entradas(mes_num, ano_selecionado)
+    total_entradas = sum(e['valor'] for e in entradas_mes)
+
+    # Calcular total anterior
+    total_anterior = 0
+    if fatura_anterior:
+        total_anterior = sum(t['valor'] for t in fatura_anterior['transacoes'])
+
+    # Calcular variação
+    variacao = total_atual - total_anterior
+    percentual_variacao = (variacao / total_anterior * 100) if total_anterior > 0 else 0
+
+    # Mostrar métricas
+    st.write("### Resumo do Mês")
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.metric(
+            "Gasto Total",
+            formatar_valor(total_atual)
+        )
+
+    with col2:
+        if total_entradas > 0:
+            percentual_utilizado = (total_atual / total_entradas) * 100
+            st.metric(
+                "% Utilizado das Entradas",
+                f"{percentual_utilizado:.1f}%"
+            )
+        else:
+            st.metric(
+                "% Utilizado das Entradas",
+                "Sem entradas registradas"
+            )
+
+    with col3:
         if fatura_anterior:
-            total_anterior = sum(t['valor'] for t in fatura_anterior['transacoes'])
-        
-        # Calcular variação
-        variacao = total_atual - total_anterior
-        percentual_variacao = (variacao / total_anterior * 100) if total_anterior > 0 else 0
-        
-        # Mostrar métricas
-        st.write("### Resumo do Mês")
-        col1, col2, col3 = st.columns(3)
+            # Criar texto com cor baseada na variação
+            if variacao > 0:
+                # Vermelho se gastou mais
+                cor_html = "color: red;"
+                sinal = "+"
+            elif variacao < 0:
+                # Verde se gastou menos
+                cor_html = "color: green;"
+                sinal = ""
+            else:
+                cor_html = "color: gray;"
+                sinal = ""
         
-        with col1:
             st.metric(
-                "Gasto Total",
-                formatar_valor(total_atual)
+                "Variação Mensal",
+                f"{sinal}{percentual_variacao:.1f}%"
             )
         
+            # Adicionar explicação colorida
+            st.markdown(
+                f"<div style='{cor_html} font-size: 12px; text-align: center;'>"
+                f"{'Gasto maior' if variacao > 0 else 'Gasto menor' if variacao < 0 else 'Igual'} "
+                f"({formatar_valor(abs(variacao))})"
+                f"</div>",
+                unsafe_allow_html=True
+            )
+        else:
+            st.metric(
+                "Variação Mensal",
+                "Sem dados anteriores"
+            )
+
+    # Mostrar detalhamento por categoria
+    st.write("### Detalhamento por Categoria")
+
+    # Anomalias do histórico (meses acima do normal e cobranças fora do padrão)
+    from anomalias import obter_anomalias
+    anomalias = obter_anomalias()
+
+    # Modo grade: uma única tabela editável em vez de botões por transação
+    modo_grade = st.toggle(
+        "Editar em tabela",
+        key="modo_grade_analise",
+        help="Edita categorias, gastos fixos e exclusões de todas as transações do mês de uma vez"
+    )
+
+    if modo_grade:
+        editor_grade_fatura(df, snapshot, categorias, anomalias, mes_num, ano_selecionado)
+    else:
+        # Busca, ordenação e paginação feitas aqui; só a página visível vira widgets
+        col1, col2, col3 = st.columns([3, 2, 1])
+        with col1:
+            busca = st.text_input("Buscar transação", key="busca_analise", placeholder="ex: uber, mercado")
         with col2:
-            if total_entradas > 0:
-                percentual_utilizado = (total_atual / total_entradas) * 100
-                st.metric(
-                    "% Utilizado das Entradas",
-                    f"{percentual_utilizado:.1f}%"
-                )
-            else:
-                st.metric(
-                    "% Utilizado das Entradas",
-                    "Sem entradas registradas"
-                )
-        
+            ordenacao = st.selectbox("Ordenar por", options=list(ORDENACOES_TRANSACOES), key="ordenacao_analise")
         with col3:
-            if fatura_anterior:
-                # Criar texto com cor baseada na variação
-                if variacao > 0:
-                    # Vermelho se gastou mais
-                    cor_html = "color: red;"
-                    sinal = "+"
-                elif variacao < 0:
-                    # Verde se gastou menos
-                    cor_html = "color: green;"
-                    sinal = ""
-                else:
-                    cor_html = "color: gray;"
-                    sinal = ""
-                
-                st.metric(
-                    "Variação Mensal",
-                    f"{sinal}{percentual_variacao:.1f}%"
-                )
-                
-                # Adicionar explicação colorida
-                st.markdown(
-                    f"<div style='{cor_html} font-size: 12px; text-align: center;'>"
-                    f"{'Gasto maior' if variacao > 0 else 'Gasto menor' if variacao < 0 else 'Igual'} "
-                    f"({formatar_valor(abs(variacao))})"
-                    f"</div>",
-                    unsafe_allow_html=True
-                )
-            else:
-                st.metric(
-                    "Variação Mensal",
-                    "Sem dados anteriores"
-                )
-        
-        # Mostrar detalhamento por categoria
-        st.write("### Detalhamento por Categoria")
+            tamanho_pagina = st.selectbox("Por página", options=[10, 25, 50, 100], index=1, key="pagina_analise")
+
+        df_lista = df
+        if busca:
+            df_lista = df[df['descricao'].str.contains(busca, case=False, regex=False)]
 
         # Mostrar transações por categoria
         for categoria, total in totais_categoria.items():
-            # Usar o estado para controlar se o expander está aberto
-            is_open = st.session_state.categoria_aberta == categoria
-            with st.expander(
-                f"📁 {categoria} - {formatar_valor(total)} ({(total/total_atual*100):.1f}%)",
-                expanded=is_open
-            ):
-                gastos_categoria = df[df['categoria'] == categoria].sort_values('valor', ascending=False)
-                
-                # Criar container para reduzir espaçamento
-                with st.container():
-                    for idx, transacao in gastos_categoria.iterrows():
-                        # Layout mais compacto
-                        cols = st.columns([1, 3, 2, 0.5, 0.5, 0.5])
-                        
-                        with cols[0]:
-                            st.write(transacao['data'])
-                        
-                        with cols[1]:
-                            st.write(transacao['descricao'])
-                        
-                        with cols[2]:
-                            st.write(formatar_valor(transacao['valor']))
-                        
-                        with cols[3]:
-                            if any(g['descricao'] == transacao['descricao'] and abs(g['valor'] - transacao['valor']) < 0.01 for g in dados.get('gastos_fixos', [])):
-                                st.write("📌")
-                        
-                        with cols[4]:
-                            if st.button("✏️", key=f"edit_{idx}"):
-                                st.session_state[f'editing_{idx}'] = True
-                                # Salvar a categoria atual para manter aberta
-                                st.session_state.categoria_aberta = categoria
-                        
-                        with cols[5]:
-                            if st.button("🗑️", key=f"del_{idx}"):
-                                # Salvar a categoria atual para manter aberta
-                                st.session_state.categoria_aberta = categoria
-                                remover_transacao(
-                                    fatura_atual['mes'],
-                                    fatura_atual['ano'],
-                                    transacao['descricao'],
-                                    transacao['valor']
-                                )
-                                st.success("✓ Transação excluída com sucesso!")
-                                time.sleep(0.5)  # Pequena pausa para mostrar a mensagem
-                                st.rerun()
-                        
-                        # Se o botão de edição foi clicado, mostrar o formulário
-                        if st.session_state.get(f'editing_{idx}', False):
-                            with st.form(f"form_transacao_{idx}", clear_on_submit=True):
-                                # Garantir que a categoria existe na lista
-                                categoria_atual = transacao['categoria']
-                                try:
-                                    index_categoria = categorias.index(categoria_atual)
-                                except ValueError:
-                                    # Se a categoria não existir, adicionar à lista e usar como índice
-                                    categorias.append(categoria_atual)
-                                    salvar_categorias(categorias)
-                                    index_categoria = len(categorias) - 1
-                                
-                                nova_categoria = st.selectbox(
-                                    "Categoria",
-                                    options=categorias,  # Usar categorias do arquivo
-                                    key=f"cat_{idx}",
-                                    index=index_categoria
-                                )
-                                
-                                is_fixo = st.checkbox("Marcar como gasto fixo", key=f"fix_{idx}")
-                                
-                                col1, col2 = st.columns([1, 1])
-                                with col1:
-                                    if st.form_submit_button("💾 Salvar"):
-                                        try:
-                                            # Atualizar categoria na transação
-                                            fatura_atual['transacoes'][idx]['categoria'] = nova_categoria
-                                            
-                                            # Atualizar gastos fixos
-                                            if is_fixo:
-                                                gasto_fixo = {
-                                                    'descricao': transacao['descricao'],
-                                                    'valor': transacao['valor'],
-                                                    'categoria': nova_categoria,
-                                                    'data_adicao': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                                                }
-                                                if not any(g['descricao'] == transacao['descricao'] and abs(g['valor'] - transacao['valor']) < 0.01 for g in dados['gastos_fixos']):
-                                                    dados['gastos_fixos'].append(gasto_fixo)
-                                            else:
-                                                dados['gastos_fixos'] = [
-                                                    g for g in dados['gastos_fixos']
-                                                    if not (g['descricao'] == transacao['descricao'] and abs(g['valor'] - transacao['valor']) < 0.01)
-                                                ]
-                                            
-                                            # Atualizar fatura no histórico
-                                            for i, f in enumerate(dados['faturas']):
-                                                if f['mes'] == mes_num and f['ano'] == ano_selecionado:
-                                                    dados['faturas'][i] = fatura_atual
-                                                    break
-                                            
-                                            # Salvar todas as alterações
-                                            salvar_dados(dados)
-                                            st.session_state[f'editing_{idx}'] = False
-                                            # Manter a categoria aberta após salvar
-                                            st.session_state.categoria_aberta = categoria
-                                            st.success("✓ Alterações salvas!")
-                                            st.rerun()
-                                        except Exception as e:
-                                            st.error(f"Erro ao salvar alterações: {str(e)}")
-                                
-                                with col2:
-                                    if st.form_submit_button("❌ Cancelar"):
-                                        st.session_state[f'editing_{idx}'] = False
-                                        # Manter a categoria aberta após cancelar
-                                        st.session_state.categoria_aberta = categoria
-                                        st.rerun()
-                        
-                        st.markdown("---")
+            if busca and not (df_lista['categoria'] == categoria).any():
+                continue
+            expander_categoria(
+                categoria, total, total_atual, df_lista, snapshot,
+                categorias, anomalias, mes_num, ano_selecionado, ordenacao, tamanho_pagina
+            )
 
-        # Gráfico de Comparação por Categoria
-        # Preparar dados para o gráfico
-        meses_dados = {}
-        categorias_todas = set()
-        
-        # Coletar dados de todas as faturas
-        for fatura in faturas:
-            mes_ano = f"{list(mes_options.keys())[int(fatura['mes'])-1]}/{fatura['ano']}"
-            meses_dados[mes_ano] = {'mes': fatura['mes'], 'ano': fatura['ano']}
-            
-            # Processar transações da fatura
-            df_fatura = pd.DataFrame(fatura['transacoes'])
-            if not df_fatura.empty:
-                # Aplicar classificação
-                for i, transacao in enumerate(fatura['transacoes']):
-                    if 'categoria' in transacao:
-                        df_fatura.loc[i, 'categoria'] = transacao['categoria']
-                    else:
-                        df_fatura.loc[i, 'categoria'] = classificar_transacao(transacao['descricao'])
-                
-                # Filtrar transações com categoria ENTRADA
-                df_fatura = df_fatura[df_fatura['categoria'] != 'ENTRADA']
-                
-                # Se não sobrou nenhuma transação, pular
-                if df_fatura.empty:
-                    continue
-                
-                # Calcular totais por categoria
-                totais_fatura = df_fatura.groupby('categoria')['valor'].sum()
-                meses_dados[mes_ano]['categorias'] = totais_fatura.to_dict()
-                
-                # Adicionar categorias (excluindo ENTRADA)
-                categorias_grafico = [cat for cat in totais_fatura.index.tolist() if cat != 'ENTRADA']
-                categorias_todas.update(categorias_grafico)
-        
-        # Remover ENTRADA das categorias_todas como medida de segurança
-        categorias_todas.discard('ENTRADA')
-        
-        # Ordenar meses cronologicamente
-        meses_ordenados = sorted(meses_dados.keys(), key=lambda x: (meses_dados[x]['ano'], meses_dados[x]['mes']))
-        
-        # Preparar dados para o gráfico
-        if len(meses_ordenados) >= 2:  # Só mostrar se tiver pelo menos 2 meses
+    # Gráfico de Comparação por Categoria
+    # Preparar dados para o gráfico a partir dos totais já calculados para esta versão dos dados
+    meses_dados = {}
+    categorias_todas = set()
+    for ano_fatura, mes_fatura, totais_fatura in obter_totais_categoria_por_mes(snapshot):
+        mes_ano = f"{list(mes_options.keys())[int(mes_fatura)-1]}/{ano_fatura}"
+        meses_dados[mes_ano] = {'mes': mes_fatura, 'ano': ano_fatura, 'categorias': totais_fatura}
+        categorias_todas.update(totais_fatura)
+
+    # Já em ordem cronológica
+    meses_ordenados = list(meses_dados)
+
+    # Preparar dados para o gráfico
+    if len(meses_ordenados) >= 2:  # Só mostrar se tiver pelo menos 2 meses
+        def construir_grafico_comparacao():
+            """Monta o gráfico de comparação por categoria"""
+            go = plotly_go()
             fig = go.Figure()
-            
+    
             # Tons de roxo para os meses
             cores_roxo = ['#9966CC', '#8A2BE2', '#6A0DAD', '#4B0082', '#663399', '#7B68EE', '#9370DB', '#BA55D3']
-            
+    
             # Criar barras para cada mês
             for i, mes in enumerate(meses_ordenados):
                 valores = []
                 # Filtrar categorias para remover ENTRADA
                 categorias_ordenadas = sorted([cat for cat in categorias_todas if cat != 'ENTRADA'])
-                
+        
                 for categoria in categorias_ordenadas:
                     valor = meses_dados[mes].get('categorias', {}).get(categoria, 0)
                     valores.append(valor)
-                
+        
                 fig.add_trace(go.Bar(
                     name=mes,
                     x=categorias_ordenadas,
-                    y=valores,
+                    y=[para_reais(v) for v in valores],
                     text=[formatar_valor(v) if v > 0 else '' for v in valores],
                     textposition='auto',
                     textfont=dict(color='white'),
                     marker_color=cores_roxo[i % len(cores_roxo)]
                 ))
-            
+    
             fig.update_layout(
                 title="Comparação de Gastos por Categoria",
                 xaxis_title="Categoria",
@@ -1718,221 +1951,228 @@ elif authentication_status:
                     x=1
                 )
             )
-            
+            return fig
+
+        # Reaproveita a figura enquanto os dados e os parâmetros não mudam
+        with secao("Gráfico comparação"):
+            fig = obter_figura((snapshot.versao, 'comparacao', tuple(mes_options)), construir_grafico_comparacao)
             st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("📊 Gráfico de comparação será exibido quando houver dados de pelo menos 2 meses.")
+    else:
+        st.info("📊 Gráfico de comparação será exibido quando houver dados de pelo menos 2 meses.")
 
-    # Na aba de Parcelas Futuras
-    with tab_parcelas:
-        st.header("🔄 Parcelas Futuras")
-        
-        # Carregar dados
-        dados = carregar_dados()
-        faturas = dados.get('faturas', [])
-        
-        # Identificar parcelas em todas as faturas
-        todas_parcelas = {}  # Dicionário para agrupar parcelas por descrição
-        for fatura in faturas:
-            for transacao in fatura['transacoes']:
-                descricao = transacao['descricao'].lower()
-                
-                # Pular transações do 99app e antecipadas para evitar detecção incorreta de parcelas
-                if any(termo in descricao for termo in ['99app', '99 app', '99app *99app', 'antecipada']):
-                    continue
-                
-                # Procurar padrões de parcelas usando regex mais específica
-                # Aceita: "1/12", "01/12", "1 de 12", "parcela 1 de 12", etc.
-                padrao_parcela = re.search(r'(?:parcela\s+)?(\d{1,2})(?:\s*[/de]\s*|\s+de\s+)(\d{1,2})', descricao)
-                if padrao_parcela:
-                    parcela_atual = int(padrao_parcela.group(1))
-                    total_parcelas = int(padrao_parcela.group(2))
-                    
-                    # Validações para evitar falsos positivos
-                    if (parcela_atual < 1 or parcela_atual > total_parcelas or 
-                        total_parcelas < 2 or total_parcelas > 60):
-                        continue
-                    
-                    # Criar chave única para a compra (removendo o padrão de parcela)
-                    chave = re.sub(r'(?:parcela\s+)?\d{1,2}(?:\s*[/de]\s*|\s+de\s+)\d{1,2}', '', descricao).strip()
-                    
-                    if chave not in todas_parcelas:
-                        todas_parcelas[chave] = {
-                            'descricao': chave,
-                            'valor_parcela': transacao['valor'],
-                            'total_parcelas': total_parcelas,
-                            'parcelas_vistas': {parcela_atual},
-                            'primeira_parcela': {
-                                'mes': fatura['mes'],
-                                'ano': fatura['ano']
-                            }
-                        }
-                    else:
-                        todas_parcelas[chave]['parcelas_vistas'].add(parcela_atual)
-        
-        # Calcular parcelas futuras
-        parcelas_futuras = {}
-        mes_atual = datetime.now().month
-        ano_atual = datetime.now().year
-        
-        for compra in todas_parcelas.values():
-            # Calcular mês/ano da primeira parcela
-            data_primeira = date(compra['primeira_parcela']['ano'], 
-                               compra['primeira_parcela']['mes'], 1)
+
+@st.fragment
+@medir_fragmento
+def aba_parcelas(snapshot, mes_options):
+    """Conteúdo da aba de parcelas futuras"""
+    snapshot.sincronizar()
+    st.header("🔄 Parcelas Futuras")
+
+    # Identificar parcelas em todas as faturas
+    todas_parcelas = obter_compras_parceladas(snapshot)
+
+    # Calcular parcelas futuras
+    parcelas_futuras = {}
+    mes_atual = datetime.now().month
+    ano_atual = datetime.now().year
+
+    for compra in todas_parcelas.values():
+        # Calcular mês/ano da primeira parcela
+        data_primeira = date(compra['primeira_parcela']['ano'], 
+                           compra['primeira_parcela']['mes'], 1)
+    
+        # Para cada parcela que falta
+        for n_parcela in range(1, compra['total_parcelas'] + 1):
+            if n_parcela not in compra['parcelas_vistas']:
+                # Calcular data da parcela
+                meses_a_adicionar = n_parcela - 1
+                data_parcela = data_primeira + relativedelta(months=meses_a_adicionar)
             
-            # Para cada parcela que falta
-            for n_parcela in range(1, compra['total_parcelas'] + 1):
-                if n_parcela not in compra['parcelas_vistas']:
-                    # Calcular data da parcela
-                    meses_a_adicionar = n_parcela - 1
-                    data_parcela = data_primeira + relativedelta(months=meses_a_adicionar)
-                    
-                    # Se é uma parcela futura
-                    if data_parcela >= date(ano_atual, mes_atual, 1):
-                        chave_mes = (data_parcela.year, data_parcela.month)
-                        if chave_mes not in parcelas_futuras:
-                            parcelas_futuras[chave_mes] = []
-                        
-                        parcelas_futuras[chave_mes].append({
-                            'descricao': compra['descricao'],
-                            'valor': compra['valor_parcela'],
-                            'parcela': n_parcela,
-                            'total_parcelas': compra['total_parcelas']
-                        })
-        
-        # Mostrar parcelas futuras agrupadas por mês
-        for (ano, mes), parcelas in sorted(parcelas_futuras.items()):
+                # Se é uma parcela futura
+                if data_parcela >= date(ano_atual, mes_atual, 1):
+                    chave_mes = (data_parcela.year, data_parcela.month)
+                    if chave_mes not in parcelas_futuras:
+                        parcelas_futuras[chave_mes] = []
+                
+                    parcelas_futuras[chave_mes].append({
+                        'descricao': compra['descricao'],
+                        'valor': compra['valor_parcela'],
+                        'parcela': n_parcela,
+                        'total_parcelas': compra['total_parcelas']
+                    })
+
+    # Lista única em ordem de mês, paginada; os totais de cada mês usam todas as parcelas
+    linhas_parcelas = [
+        (chave_mes, parcela)
+        for chave_mes, parcelas in sorted(parcelas_futuras.items())
+        for parcela in parcelas
+    ]
+    tamanho_pagina = st.selectbox("Parcelas por página", options=[25, 50, 100], key="pagina_parcelas_tamanho")
+    pagina = paginar(linhas_parcelas, "pagina_parcelas", tamanho_pagina)
+
+    # Mostrar parcelas futuras agrupadas por mês
+    mes_exibido = None
+    for (ano, mes), parcela in pagina:
+        if (ano, mes) != mes_exibido:
+            mes_exibido = (ano, mes)
             mes_nome = list(mes_options.keys())[mes-1]
             st.subheader(f"{mes_nome}/{ano}")
-            
-            total_mes = sum(p['valor'] for p in parcelas)
+        
+            total_mes = sum(p['valor'] for p in parcelas_futuras[(ano, mes)])
             st.markdown(f"**Total do Mês:** {formatar_valor(total_mes)}")
-            
-            for parcela in parcelas:
-                col1, col2, col3 = st.columns([3, 2, 2])
-                with col1:
-                    st.write(parcela['descricao'])
-                with col2:
-                    st.write(formatar_valor(parcela['valor']))
-                with col3:
-                    st.write(f"Parcela {parcela['parcela']}/{parcela['total_parcelas']}")
-                st.markdown("---")
+    
+        col1, col2, col3 = st.columns([3, 2, 2])
+        with col1:
+            st.write(parcela['descricao'])
+        with col2:
+            st.write(formatar_valor(parcela['valor']))
+        with col3:
+            st.write(f"Parcela {parcela['parcela']}/{parcela['total_parcelas']}")
+        st.markdown("---")
 
-    # Na aba de Gastos Fixos
-    with tab_fixos:
-        st.header("📌 Gastos Fixos")
-        
-        # Carregar dados
-        dados = carregar_dados()
-        gastos_fixos = dados.get('gastos_fixos', [])
-        
-        # Formulário para adicionar gasto fixo
-        with st.form("form_gasto_fixo"):
-            col1, col2, col3, col4 = st.columns([2, 3, 1.5, 1])
-            
+
+@st.fragment
+@medir_fragmento
+def aba_gastos_fixos(snapshot, mes_selecionado):
+    """Conteúdo da aba de gastos fixos"""
+    snapshot.sincronizar()
+    st.header("📌 Gastos Fixos")
+
+    # Dados carregados neste rerun
+    gastos_fixos = snapshot.gastos_fixos
+
+    # Formulário para adicionar gasto fixo
+    with st.form("form_gasto_fixo"):
+        col1, col2, col3, col4 = st.columns([2, 3, 1.5, 1])
+    
+        with col1:
+            valor = st.number_input("Valor Mensal", min_value=0.0, step=0.01, format="%.2f")
+    
+        with col2:
+            descricao = st.text_input("Descrição")
+    
+        with col3:
+            categoria = st.selectbox(
+                "Categoria",
+                                            options=["Alimentação", "Transporte", "Entretenimento", "Self Care", "Roupas"]
+            )
+    
+        with col4:
+            st.write("")  # Espaço para alinhar
+            if st.form_submit_button("Adicionar Gasto Fixo", use_container_width=True):
+                if valor > 0 and descricao:
+                    novo_gasto = {
+                        'descricao': descricao,
+                        'valor': para_centavos(valor),
+                        'categoria': categoria,
+                        'data_adicao': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    }
+                    adicionar_gasto_fixo(novo_gasto)
+                    st.toast("✓ Gasto fixo adicionado com sucesso!")
+                    # Manter a seleção do mês atual
+                    nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
+                    st.session_state['mes_manter_selecao'] = nome_mes_limpo
+                    st.rerun()  # Atualizar indicadores visuais
+                else:
+                    st.error("Por favor, preencha todos os campos.")
+
+    # Mostrar gastos fixos existentes
+    if gastos_fixos:
+        # Mostrar total em cima
+        total_fixo = sum(g['valor'] for g in gastos_fixos)
+        st.metric("Total Mensal", formatar_valor(total_fixo))
+    
+        st.write("### Gastos Fixos Cadastrados")
+        for idx, gasto in enumerate(gastos_fixos):
+            col1, col2, col3, col4 = st.columns([1.5, 3, 1.5, 0.5])
             with col1:
-                valor = st.number_input("Valor Mensal", min_value=0.0, step=0.01, format="%.2f")
-            
+                st.write(formatar_valor(gasto['valor']))
             with col2:
-                descricao = st.text_input("Descrição")
-            
+                st.write(gasto['descricao'])
             with col3:
-                categoria = st.selectbox(
-                    "Categoria",
-                                                options=["Alimentação", "Transporte", "Entretenimento", "Self Care", "Roupas"]
-                )
-            
+                st.write(gasto['categoria'])
             with col4:
-                st.write("")  # Espaço para alinhar
-                if st.form_submit_button("Adicionar Gasto Fixo", use_container_width=True):
-                    if valor > 0 and descricao:
-                        novo_gasto = {
-                            'descricao': descricao,
-                            'valor': valor,
-                            'categoria': categoria,
-                            'data_adicao': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        }
-                        dados['gastos_fixos'].append(novo_gasto)
-                        salvar_dados(dados)
-                        st.success("✓ Gasto fixo adicionado com sucesso!")
-                        # Manter a seleção do mês atual
-                        nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
-                        st.session_state['mes_manter_selecao'] = nome_mes_limpo
-                        st.rerun()  # Atualizar indicadores visuais
-                    else:
-                        st.error("Por favor, preencha todos os campos.")
-        
-        # Mostrar gastos fixos existentes
-        if gastos_fixos:
-            # Mostrar total em cima
-            total_fixo = sum(g['valor'] for g in gastos_fixos)
-            st.metric("Total Mensal", formatar_valor(total_fixo))
-            
-            st.write("### Gastos Fixos Cadastrados")
-            for idx, gasto in enumerate(gastos_fixos):
-                col1, col2, col3, col4 = st.columns([1.5, 3, 1.5, 0.5])
-                with col1:
-                    st.write(formatar_valor(gasto['valor']))
-                with col2:
-                    st.write(gasto['descricao'])
-                with col3:
-                    st.write(gasto['categoria'])
-                with col4:
-                    if st.button("🗑️", key=f"del_fixo_{idx}", help="Deletar gasto fixo"):
-                        dados['gastos_fixos'].remove(gasto)
-                        salvar_dados(dados)
-                        # Manter a seleção do mês atual
-                        nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
-                        st.session_state['mes_manter_selecao'] = nome_mes_limpo
-                        st.rerun()
-                        
-                # Linha fina entre itens
-                if idx < len(gastos_fixos) - 1:
-                    st.markdown("<hr style='margin: 0.5rem 0; border: 0.5px solid #ddd;'>", unsafe_allow_html=True)
-        else:
-            st.info("Nenhum gasto fixo cadastrado.")
-
-    # Na aba de Histórico
-    with tab_historico:
-        st.header("📊 Histórico de Gastos")
-        
-        # Carregar dados históricos
-        dados = carregar_dados()
-        faturas = dados.get('faturas', [])
-        
-        if not faturas:
-            st.warning("Nenhum dado histórico encontrado.")
-            st.stop()
-        
-        # Criar DataFrame com histórico
-        historico = []
-        for fatura in faturas:
-            # Usar nomes de mês limpos (sem checks) para o histórico
-            mes_nome = list(mes_options_base.keys())[int(fatura['mes'])-1]
-            mes_ano = f"{mes_nome}/{fatura['ano']}"
-            total = sum(t['valor'] for t in fatura['transacoes'])
-            historico.append({
-                'Mês': mes_ano,
-                'Total': total,
-                'mes_num': fatura['mes'],
-                'ano': fatura['ano']
-            })
-        
-        df_historico = pd.DataFrame(historico)
-        df_historico = df_historico.sort_values(by=['ano', 'mes_num'])
-        
-        # Criar gráfico de linha
+                if st.button("🗑️", key=f"del_fixo_{idx}", help="Deletar gasto fixo"):
+                    def remover(dados_atuais):
+                        if gasto in dados_atuais['gastos_fixos']:
+                            dados_atuais['gastos_fixos'].remove(gasto)
+
+                    atualizar_dados(remover)
+                    # Manter a seleção do mês atual
+                    nome_mes_limpo = mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
+                    st.session_state['mes_manter_selecao'] = nome_mes_limpo
+                    st.rerun()
+                
+            # Linha fina entre itens
+            if idx < len(gastos_fixos) - 1:
+                st.markdown("<hr style='margin: 0.5rem 0; border: 0.5px solid #ddd;'>", unsafe_allow_html=True)
+    else:
+        st.info("Nenhum gasto fixo cadastrado.")
+
+    # Sugestões de gastos fixos a partir de cobranças recorrentes
+    from recorrencias import obter_sugestoes_gastos_fixos, ignorar_sugestao
+    sugestoes = obter_sugestoes_gastos_fixos()
+    if sugestoes:
+        st.write("### 💡 Sugestões de Gastos Fixos")
+        st.caption("Cobranças que se repetem todo mês nas suas faturas")
+        for idx, sugestao in enumerate(sugestoes):
+            col1, col2, col3, col4, col5 = st.columns([1.5, 3, 1.5, 0.5, 0.5])
+            with col1:
+                st.write(formatar_valor(sugestao['valor_medio']))
+            with col2:
+                st.write(sugestao['descricao'])
+            with col3:
+                st.write(f"{sugestao['meses']} meses ({sugestao['pontuacao']:.0%})")
+            with col4:
+                if st.button("➕", key=f"add_sugestao_{idx}", help="Adicionar como gasto fixo"):
+                    adicionar_gasto_fixo({
+                        'descricao': sugestao['descricao'],
+                        'valor': sugestao['valor_medio'],
+                        'categoria': sugestao['categoria'],
+                        'data_adicao': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    })
+                    st.toast("✓ Gasto fixo adicionado com sucesso!")
+                    st.rerun()
+            with col5:
+                if st.button("✖️", key=f"ignorar_sugestao_{idx}", help="Ignorar sugestão"):
+                    ignorar_sugestao(sugestao['chave'])
+                    st.rerun(scope="fragment")
+
+
+@st.fragment
+@medir_fragmento
+def aba_historico(snapshot):
+    """Conteúdo da aba de histórico"""
+    snapshot.sincronizar()
+    st.header("📊 Histórico de Gastos")
+
+    # Dados históricos carregados neste rerun
+    faturas = snapshot.faturas
+
+    if not faturas:
+        st.warning("Nenhum dado histórico encontrado.")
+        return
+
+    # Criar DataFrame com histórico
+    historico = obter_totais_mensais(snapshot)
+    df_historico = pandas().DataFrame(historico)
+    df_historico = df_historico.sort_values(by=['ano', 'mes_num'])
+
+    # Criar gráfico de linha
+    def construir_grafico_evolucao():
+        """Monta o gráfico de evolução dos gastos"""
+        go = plotly_go()
         fig = go.Figure()
         fig.add_trace(go.Scatter(
             x=df_historico['Mês'],
-            y=df_historico['Total'],
+            y=df_historico['Total'].map(para_reais),
             mode='lines+markers+text',
             text=df_historico['Total'].apply(lambda x: formatar_valor(x)),
             textposition='top center',
             line=dict(color='#4B0082', width=2),
             marker=dict(color='#9370DB', size=8)
         ))
-        
+
         fig.update_layout(
             title='Evolução dos Gastos',
             xaxis_title='Mês',
@@ -1948,135 +2188,429 @@ elif authentication_status:
                 tickprefix='R$ '
             )
         )
-        
+        return fig
+
+    # Reaproveita a figura enquanto os dados e os parâmetros não mudam
+    with secao("Gráfico evolução"):
+        fig = obter_figura((snapshot.versao, 'evolucao'), construir_grafico_evolucao)
         st.plotly_chart(fig, use_container_width=True)
-        
-        # Tabela de histórico
-        df_display = df_historico[['Mês', 'Total']].copy()
-        df_display['Total'] = df_display['Total'].apply(formatar_valor)
-        st.dataframe(
-            df_display,
-            hide_index=True,
-            column_config={
-                "Mês": st.column_config.TextColumn("Mês"),
-                "Total": st.column_config.TextColumn("Total", width="small")
-            }
+
+    # Tabela de histórico
+    df_display = df_historico[['Mês', 'Total']].copy()
+    df_display['Total'] = df_display['Total'].apply(formatar_valor)
+    st.dataframe(
+        df_display,
+        hide_index=True,
+        column_config={
+            "Mês": st.column_config.TextColumn("Mês"),
+            "Total": st.column_config.TextColumn("Total", width="small")
+        }
+    )
+
+    # Previsão de fluxo de caixa
+    st.write("### Previsão dos Próximos Meses")
+    horizonte = st.slider("Meses de previsão", min_value=3, max_value=60, value=12, key="horizonte_previsao")
+    hoje = datetime.now()
+    from previsao import obter_previsao_fluxo
+    previsao = obter_previsao_fluxo(snapshot, obter_compras_parceladas(snapshot), classificar_transacao,
+                                    hoje.month, hoje.year, horizonte)
+
+    def construir_grafico_previsao():
+        """Monta o gráfico da previsão de fluxo de caixa"""
+        go = plotly_go()
+        fig_previsao = go.Figure()
+        componentes = [
+            ('Gastos Fixos', previsao['fixos'], '#4B0082'),
+            ('Parcelas', previsao['parcelas'], '#8A2BE2'),
+            ('Gastos Variáveis (média)', previsao['variavel'], '#BA55D3')
+        ]
+        for nome, valores, cor in componentes:
+            fig_previsao.add_trace(go.Bar(
+                name=nome,
+                x=previsao['rotulos'],
+                y=valores / 100,
+                marker_color=cor
+            ))
+        fig_previsao.add_trace(go.Scatter(
+            name='Entradas (média)',
+            x=previsao['rotulos'],
+            y=previsao['entradas'] / 100,
+            mode='lines',
+            line=dict(color='green', width=2, dash='dash')
+        ))
+
+        fig_previsao.update_layout(
+            title='Gastos Comprometidos e Esperados',
+            xaxis_title='Mês',
+            yaxis_title='Valor (R$)',
+            barmode='stack',
+            height=400,
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            font=dict(color='#4B0082'),
+            yaxis=dict(tickformat=',.0f', tickprefix='R$ '),
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
         )
+        return fig_previsao
+
+    # Reaproveita a figura enquanto os dados e os parâmetros não mudam
+    with secao("Gráfico previsão"):
+        fig_previsao = obter_figura((snapshot.versao, 'previsao', hoje.month, hoje.year, horizonte), construir_grafico_previsao)
+        st.plotly_chart(fig_previsao, use_container_width=True)
 
-    # Nova aba de teste de classificação
-    with tab_teste:
-        st.header("🧪 Teste de Classificação")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Total Previsto no Período", formatar_valor(previsao['total'].sum()))
+    with col2:
+        st.metric("Saldo Previsto no Período", formatar_valor(previsao['saldo'].sum()))
+
+
+@st.fragment
+@medir_fragmento
+def aba_teste_classificacao(snapshot):
+    """Conteúdo da aba de teste de classificação"""
+    snapshot.sincronizar()
+    st.header("🧪 Teste de Classificação")
+
+    st.write("### Teste Individual")
+    # Entrada de teste
+    teste_descricao = st.text_input("Digite uma descrição para testar a classificação:", placeholder="Ex: 99app, ifood, carrefour...")
+
+    if teste_descricao:
+        resultado = classificar_transacao(teste_descricao)
+        st.success(f"**{teste_descricao}** → **{resultado}**")
+
+    st.write("### Teste em Lote")
+    # Área de texto para múltiplas descrições
+    descricoes_multiplas = st.text_area(
+        "Digite várias descrições (uma por linha):",
+        placeholder="99app\nifood\ncarrefour\nrenner\nnetflix\nfarmacia\nubereats\nmercadolivre"
+    )
+
+    if descricoes_multiplas:
+        st.write("**Resultados:**")
+        for linha in descricoes_multiplas.split('\n'):
+            if linha.strip():
+                resultado = classificar_transacao(linha.strip())
+                st.write(f"• {linha.strip()} → **{resultado}**")
+
+    st.write("### Teste com Dados Reais")
+    # Botão para testar com dados das faturas
+    if st.button("🔍 Testar Classificação das Faturas Existentes"):
+        dados = snapshot.dados
+        if dados.get('faturas'):
+            st.write("**Exemplos de classificações das suas faturas:**")
         
-        st.write("### Teste Individual")
-        # Entrada de teste
-        teste_descricao = st.text_input("Digite uma descrição para testar a classificação:", placeholder="Ex: 99app, ifood, carrefour...")
+            exemplos = []
+            for fatura in dados['faturas']:
+                for transacao in fatura['transacoes'][:5]:  # Pegar apenas 5 exemplos por fatura
+                    classificacao_atual = transacao.get('categoria', 'Sem categoria')
+                    classificacao_nova = classificar_transacao(transacao['descricao'])
+                    exemplos.append({
+                        'Descrição': transacao['descricao'],
+                        'Categoria Atual': classificacao_atual,
+                        'Categoria Nova': classificacao_nova,
+                        'Status': '✅ Igual' if classificacao_atual == classificacao_nova else '⚠️ Diferente'
+                    })
         
-        if teste_descricao:
-            resultado = classificar_transacao(teste_descricao)
-            st.success(f"**{teste_descricao}** → **{resultado}**")
+            # Mostrar apenas os primeiros 20 exemplos
+            for exemplo in exemplos[:20]:
+                col1, col2, col3, col4 = st.columns([3, 1.5, 1.5, 1])
+                with col1:
+                    st.write(exemplo['Descrição'])
+                with col2:
+                    st.write(exemplo['Categoria Atual'])
+                with col3:
+                    st.write(exemplo['Categoria Nova'])
+                with col4:
+                    st.write(exemplo['Status'])
         
-        st.write("### Teste em Lote")
-        # Área de texto para múltiplas descrições
-        descricoes_multiplas = st.text_area(
-            "Digite várias descrições (uma por linha):",
-            placeholder="99app\nifood\ncarrefour\nrenner\nnetflix\nfarmacia\nubereats\nmercadolivre"
+            if len(exemplos) > 20:
+                st.write(f"... e mais {len(exemplos) - 20} transações")
+        else:
+            st.info("Nenhuma fatura encontrada para testar.")
+
+    st.write("### Regras de Classificação")
+    st.write("**Verificações especiais (prioridade máxima):**")
+    st.write("• 99app → Transporte")
+    st.write("• Mercado Livre → Roupas")
+    st.write("• Zig* → Entretenimento")
+    st.write("• Suas regras personalizadas")
+    st.write("• Padrão para não encontrados → Roupas")
+
+
+# Configuração de autenticação
+ARQUIVO_CONFIG = 'config.yaml'
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _config_em_cache(versao_config):
+    """Guarda o config.yaml já interpretado para uma versão (mtime) do arquivo"""
+    with open(ARQUIVO_CONFIG) as file:
+        return yaml.load(file, Loader=SafeLoader)
+
+def carregar_config():
+    """Retorna a configuração de autenticação, relendo o arquivo só quando ele muda"""
+    return _config_em_cache(os.stat(ARQUIVO_CONFIG).st_mtime_ns)
+
+def obter_autenticador():
+    """
+    Retorna o autenticador desta sessão.
+
+    Com a sessão autenticada, o mesmo objeto é reaproveitado em todos os reruns:
+    nada de reler o config.yaml nem de desenhar de novo o componente de cookies.
+    Sem login, ele é recriado a cada rerun, porque o componente de cookies precisa
+    ser desenhado para o login automático pelo cookie funcionar. O objeto fica no
+    session_state (e não em cache_resource) porque o componente pertence à sessão.
+    """
+    versao_config = os.stat(ARQUIVO_CONFIG).st_mtime_ns
+    guardado = st.session_state.get('_autenticador')
+    if guardado and guardado[0] == versao_config and st.session_state.get('authentication_status'):
+        return guardado[1]
+
+    config = carregar_config()
+    autenticador = stauth.Authenticate(
+        config['credentials'],
+        config['cookie']['name'],
+        config['cookie']['key'],
+        config['cookie']['expiry_days']
+    )
+    st.session_state['_autenticador'] = (versao_config, autenticador)
+    return autenticador
+
+# Perfil de tempo do rerun (opcional: FATURA_PROFILE=1 ou ?perfil=1)
+iniciar_rerun()
+try:
+
+    # Configuração da página
+    st.set_page_config(
+        page_title="Análise Faturas Nubank",
+        page_icon="📊",
+        layout="wide",
+    )
+
+    # Inicializar variáveis de sessão
+    if 'user_data_dir' not in st.session_state:
+        st.session_state['user_data_dir'] = 'data/default'
+
+    with secao("Autenticação"):
+        # Autenticador da sessão (config e objeto reaproveitados enquanto a sessão está autenticada)
+        authenticator = obter_autenticador()
+
+        # Adicionar login
+        name, authentication_status, username = authenticator.login('Login')
+
+    if authentication_status == False:
+        st.error('Username/password is incorrect')
+    elif authentication_status == None:
+        st.warning('Please enter your username and password')
+    elif authentication_status:
+        # Criar diretório do usuário se não existir
+        user_dir = Path(f"data/{username}")
+        user_dir.mkdir(parents=True, exist_ok=True)
+
+        # Configurar caminhos específicos do usuário
+        st.session_state['user_data_dir'] = str(user_dir)
+
+        # Dados do usuário lidos uma vez e compartilhados por todas as abas neste rerun
+        with secao("Carregar dados"):
+            snapshot = SnapshotDados()
+
+        # Adicionar logout na sidebar
+        with st.sidebar:
+            authenticator.logout('Logout')
+            # Progresso das tarefas em segundo plano (ex: reaplicar regras)
+            painel_tarefas(username)
+            painel_exportacao(username, get_user_data_file(), snapshot.disponibilidade()['meses_com_fatura'])
+
+        # Título principal
+        st.markdown(f"<h1 class='main-header'>Análise</h1>", unsafe_allow_html=True)
+
+        # Inicializar estados
+        if 'checkbox_states' not in st.session_state:
+            st.session_state.checkbox_states = {}
+
+        # Configurações de estilo
+        st.markdown("""
+            <style>
+            .main-header {
+                font-size: 2.5rem;
+                color: #4B0082;
+                margin-bottom: 2rem;
+            }
+            .stButton > button {
+                background-color: #4B0082;
+                color: white;
+            }
+            .stButton > button:hover {
+                background-color: #3B0062;
+                color: white;
+            }
+            div[data-testid="stMetricValue"] {
+                color: #4B0082;
+            }
+            </style>
+        """, unsafe_allow_html=True)
+
+        with secao("Seleção de mês"):
+            # Inicializar opções básicas de mês (serão atualizadas após seleção do ano)
+            mes_options = {nome: num for nome, num in mes_options_base.items()}
+
+            # Criar seleção de mês e ano
+            col1, col2 = st.columns([2, 1])
+
+            # Índice calculado uma vez por versão dos dados: meses com fatura e anos com algum dado
+            disponibilidade = snapshot.disponibilidade()
+
+            with col2:
+                ano_atual = datetime.now().year
+                # Sempre oferece os dois anos anteriores e inclui qualquer ano com dados salvos
+                anos = disponibilidade['anos'] or [ano_atual]
+                opcoes_ano = list(range(min(anos[0], ano_atual-2), max(anos[-1], ano_atual) + 1))
+                ano_selecionado = st.selectbox(
+                    "Ano",
+                    options=opcoes_ano,
+                    index=opcoes_ano.index(ano_atual),
+                    key="ano_selecionado"
+                )
+
+            # Recriar opções do mês com base no ano selecionado (✅ apenas para meses com fatura)
+            mes_options = {}
+            for nome_mes, num_mes in mes_options_base.items():
+                if (ano_selecionado, num_mes) in disponibilidade['meses_com_fatura']:
+                    mes_options[f"✅ {nome_mes}"] = num_mes
+                else:
+                    mes_options[f"⚪ {nome_mes}"] = num_mes
+
+            with col1:
+                opcoes_mes = list(mes_options.keys())
+
+                # Verificar se há uma solicitação para manter um mês específico (após upload)
+                if 'mes_manter_selecao' in st.session_state:
+                    mes_para_manter = st.session_state['mes_manter_selecao']
+                    # Procurar o mês nas opções (pode estar com ✅ ou ⚪)
+                    for opcao in opcoes_mes:
+                        if mes_para_manter in opcao:
+                            st.session_state.mes_selecionado = opcao
+                            break
+                    # Limpar a flag
+                    del st.session_state['mes_manter_selecao']
+
+                # Inicializar com mês atual apenas se não existir no session_state
+                elif 'mes_selecionado' not in st.session_state:
+                    mes_atual = datetime.now().month
+                    nome_mes_atual = list(mes_options_base.keys())[mes_atual - 1]
+
+                    # Procurar a opção do mês atual (com ou sem check)
+                    for opcao in opcoes_mes:
+                        if nome_mes_atual in opcao:
+                            st.session_state.mes_selecionado = opcao
+                            break
+                    else:
+                        # Se não encontrar, usar o primeiro da lista
+                        st.session_state.mes_selecionado = opcoes_mes[0]
+
+                # Verificar se a seleção atual ainda existe nas opções (após mudança de ano)
+                elif st.session_state.mes_selecionado not in opcoes_mes:
+                    # Se a seleção atual não existe mais, encontrar equivalente sem/com check
+                    mes_limpo = st.session_state.mes_selecionado.replace('✅ ', '').replace('⚪ ', '')
+                    for opcao in opcoes_mes:
+                        if mes_limpo in opcao:
+                            st.session_state.mes_selecionado = opcao
+                            break
+                    else:
+                        st.session_state.mes_selecionado = opcoes_mes[0]
+
+                mes_selecionado = st.selectbox(
+                    "Selecione o Mês",
+                    options=opcoes_mes,
+                    help="✅ indica meses com faturas salvas",
+                    key="mes_selecionado"
+                )
+                # Definir mes_num logo após a seleção
+                mes_num = mes_options[mes_selecionado]
+
+        # Criar tabs (a aba ativa fica em session_state e só ela é calculada a cada rerun)
+        rotulos_abas = [
+            "📥 Inserir Fatura",
+            "💰 Entradas do Mês",
+            "📊 Análise",
+            "🔄 Parcelas Futuras",
+            "📌 Gastos Fixos",
+            "📈 Histórico",
+            "🧪 Teste Classificação"
+        ]
+        tab_inserir, tab_entradas, tab_analise, tab_parcelas, tab_fixos, tab_historico, tab_teste = st.tabs(
+            rotulos_abas, key="aba_ativa", on_change="rerun"
         )
-        
-        if descricoes_multiplas:
-            st.write("**Resultados:**")
-            for linha in descricoes_multiplas.split('\n'):
-                if linha.strip():
-                    resultado = classificar_transacao(linha.strip())
-                    st.write(f"• {linha.strip()} → **{resultado}**")
-        
-        st.write("### Teste com Dados Reais")
-        # Botão para testar com dados das faturas
-        if st.button("🔍 Testar Classificação das Faturas Existentes"):
-            dados = carregar_dados()
-            if dados.get('faturas'):
-                st.write("**Exemplos de classificações das suas faturas:**")
-                
-                exemplos = []
-                for fatura in dados['faturas']:
-                    for transacao in fatura['transacoes'][:5]:  # Pegar apenas 5 exemplos por fatura
-                        classificacao_atual = transacao.get('categoria', 'Sem categoria')
-                        classificacao_nova = classificar_transacao(transacao['descricao'])
-                        exemplos.append({
-                            'Descrição': transacao['descricao'],
-                            'Categoria Atual': classificacao_atual,
-                            'Categoria Nova': classificacao_nova,
-                            'Status': '✅ Igual' if classificacao_atual == classificacao_nova else '⚠️ Diferente'
-                        })
-                
-                # Mostrar apenas os primeiros 20 exemplos
-                for exemplo in exemplos[:20]:
-                    col1, col2, col3, col4 = st.columns([3, 1.5, 1.5, 1])
-                    with col1:
-                        st.write(exemplo['Descrição'])
-                    with col2:
-                        st.write(exemplo['Categoria Atual'])
-                    with col3:
-                        st.write(exemplo['Categoria Nova'])
-                    with col4:
-                        st.write(exemplo['Status'])
-                
-                if len(exemplos) > 20:
-                    st.write(f"... e mais {len(exemplos) - 20} transações")
-            else:
-                st.info("Nenhuma fatura encontrada para testar.")
-        
-        st.write("### Regras de Classificação")
-        st.write("**Verificações especiais (prioridade máxima):**")
-        st.write("• 99app → Transporte")
-        st.write("• Mercado Livre → Roupas")
-        st.write("• Zig* → Entretenimento")
-        st.write("• Suas regras personalizadas")
-        st.write("• Padrão para não encontrados → Roupas")
-
-    # Estilo para tabelas mais finas e botões menores
-    st.markdown("""
-<style>
-    .dataframe {
-        font-size: 12px;
-    }
-    .dataframe td, .dataframe th {
-        padding: 4px !important;
-        border: 1px solid #ddd !important;
-    }
-    div[data-testid="stHorizontalBlock"] {
-        gap: 0.5rem !important;
-    }
-    div[data-testid="column"] {
-        padding: 0 !important;
-    }
-    hr {
-        margin: 0.5rem 0 !important;
-        border-color: #ddd !important;
-    }
-    /* Botões menores */
-    .stButton > button {
-        height: 2.5rem !important;
-        font-size: 0.875rem !important;
-        padding: 0.25rem 0.75rem !important;
-    }
-    /* Botões de deletar ainda menores */
-    button[title="Deletar entrada"], button[title="Deletar gasto fixo"] {
-        height: 2rem !important;
-        width: 2rem !important;
-        font-size: 1rem !important;
-        padding: 0 !important;
-        min-width: 2rem !important;
-    }
-    /* Espaçamento entre linhas das tabelas */
-    .block-container .element-container {
-        margin-bottom: 0.5rem !important;
-    }
-    /* Linhas de separação mais sutis */
-    .separator-line {
-        border: none;
-        height: 1px;
-        background-color: #e0e0e0;
-        margin: 0.5rem 0;
-    }
-</style>
-""", unsafe_allow_html=True) 
\ No newline at end of file
+
+        abas = [
+            (tab_inserir, aba_inserir_fatura, (snapshot, mes_num, ano_selecionado, mes_selecionado)),
+            (tab_entradas, aba_entradas, (snapshot, mes_num, ano_selecionado, mes_selecionado)),
+            (tab_analise, aba_analise, (snapshot, mes_num, ano_selecionado, mes_selecionado, mes_options)),
+            (tab_parcelas, aba_parcelas, (snapshot, mes_options)),
+            (tab_fixos, aba_gastos_fixos, (snapshot, mes_selecionado)),
+            (tab_historico, aba_historico, (snapshot,)),
+            (tab_teste, aba_teste_classificacao, (snapshot,))
+        ]
+        for rotulo, (tab, renderizar_aba, argumentos) in zip(rotulos_abas, abas):
+            with tab:
+                # Abas ocultas mostram só um aviso até serem abertas
+                if tab.open is False:
+                    st.caption("⏳ Carregando...")
+                else:
+                    with secao(f"Aba {rotulo}"):
+                        renderizar_aba(*argumentos)
+
+        # Estilo para tabelas mais finas e botões menores
+        st.markdown("""
+    <style>
+        .dataframe {
+            font-size: 12px;
+        }
+        .dataframe td, .dataframe th {
+            padding: 4px !important;
+            border: 1px solid #ddd !important;
+        }
+        div[data-testid="stHorizontalBlock"] {
+            gap: 0.5rem !important;
+        }
+        div[data-testid="column"] {
+            padding: 0 !important;
+        }
+        hr {
+            margin: 0.5rem 0 !important;
+            border-color: #ddd !important;
+        }
+        /* Botões menores */
+        .stButton > button {
+            height: 2.5rem !important;
+            font-size: 0.875rem !important;
+            padding: 0.25rem 0.75rem !important;
+        }
+        /* Botões de deletar ainda menores */
+        button[title="Deletar entrada"], button[title="Deletar gasto fixo"] {
+            height: 2rem !important;
+            width: 2rem !important;
+            font-size: 1rem !important;
+            padding: 0 !important;
+            min-width: 2rem !important;
+        }
+        /* Espaçamento entre linhas das tabelas */
+        .block-container .element-container {
+            margin-bottom: 0.5rem !important;
+        }
+        /* Linhas de separação mais sutis */
+        .separator-line {
+            border: none;
+            height: 1px;
+            background-color: #e0e0e0;
+            margin: 0.5rem 0;
+        }
+    </style>
+    """, unsafe_allow_html=True)
+
+finally:
+    # Mostrar e gravar o perfil do rerun (apenas com o perfil ativo), inclusive
+    # quando o rerun termina em st.rerun() ou st.stop()
+    finalizar_rerun()
+
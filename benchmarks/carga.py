@@ -0,0 +1,252 @@
+"""
+Teste de carga com várias sessões autenticadas ao mesmo tempo.
+
+Usa o AppTest do Streamlit (sem navegador nem servidor): cada sessão é
+um AppTest próprio, em sua thread, já autenticado com um dos usuários do
+config.yaml (anavarela, juliaabreu, carolmello, em rodízio). As sessões
+compartilham o processo e os caches, como no servidor. Em cada iteração
+a sessão passa por todas as abas, envia uma fatura sintética em PDF e
+salva, e edita a categoria de uma transação na Análise.
+
+Cada quantidade de sessões roda em um processo separado, sobre uma cópia
+do app em um diretório temporário com dados sintéticos, para medir o pico
+de memória (RSS) isoladamente. O relatório traz p50/p95 da latência dos
+reruns (geral e por ação), erros e pico de RSS, em JSON.
+
+Uso:
+    python benchmarks/carga.py
+    python benchmarks/carga.py --sessoes 1,3,6 --iteracoes 2 --saida carga.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+USUARIOS = ['anavarela', 'juliaabreu', 'carolmello']
+ABAS = [
+    "📥 Inserir Fatura",
+    "💰 Entradas do Mês",
+    "📊 Análise",
+    "🔄 Parcelas Futuras",
+    "📌 Gastos Fixos",
+    "📈 Histórico",
+    "🧪 Teste Classificação"
+]
+
+def percentil(valores, p):
+    """Percentil p (0-100) por interpolação linear"""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+def preparar_diretorio(anos, transacoes_por_mes):
+    """Copia o app para um diretório temporário e gera os dados de cada usuário"""
+    from dados_sinteticos import gerar_historico
+
+    diretorio = Path(tempfile.mkdtemp(prefix='fatura-carga-'))
+    ignorar = shutil.ignore_patterns('.git', 'data', 'benchmarks', '__pycache__', '*.jsonl')
+    shutil.copytree(RAIZ, diretorio, ignore=ignorar, dirs_exist_ok=True)
+    ano_atual = datetime.now().year
+    for i, usuario in enumerate(USUARIOS):
+        pasta = diretorio / 'data' / usuario
+        pasta.mkdir(parents=True)
+        dados = gerar_historico(anos, transacoes_por_mes, semente=i, ano_final=ano_atual)
+        with open(pasta / 'faturas.json', 'w') as f:
+            json.dump(dados, f, indent=4)
+    return diretorio
+
+class Sessao:
+    """Uma sessão autenticada no AppTest, com o tempo de cada rerun por ação"""
+
+    def __init__(self, app_py, usuario, tempo_limite):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(str(app_py), default_timeout=tempo_limite)
+        self.at.session_state['authentication_status'] = True
+        self.at.session_state['name'] = usuario
+        self.at.session_state['username'] = usuario
+        self.at.session_state['logout'] = None
+        self.latencias = []
+        self.erros = []
+
+    def rodar(self, acao):
+        """Executa um rerun e registra o tempo e as exceções mostradas na tela"""
+        inicio = time.perf_counter()
+        self.at.run()
+        self.latencias.append((acao, (time.perf_counter() - inicio) * 1000))
+        self.erros.extend(f"{acao}: {e.value}" for e in self.at.exception)
+
+    def abrir_aba(self, rotulo, acao):
+        self.at.session_state['aba_ativa'] = rotulo
+        self.rodar(acao)
+
+    def enviar_fatura(self, pdf):
+        """Envia o PDF na aba Inserir Fatura e salva"""
+        self.abrir_aba(ABAS[0], 'abrir Inserir Fatura')
+        self.at.file_uploader[0].set_value(('fatura.pdf', pdf, 'application/pdf'))
+        self.rodar('ler PDF')
+        botoes = [b for b in self.at.button if b.label == '💾 Salvar Fatura']
+        if botoes:
+            botoes[0].click()
+            self.rodar('salvar fatura')
+
+    def editar_categoria(self):
+        """Abre a edição da primeira transação da Análise e troca a categoria"""
+        self.abrir_aba(ABAS[2], 'abrir Análise')
+        editar = [b for b in self.at.button if (b.key or '').startswith('edit_')]
+        if not editar:
+            return
+        idx = editar[0].key[len('edit_'):]
+        editar[0].click()
+        self.rodar('abrir edição')
+        seletores = [s for s in self.at.selectbox if s.key == f'cat_{idx}']
+        salvar = [b for b in self.at.button if b.label == '💾 Salvar']
+        if not seletores or not salvar:
+            return
+        opcoes = [o for o in seletores[0].options if o != seletores[0].value]
+        seletores[0].set_value(opcoes[0])
+        salvar[0].click()
+        self.rodar('salvar categoria')
+
+    def executar(self, iteracoes, pdf):
+        self.rodar('primeiro rerun')
+        for _ in range(iteracoes):
+            for rotulo in ABAS[1:]:
+                self.abrir_aba(rotulo, f'abrir {rotulo[2:]}')
+            self.enviar_fatura(pdf)
+            self.editar_categoria()
+
+def pico_rss_mb():
+    """Pico de memória residente do processo, em MB"""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS, em bytes
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+def rodar_sessoes(diretorio, sessoes, iteracoes, paginas_pdf, tempo_limite):
+    """Executa as sessões em paralelo dentro deste processo e devolve as medições"""
+    from streamlit.logger import set_log_level
+    from faturas_pdf import gerar_fatura_pdf
+
+    os.chdir(diretorio)
+    pdf, _ = gerar_fatura_pdf(paginas_pdf, mes=datetime.now().month, ano=datetime.now().year)
+    app_py = Path(diretorio) / 'app.py'
+    lista = [Sessao(app_py, USUARIOS[i % len(USUARIOS)], tempo_limite) for i in range(sessoes)]
+    set_log_level('error')
+    rss_inicial = pico_rss_mb()
+
+    largada = threading.Barrier(sessoes)
+    falhas = []
+
+    def trabalhar(sessao):
+        largada.wait()
+        try:
+            sessao.executar(iteracoes, pdf)
+        except Exception as e:
+            falhas.append(f"{type(e).__name__}: {e}")
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalhar, args=(s,)) for s in lista]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - inicio
+
+    latencias = [ms for s in lista for _, ms in s.latencias]
+    por_acao = {}
+    for s in lista:
+        for acao, ms in s.latencias:
+            por_acao.setdefault(acao, []).append(ms)
+    pico = pico_rss_mb()
+    return {
+        'sessoes': sessoes,
+        'iteracoes': iteracoes,
+        'reruns': len(latencias),
+        'duracao_s': round(duracao, 2),
+        'reruns_por_segundo': round(len(latencias) / duracao, 2) if duracao else None,
+        'p50_ms': round(percentil(latencias, 50), 1) if latencias else None,
+        'p95_ms': round(percentil(latencias, 95), 1) if latencias else None,
+        'max_ms': round(max(latencias), 1) if latencias else None,
+        'por_acao': {
+            acao: {'n': len(v), 'p50_ms': round(percentil(v, 50), 1), 'p95_ms': round(percentil(v, 95), 1)}
+            for acao, v in por_acao.items()
+        },
+        'erros': [e for s in lista for e in s.erros] + falhas,
+        'pico_rss_mb': round(pico, 1),
+        'rss_por_sessao_mb': round((pico - rss_inicial) / sessoes, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessoes', default='1,3,6', help='Quantidades de sessões simultâneas (padrão: 1,3,6)')
+    parser.add_argument('--iteracoes', type=int, default=1, help='Voltas completas de cada sessão (padrão: 1)')
+    parser.add_argument('--anos', type=int, default=2, help='Anos de histórico de cada usuário (padrão: 2)')
+    parser.add_argument('--transacoes', type=int, default=100, help='Transações por mês (padrão: 100)')
+    parser.add_argument('--paginas-pdf', type=int, default=2, help='Páginas da fatura enviada (padrão: 2)')
+    parser.add_argument('--tempo-limite', type=float, default=120, help='Tempo máximo de um rerun em segundos')
+    parser.add_argument('--saida', help='Grava o JSON neste arquivo em vez da saída padrão')
+    parser.add_argument('--filho', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--diretorio', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        resultado = rodar_sessoes(args.diretorio, args.filho, args.iteracoes, args.paginas_pdf, args.tempo_limite)
+        print(json.dumps(resultado, ensure_ascii=False))
+        return 0
+
+    resultados = []
+    for sessoes in (int(s) for s in args.sessoes.split(',')):
+        # Diretório novo a cada rodada: as sessões gravam faturas e categorias
+        diretorio = preparar_diretorio(args.anos, args.transacoes)
+        try:
+            processo = subprocess.run(
+                [sys.executable, __file__, '--filho', str(sessoes), '--diretorio', str(diretorio),
+                 '--iteracoes', str(args.iteracoes), '--paginas-pdf', str(args.paginas_pdf),
+                 '--tempo-limite', str(args.tempo_limite)],
+                capture_output=True, text=True
+            )
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+        if processo.returncode != 0:
+            print(processo.stderr[-3000:], file=sys.stderr)
+            return 1
+        resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+        resultados.append(resultado)
+        print(f"{sessoes:>3} sessão(ões): p50 {resultado['p50_ms']:.0f} ms, p95 {resultado['p95_ms']:.0f} ms, "
+              f"{resultado['reruns']} reruns, pico RSS {resultado['pico_rss_mb']:.0f} MB "
+              f"(~{resultado['rss_por_sessao_mb']:.0f} MB/sessão), {len(resultado['erros'])} erro(s)", file=sys.stderr)
+
+    relatorio = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'parametros': {'iteracoes': args.iteracoes, 'anos': args.anos, 'transacoes_por_mes': args.transacoes,
+                       'paginas_pdf': args.paginas_pdf},
+        'resultados': resultados
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        Path(args.saida).write_text(texto + '\n', encoding='utf-8')
+    else:
+        print(texto)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
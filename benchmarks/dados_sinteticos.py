@@ -0,0 +1,206 @@
+"""
+Gerador determinístico de históricos sintéticos de usuário.
+
+Monta um arquivo faturas.json no mesmo formato gravado pelo app (esquema
+atual: valores em centavos, versao_esquema e id em cada transação; faturas
+com data_completa, entradas, gastos fixos e parcelas no formato compacto),
+com descrições tiradas da taxonomia de classificar_transacao e do
+classificacoes.json. A mesma semente sempre gera os mesmos dados, então
+duas medições com os mesmos parâmetros são comparáveis.
+
+Uso:
+    python benchmarks/dados_sinteticos.py --anos 5 --transacoes 300 --saida /tmp/faturas.json
+"""
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+from historico_faturas import (
+    resolver_datas_fatura, ordinal_mes, para_centavos, valor_da_parcela, MESES_ABREVIADOS, VERSAO_ESQUEMA
+)
+
+# Estabelecimentos reconhecidos pelas palavras-chave de classificar_transacao, com o peso
+# de cada categoria em uma fatura típica
+ESTABELECIMENTOS = {
+    'Alimentação': (45, [
+        'ifood *ifood', 'ifood *restaurante nanquim', 'rappi *rappi', 'zona sul leblon',
+        'hortifruti gavea', 'padaria oceanos', 'galeto leblon', 'starbucks leblon',
+        'mcdonalds botafogo', 'bendita chica', 'casa do pao de queijo', 'supermercado mundial',
+        'pao de acucar 123', 'bacio di latte', 'restaurante da praia', 'cafeteria central'
+    ]),
+    'Transporte': (15, [
+        'uber *trip', 'uber *uber *trip', '99app *99app', 'posto shell gavea',
+        'ipiranga br', 'estapar leblon', 'metro rio', 'latam airlines', 'jpd park'
+    ]),
+    'Entretenimento': (12, [
+        'netflix.com', 'spotify', 'openai *chatgpt subscr', 'apple.com/bill',
+        'cinemark botafogo', 'ingresso.com', 'sympla *evento', 'zig*caza lagoa', 'steam purchase'
+    ]),
+    'Self Care': (10, [
+        'drogaria venancio', 'drogasil 1234', 'raia drogasil', 'smart fit', 'wellhub gympass',
+        'salao de beleza', 'espacolaser', 'sephora barra', 'clinica sorriso'
+    ]),
+    'Roupas': (10, [
+        'renner', 'zara ipanema', 'c&a barra', 'centauro', 'havaianas leblon',
+        'farm rio', 'vivara', 'mercado livre', 'sk acessorios'
+    ]),
+    'Outros': (8, [
+        'pagamento boleto', 'loja xpto ltda', 'kalunga', 'amazon marketplace',
+        'correios', 'papelaria da esquina'
+    ])
+}
+
+# Compras que aparecem parceladas na fatura ("- parcela i/n") e na lista de parcelas
+COMPRAS_PARCELADAS = [
+    ('Track Field', 600.0), ('Zara Ipanema', 900.0), ('Fast Shop', 3600.0),
+    ('Magazine Luiza', 2400.0), ('Latam Airlines', 4200.0), ('Decathlon', 750.0)
+]
+
+# Assinaturas que se repetem todo mês com o mesmo valor (viram gastos fixos)
+ASSINATURAS = [
+    ('netflix.com', 55.90), ('spotify', 21.90), ('openai *chatgpt subscr', 110.00),
+    ('smart fit', 129.90), ('apple.com/bill', 14.90)
+]
+
+ABREVIACOES = {num: abrev for abrev, num in MESES_ABREVIADOS.items()}
+
+def carregar_descricoes_salvas():
+    """Descrições já classificadas no classificacoes.json da raiz do repositório"""
+    try:
+        with open(RAIZ / 'classificacoes.json', encoding='utf-8') as f:
+            return sorted(json.load(f))
+    except FileNotFoundError:
+        return []
+
+def _valor(rng, categoria):
+    """Valor plausível para uma compra da categoria (lognormal, com compras acima de R$ 1.000)"""
+    mediana = {'Alimentação': 45, 'Transporte': 30, 'Entretenimento': 40,
+               'Self Care': 80, 'Roupas': 180, 'Outros': 120}[categoria]
+    return round(min(rng.lognormvariate(0, 0.9) * mediana, 8000), 2)
+
+def gerar_historico(anos, transacoes_por_mes, semente=42, ano_final=2025):
+    """
+    Gera o histórico de um usuário.
+
+    Args:
+        anos (int): Quantidade de anos de faturas (terminando em dezembro de ano_final)
+        transacoes_por_mes (int): Transações em cada fatura
+        semente (int): Semente do gerador aleatório
+        ano_final (int): Último ano do histórico
+
+    Returns:
+        dict: Dados no formato do faturas.json
+    """
+    rng = random.Random(f"{semente}-{anos}-{transacoes_por_mes}")
+    categorias = list(ESTABELECIMENTOS)
+    pesos = [ESTABELECIMENTOS[c][0] for c in categorias]
+    salvas = carregar_descricoes_salvas()
+
+    faturas = []
+    entradas = []
+    parcelas = []
+    for ano in range(ano_final - anos + 1, ano_final + 1):
+        for mes in range(1, 13):
+            transacoes = []
+
+            def adicionar(descricao, valor, categoria):
+                dia = rng.randint(1, 28)
+                transacoes.append({
+                    'data': f"{dia:02d} {ABREVIACOES[mes]}",
+                    'descricao': descricao,
+                    'valor': para_centavos(valor),
+                    'categoria': categoria
+                })
+
+            for descricao, valor in ASSINATURAS:
+                adicionar(descricao, valor, 'Entretenimento')
+
+            # Uma nova compra parcelada a cada poucos meses
+            if rng.random() < 0.4:
+                nome, valor_total = rng.choice(COMPRAS_PARCELADAS)
+                num_parcelas = rng.choice([2, 3, 5, 6, 10, 12])
+                mes_inicio = ordinal_mes(ano, mes)
+                parcelas.append({
+                    'descricao': nome,
+                    'valor_total': para_centavos(valor_total),
+                    'num_parcelas': num_parcelas,
+                    'valor_parcela': para_centavos(valor_total) // num_parcelas,
+                    'data_inicio': f"{ano}-{mes:02d}-{rng.randint(1, 28):02d}",
+                    'mes_inicio': mes_inicio,
+                    # Parcelas anteriores a 2025 já pagas
+                    'pagas': (1 << max(0, min(num_parcelas, ordinal_mes(ano_final, 1) - mes_inicio))) - 1
+                })
+
+            # Parcelas em andamento aparecem na fatura como "nome - parcela i/n"
+            atual = ordinal_mes(ano, mes)
+            for compra in parcelas:
+                i = atual - compra['mes_inicio']
+                if 0 <= i < compra['num_parcelas'] and len(transacoes) < transacoes_por_mes:
+                    adicionar(f"{compra['descricao'].lower()} - parcela {i + 1}/{compra['num_parcelas']}",
+                              valor_da_parcela(compra, i + 1) / 100, 'Roupas')
+
+            while len(transacoes) < transacoes_por_mes:
+                sorteio = rng.random()
+                if sorteio < 0.005:
+                    adicionar('estorno de compra', _valor(rng, 'Outros'), 'Outros')
+                elif sorteio < 0.15 and salvas:
+                    adicionar(rng.choice(salvas), _valor(rng, 'Outros'), 'Outros')
+                else:
+                    categoria = rng.choices(categorias, pesos)[0]
+                    adicionar(rng.choice(ESTABELECIMENTOS[categoria][1]), _valor(rng, categoria), categoria)
+
+            rng.shuffle(transacoes)
+            fatura = {'mes': mes, 'ano': ano, 'transacoes': transacoes[:transacoes_por_mes]}
+            resolver_datas_fatura(fatura)
+            faturas.append(fatura)
+
+            entradas.append({'mes': mes, 'ano': ano, 'valor': para_centavos(8500), 'descricao': 'Salário',
+                             'tipo': 'Salário'})
+            if rng.random() < 0.3:
+                entradas.append({'mes': mes, 'ano': ano, 'valor': para_centavos(rng.uniform(200, 3000)),
+                                 'descricao': 'Freela', 'tipo': 'Freelance'})
+
+    gastos_fixos = [
+        {'descricao': descricao, 'valor': para_centavos(valor), 'categoria': 'Entretenimento',
+         'data_adicao': f"{ano_final - anos + 1}-01-01 00:00:00"}
+        for descricao, valor in ASSINATURAS
+    ]
+    # Ids de um gerador à parte: os mesmos a cada execução, sem mudar a sequência dos dados
+    rng_ids = random.Random(f"ids-{semente}-{anos}-{transacoes_por_mes}")
+    for fatura in faturas:
+        for transacao in fatura['transacoes']:
+            transacao['id'] = f"{rng_ids.getrandbits(48):012x}"
+    return {'versao_esquema': VERSAO_ESQUEMA, 'faturas': faturas, 'gastos_fixos': gastos_fixos,
+            'entradas': entradas, 'parcelas': parcelas}
+
+def regras_sinteticas():
+    """Algumas regras de usuário, no formato do regras_classificacao.json"""
+    return [
+        {'palavra_chave': 'kalunga', 'categoria': 'Outros'},
+        {'palavra_chave': 'fast shop', 'categoria': 'Outros'},
+        {'palavra_chave': 'magazine luiza', 'categoria': 'Outros'}
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--anos', type=int, default=1)
+    parser.add_argument('--transacoes', type=int, default=100, help='Transações por mês')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', default='faturas.json')
+    args = parser.parse_args()
+
+    dados = gerar_historico(args.anos, args.transacoes, args.semente)
+    with open(args.saida, 'w') as f:
+        json.dump(dados, f, indent=4)
+    total = sum(len(f['transacoes']) for f in dados['faturas'])
+    print(f"{args.saida}: {len(dados['faturas'])} faturas, {total} transações, "
+          f"{len(dados['entradas'])} entradas, {len(dados['parcelas'])} compras parceladas")
+
+if __name__ == '__main__':
+    main()
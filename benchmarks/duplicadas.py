@@ -0,0 +1,63 @@
+"""
+Confere a marcação de transações já salvas no envio de faturas.
+
+A data do PDF não tem ano ("15 MAI"), então a conferência compara a data
+completa resolvida para o mês em que a fatura será gravada. Os casos
+cobrem a cobrança anual repetida um ano depois (não é duplicada), o
+reenvio da mesma fatura (é duplicada) e a compra de dezembro na fatura
+de janeiro. Falha (código de saída 1) se algum caso der errado.
+
+Uso:
+    python benchmarks/duplicadas.py
+"""
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+from historico_faturas import resolver_datas_fatura
+from envio_faturas import marcar_duplicadas, transacoes_para_salvar
+
+def _fatura(mes, ano, *transacoes):
+    fatura = {'mes': mes, 'ano': ano, 'transacoes': [
+        {'data': data, 'descricao': descricao, 'valor': valor, 'categoria': 'Outros'}
+        for data, descricao, valor in transacoes
+    ]}
+    resolver_datas_fatura(fatura)
+    return fatura
+
+def main():
+    dados = {'faturas': [
+        _fatura(5, 2024, ('15 MAI', 'Netflix', 5590), ('20 MAI', 'Anuidade Seguro', 42000)),
+        _fatura(1, 2025, ('28 DEZ', 'Amazon', 15990)),
+    ]}
+    # Fatura de maio/2025 lida do PDF: as mesmas cobranças, um ano depois
+    enviada = [
+        {'data': '15 MAI', 'descricao': 'Netflix', 'valor': 5590},
+        {'data': '20 MAI', 'descricao': 'Anuidade Seguro', 'valor': 42000},
+        {'data': '28 DEZ', 'descricao': 'Amazon', 'valor': 15990},
+    ]
+
+    casos = [
+        ("cobranças do ano anterior não são duplicadas",
+         marcar_duplicadas(enviada[:2], dados, 5, 2025), {}),
+        ("reenvio da fatura de maio/2024 é duplicado",
+         marcar_duplicadas(enviada[:2], dados, 5, 2024), {0: [(2024, 5)], 1: [(2024, 5)]}),
+        ("compra de dezembro na fatura de janeiro é duplicada",
+         marcar_duplicadas(enviada[2:], dados, 2, 2025), {0: [(2025, 1)]}),
+    ]
+    gravadas = transacoes_para_salvar({'transacoes': enviada[:2]}, 5, 2025,
+                                      marcar_duplicadas(enviada[:2], dados, 5, 2025))
+    casos.append(("todas as cobranças de maio/2025 são gravadas", len(gravadas), 2))
+
+    falhas = 0
+    for nome, obtido, esperado in casos:
+        certo = obtido == esperado
+        falhas += not certo
+        print(f"{'ok' if certo else 'ERRO':<6}{nome}" + ('' if certo else f": {obtido!r} != {esperado!r}"))
+    return 1 if falhas else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
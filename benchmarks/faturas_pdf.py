@@ -0,0 +1,186 @@
+"""
+Gerador de faturas sintéticas em PDF no estilo do Nubank.
+
+Escreve o PDF diretamente (sem bibliotecas de terceiros), com texto
+extraível em Helvetica. Cada linha de transação tem data ("02 MAI"),
+sufixo do cartão em parte das linhas ("•••• 1234"), descrição (inclusive
+"- Parcela i/n") e valor ("R$ 1.234,56"). Também há linhas de IOF,
+"Total de ..." e "Pagamento em ..." que o leitor deve ignorar. A
+verdade de referência (as transações que o leitor deve encontrar) é
+devolvida junto com o PDF.
+
+Uso:
+    python benchmarks/faturas_pdf.py --paginas 3 --saida /tmp/fatura.pdf
+"""
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+from historico_faturas import MESES_ABREVIADOS
+
+ABREVIACOES = {num: abrev for abrev, num in MESES_ABREVIADOS.items()}
+
+# Tamanho A4 em pontos e layout das linhas
+LARGURA, ALTURA = 595, 842
+MARGEM_TOPO, MARGEM_BASE = 780, 60
+ESPACAMENTO = 14
+LINHAS_POR_PAGINA = (MARGEM_TOPO - MARGEM_BASE) // ESPACAMENTO
+
+ESTABELECIMENTOS = [
+    'Ifood *Ifood', 'Uber *Trip', 'Zona Sul Leblon', 'Drogaria Venancio', 'Netflix.Com',
+    'Openai *Chatgpt Subscr', 'Renner', 'Posto Shell Gavea', 'Padaria Oceanos', 'Smart Fit',
+    'Apple.Com/Bill', 'Hortifruti Gavea', 'Bendita Chica', 'Mercado Livre', 'Cinemark Botafogo'
+]
+PARCELADOS = ['Fast Shop', 'Track Field', 'Magazine Luiza', 'Latam Airlines', 'Zara Ipanema']
+SUFIXOS_CARTAO = ['1234', '5678', '9012']
+
+def formatar_brl(valor):
+    """Formata como na fatura: 1234.5 -> "R$ 1.234,50" """
+    inteiro, centavos = f"{valor:.2f}".split('.')
+    return f"R$ {int(inteiro):,}".replace(',', '.') + f",{centavos}"
+
+def gerar_linhas(paginas, mes, ano, semente=7, proporcao_milhar=0.05):
+    """
+    Sorteia as linhas da fatura.
+
+    Args:
+        paginas (int): Páginas de transações
+        mes (int): Mês da fatura
+        ano (int): Ano da fatura
+        semente (int): Semente do gerador aleatório
+        proporcao_milhar (float): Fração das compras com valor acima de R$ 1.000
+
+    Returns:
+        tuple: (linhas, transacoes esperadas). Cada linha é uma lista de
+        (x, texto); cada transação esperada tem data, descricao e valor.
+    """
+    rng = random.Random(f"{semente}-{paginas}-{mes}-{ano}")
+    abrev = ABREVIACOES[mes]
+    linhas = []
+    esperadas = []
+    total = 0.0
+
+    # Duas linhas ficam para o rodapé, para a fatura ocupar exatamente o número de páginas pedido
+    quantidade = paginas * LINHAS_POR_PAGINA - 2
+    for _ in range(quantidade):
+        data = f"{rng.randint(1, 28):02d} {abrev}"
+        sorteio = rng.random()
+        if sorteio < 0.03:
+            # IOF de compra internacional: aparece na fatura, mas não é uma transação
+            valor = round(rng.uniform(0.5, 20), 2)
+            linhas.append([(40, data), (100, 'IOF de "Apple.Com/Bill"'), (480, formatar_brl(valor))])
+            continue
+
+        if sorteio < 0.15:
+            nome = rng.choice(PARCELADOS)
+            num = rng.choice([3, 5, 10, 12])
+            descricao = f"{nome} - Parcela {rng.randint(1, num)}/{num}"
+        else:
+            descricao = rng.choice(ESTABELECIMENTOS)
+
+        if rng.random() < proporcao_milhar:
+            valor = round(rng.uniform(1000, 15000), 2)
+        else:
+            valor = round(rng.uniform(3, 999), 2)
+
+        linha = [(40, data)]
+        if rng.random() < 0.5:
+            linha.append((100, f"•••• {rng.choice(SUFIXOS_CARTAO)}"))
+            linha.append((160, descricao))
+        else:
+            linha.append((100, descricao))
+        linha.append((480, formatar_brl(valor)))
+        linhas.append(linha)
+        esperadas.append({'data': data, 'descricao': descricao, 'valor': valor})
+        total += valor
+
+    # Rodapé com as linhas que o leitor deve ignorar
+    linhas.append([(40, f"Total de compras de todos os cartões, a partir de 01 {abrev}"), (480, formatar_brl(total))])
+    linhas.append([(40, f"Pagamento em 05 {abrev}"), (480, formatar_brl(round(total * 0.9, 2)))])
+    return linhas, esperadas
+
+def _texto_pdf(texto):
+    """Escapa o texto para uma string literal do PDF em WinAnsiEncoding"""
+    bruto = texto.encode('cp1252')
+    return bruto.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+def _conteudo_pagina(cabecalho, linhas):
+    """Monta o fluxo de conteúdo de uma página"""
+    partes = [b'BT /F1 14 Tf 40 805 Td (' + _texto_pdf(cabecalho) + b') Tj ET']
+    y = MARGEM_TOPO
+    for linha in linhas:
+        for x, texto in linha:
+            partes.append(b'BT /F1 9 Tf %d %d Td (' % (x, y) + _texto_pdf(texto) + b') Tj ET')
+        y -= ESPACAMENTO
+    return b'\n'.join(partes)
+
+def montar_pdf(linhas, mes, ano):
+    """
+    Escreve o PDF com as linhas distribuídas pelas páginas.
+
+    Returns:
+        bytes: Conteúdo do arquivo PDF
+    """
+    paginas = [linhas[i:i + LINHAS_POR_PAGINA] for i in range(0, len(linhas), LINHAS_POR_PAGINA)] or [[]]
+    cabecalho = f"Nubank - Fatura de {ABREVIACOES[mes]} {ano}"
+
+    # Objetos 1 a 3: catálogo, árvore de páginas e fonte; depois página e conteúdo alternados
+    objetos = []
+    filhos = ' '.join(f"{4 + 2 * i} 0 R" for i in range(len(paginas)))
+    objetos.append(b'<< /Type /Catalog /Pages 2 0 R >>')
+    objetos.append(f"<< /Type /Pages /Kids [{filhos}] /Count {len(paginas)} >>".encode())
+    objetos.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+    for i, linhas_pagina in enumerate(paginas):
+        conteudo = _conteudo_pagina(f"{cabecalho} - página {i + 1}/{len(paginas)}", linhas_pagina)
+        objetos.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {LARGURA} {ALTURA}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objetos.append(b'<< /Length %d >>\nstream\n' % len(conteudo) + conteudo + b'\nendstream')
+
+    saida = bytearray(b'%PDF-1.4\n')
+    posicoes = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posicoes.append(len(saida))
+        saida += b'%d 0 obj\n' % numero + objeto + b'\nendobj\n'
+    inicio_xref = len(saida)
+    saida += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+    for posicao in posicoes:
+        saida += b'%010d 00000 n \n' % posicao
+    saida += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objetos) + 1, inicio_xref)
+    return bytes(saida)
+
+def gerar_fatura_pdf(paginas=1, mes=5, ano=2025, semente=7, proporcao_milhar=0.05):
+    """
+    Gera uma fatura sintética.
+
+    Returns:
+        tuple: (bytes do PDF, lista de transações esperadas)
+    """
+    linhas, esperadas = gerar_linhas(paginas, mes, ano, semente, proporcao_milhar)
+    return montar_pdf(linhas, mes, ano), esperadas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paginas', type=int, default=1)
+    parser.add_argument('--mes', type=int, default=5)
+    parser.add_argument('--ano', type=int, default=2025)
+    parser.add_argument('--semente', type=int, default=7)
+    parser.add_argument('--saida', default='fatura_sintetica.pdf')
+    parser.add_argument('--esperado', help='Grava as transações esperadas em JSON neste arquivo')
+    args = parser.parse_args()
+
+    pdf, esperadas = gerar_fatura_pdf(args.paginas, args.mes, args.ano, args.semente)
+    Path(args.saida).write_bytes(pdf)
+    if args.esperado:
+        Path(args.esperado).write_text(json.dumps(esperadas, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"{args.saida}: {args.paginas} página(s), {len(esperadas)} transações")
+
+if __name__ == '__main__':
+    main()
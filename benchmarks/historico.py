@@ -0,0 +1,193 @@
+"""
+Mede as funções de histórico e de classificação com dados sintéticos.
+
+Para cada cenário (anos de histórico x transações por mês) gera os dados
+com benchmarks/dados_sinteticos.py em um diretório temporário e cronometra
+carregar_dados, salvar_dados, classificar_transacao,
+obter_historico_gastos_mensais, obter_parcelas_futuras e
+reaplicar_regras_todas_transacoes. O app é importado sem o servidor do
+Streamlit (modo "bare"); os arquivos do repositório não são alterados.
+
+O resultado sai em JSON (na saída padrão ou em --saida); com --comparar,
+mostra a razão entre as medianas de uma medição anterior e a atual.
+
+Uso:
+    python benchmarks/historico.py --saida antes.json
+    python benchmarks/historico.py --saida depois.json --comparar antes.json
+    python benchmarks/historico.py --cenarios 1x100,10x1000 --repeticoes 5
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+import streamlit as st
+from streamlit.logger import set_log_level
+
+from dados_sinteticos import gerar_historico, regras_sinteticas
+
+# O maior cenário (120 mil transações) leva alguns minutos
+CENARIOS_PADRAO = '1x100,1x1000,5x300,10x1000'
+# Quantas descrições passam por classificar_transacao em cada repetição
+AMOSTRA_CLASSIFICACAO = 2000
+
+def importar_app():
+    """Importa o app.py a partir da raiz do repositório, como o Streamlit faria"""
+    anterior = os.getcwd()
+    os.chdir(RAIZ)
+    try:
+        import app
+        import historico_faturas
+    finally:
+        os.chdir(anterior)
+    # Sem o servidor, o Streamlit avisa a cada chamada que está em modo "bare";
+    # o nível precisa ser ajustado depois que o app carregou a configuração
+    set_log_level('error')
+    return app, historico_faturas
+
+def cronometrar(funcao, repeticoes, preparar=None):
+    """
+    Executa a função várias vezes e devolve os tempos em ms.
+
+    Args:
+        funcao: Chamada sem argumentos
+        repeticoes (int): Quantidade de execuções medidas
+        preparar: Chamada antes de cada execução, fora da medição
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+def medir_cenario(app, historico, anos, transacoes_por_mes, repeticoes, semente):
+    """Gera os dados do cenário em um diretório temporário e mede cada função"""
+    dados = gerar_historico(anos, transacoes_por_mes, semente)
+    original = json.dumps(dados, indent=4)
+    total_transacoes = sum(len(f['transacoes']) for f in dados['faturas'])
+    ano_final = dados['faturas'][-1]['ano']
+    descricoes = [t['descricao'] for f in dados['faturas'] for t in f['transacoes']][:AMOSTRA_CLASSIFICACAO]
+
+    diretorio = Path(tempfile.mkdtemp(prefix='fatura-bench-'))
+    anterior = os.getcwd()
+    try:
+        # Classificações e regras são lidas do diretório atual, como no app
+        shutil.copy(RAIZ / 'classificacoes.json', diretorio / 'classificacoes.json')
+        with open(diretorio / 'regras_classificacao.json', 'w', encoding='utf-8') as f:
+            json.dump(regras_sinteticas(), f)
+        os.chdir(diretorio)
+        st.session_state['user_data_dir'] = str(diretorio / 'data' / 'bench')
+        arquivo = historico.get_user_data_file()
+        arquivo.parent.mkdir(parents=True)
+
+        def restaurar():
+            arquivo.write_text(original)
+
+        restaurar()
+        carregados = historico.carregar_dados()
+        medicoes = {
+            'carregar_dados': cronometrar(historico.carregar_dados, repeticoes),
+            'salvar_dados': cronometrar(lambda: historico.salvar_dados(carregados), repeticoes),
+            'classificar_transacao': cronometrar(
+                lambda: [app.classificar_transacao(d) for d in descricoes], repeticoes),
+            'obter_historico_gastos_mensais': cronometrar(historico.obter_historico_gastos_mensais, repeticoes),
+            'obter_parcelas_futuras': cronometrar(lambda: historico.obter_parcelas_futuras(1, ano_final), repeticoes),
+            'reaplicar_regras_todas_transacoes': cronometrar(
+                app.reaplicar_regras_todas_transacoes, repeticoes, preparar=restaurar)
+        }
+        tamanho = arquivo.stat().st_size
+    finally:
+        os.chdir(anterior)
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    resultados = []
+    for funcao, tempos in medicoes.items():
+        resultado = {
+            'cenario': f"{anos}x{transacoes_por_mes}",
+            'anos': anos,
+            'transacoes_por_mes': transacoes_por_mes,
+            'total_transacoes': total_transacoes,
+            'tamanho_arquivo_bytes': tamanho,
+            'funcao': funcao,
+            'repeticoes': repeticoes,
+            'mediana_ms': round(statistics.median(tempos), 3),
+            'min_ms': round(min(tempos), 3),
+            'max_ms': round(max(tempos), 3)
+        }
+        if funcao == 'classificar_transacao':
+            resultado['chamadas'] = len(descricoes)
+            resultado['por_chamada_us'] = round(statistics.median(tempos) * 1000 / len(descricoes), 2)
+        resultados.append(resultado)
+    return resultados
+
+def versao_codigo():
+    """Commit atual do repositório, se houver git"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(anterior, atual):
+    """Imprime a razão entre as medianas (atual / anterior) de cada cenário e função"""
+    medianas = {(r['cenario'], r['funcao']): r['mediana_ms'] for r in anterior['resultados']}
+    print(f"{'Cenário':<10}{'Função':<36}{'antes ms':>12}{'depois ms':>12}{'razão':>8}", file=sys.stderr)
+    for r in atual['resultados']:
+        antes = medianas.get((r['cenario'], r['funcao']))
+        if antes is None:
+            continue
+        razao = r['mediana_ms'] / antes if antes else float('inf')
+        print(f"{r['cenario']:<10}{r['funcao']:<36}{antes:>12.1f}{r['mediana_ms']:>12.1f}{razao:>8.2f}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cenarios', default=CENARIOS_PADRAO,
+                        help=f'Lista de ANOSxTRANSACOES_POR_MES separada por vírgulas (padrão: {CENARIOS_PADRAO})')
+    parser.add_argument('--repeticoes', type=int, default=3, help='Execuções medidas por função (padrão: 3)')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='Grava o JSON neste arquivo em vez da saída padrão')
+    parser.add_argument('--comparar', help='JSON de uma medição anterior para comparar')
+    args = parser.parse_args()
+
+    app, historico = importar_app()
+    resultados = []
+    for cenario in args.cenarios.split(','):
+        anos, transacoes = (int(parte) for parte in cenario.lower().split('x'))
+        print(f"Cenário {anos} ano(s) x {transacoes} transações/mês...", file=sys.stderr)
+        resultados.extend(medir_cenario(app, historico, anos, transacoes, args.repeticoes, args.semente))
+
+    relatorio = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'commit': versao_codigo(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'semente': args.semente,
+        'resultados': resultados
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        Path(args.saida).write_text(texto + '\n', encoding='utf-8')
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(json.load(f), relatorio)
+
+if __name__ == '__main__':
+    main()
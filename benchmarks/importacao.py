@@ -0,0 +1,94 @@
+"""
+Mede o custo de importação até a tela de login.
+
+Executa o app.py sem o servidor do Streamlit (modo "bare", sem sessão
+autenticada) em processos novos com `python -X importtime` e resume o
+tempo de importação por módulo. Falha (código de saída 1) se algum módulo
+que deveria ser adiado for importado no caminho do login, ou se a mediana
+passar do limite informado.
+
+Uso:
+    python benchmarks/importacao.py
+    python benchmarks/importacao.py --repeticoes 9 --limite-ms 2500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Só devem ser importados quando uma aba ou o upload precisarem deles
+MODULOS_ADIADOS = ['pdfplumber', 'plotly.express', 'previsao', 'anomalias', 'recorrencias']
+# Mostrados no resumo para acompanhar a evolução
+MODULOS_ACOMPANHADOS = [
+    'streamlit', 'streamlit_authenticator', 'yaml', 'pandas', 'numpy', 'pyarrow',
+    'plotly.graph_objects', 'historico_faturas'
+] + MODULOS_ADIADOS
+
+CODIGO = "import runpy; runpy.run_path('app.py', run_name='__main__')"
+
+def medir_execucao():
+    """
+    Roda o app uma vez em um processo novo.
+
+    Returns:
+        tuple: (tempo total em ms, dict módulo -> tempo cumulativo em ms)
+    """
+    ambiente = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    inicio = time.perf_counter()
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CODIGO],
+        cwd=RAIZ, env=ambiente, capture_output=True, text=True
+    )
+    total_ms = (time.perf_counter() - inicio) * 1000
+    if resultado.returncode != 0:
+        raise RuntimeError(f"app.py falhou no modo bare:\n{resultado.stderr[-2000:]}")
+
+    modulos = {}
+    for linha in resultado.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        # Formato: "import time: <próprio µs> | <cumulativo µs> | <módulo indentado>"
+        _, cumulativo, nome = linha[len('import time:'):].split('|')
+        modulos[nome.strip()] = int(cumulativo) / 1000
+    return total_ms, modulos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=5, help='Processos medidos (padrão: 5)')
+    parser.add_argument('--limite-ms', type=float, default=None, help='Falha se a mediana do tempo total passar deste valor')
+    args = parser.parse_args()
+
+    tempos = []
+    por_modulo = {}
+    for _ in range(args.repeticoes):
+        total_ms, modulos = medir_execucao()
+        tempos.append(total_ms)
+        for nome in MODULOS_ACOMPANHADOS:
+            if nome in modulos:
+                por_modulo.setdefault(nome, []).append(modulos[nome])
+
+    mediana = statistics.median(tempos)
+    print(f"Até a tela de login: mediana {mediana:.0f} ms (mín {min(tempos):.0f}, máx {max(tempos):.0f}, n={len(tempos)})")
+    print(f"{'Módulo':<26}{'importado':>10}{'mediana ms':>12}")
+    for nome in MODULOS_ACOMPANHADOS:
+        valores = por_modulo.get(nome)
+        if valores:
+            print(f"{nome:<26}{'sim':>10}{statistics.median(valores):>12.1f}")
+        else:
+            print(f"{nome:<26}{'não':>10}{'-':>12}")
+
+    falhas = [nome for nome in MODULOS_ADIADOS if nome in por_modulo]
+    if falhas:
+        print(f"ERRO: importados no caminho do login: {', '.join(falhas)}")
+    if args.limite_ms is not None and mediana > args.limite_ms:
+        print(f"ERRO: mediana {mediana:.0f} ms acima do limite de {args.limite_ms:.0f} ms")
+        falhas.append('limite')
+    return 1 if falhas else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Mede a leitura de faturas em PDF (processar_pdf) com faturas sintéticas.
+
+Para cada quantidade de páginas gera uma fatura com
+benchmarks/faturas_pdf.py e mede páginas por segundo, transações por
+segundo e a acurácia contra as transações esperadas: precisão,
+revocação e acertos nas compras a partir de R$ 1.000. O cache do
+Streamlit é limpo antes de cada execução, para medir a leitura de fato.
+
+Uso:
+    python benchmarks/leitura_pdf.py
+    python benchmarks/leitura_pdf.py --paginas 1,10,50 --repeticoes 5 --saida pdf.json
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from faturas_pdf import gerar_fatura_pdf
+from historico import importar_app, versao_codigo
+
+def chave(transacao):
+    """
+    Identifica uma transação para comparar o lido com o esperado. O app lê
+    o valor em centavos; as faturas sintéticas trazem o esperado em reais.
+    """
+    valor = transacao['valor']
+    centavos = valor if isinstance(valor, int) else int(round(valor * 100))
+    return (transacao['data'], transacao['descricao'], centavos)
+
+def avaliar(lidas, esperadas):
+    """
+    Compara as transações lidas com as esperadas.
+
+    Returns:
+        dict: Precisão, revocação e acertos entre as compras de R$ 1.000 ou mais
+    """
+    contagem_lidas = Counter(chave(t) for t in lidas)
+    contagem_esperadas = Counter(chave(t) for t in esperadas)
+    corretas = sum((contagem_lidas & contagem_esperadas).values())
+    milhar = Counter(c for c in contagem_esperadas.elements() if c[2] >= 100000)
+    return {
+        'lidas': len(lidas),
+        'esperadas': len(esperadas),
+        'corretas': corretas,
+        'precisao': round(corretas / len(lidas), 4) if lidas else 0.0,
+        'revocacao': round(corretas / len(esperadas), 4) if esperadas else 1.0,
+        'milhar_esperadas': sum(milhar.values()),
+        'milhar_corretas': sum((contagem_lidas & milhar).values())
+    }
+
+def medir(app, paginas, repeticoes, semente):
+    """Gera a fatura com o número de páginas pedido e mede a leitura"""
+    pdf, esperadas = gerar_fatura_pdf(paginas, semente=semente)
+    tempos = []
+    df = None
+    for _ in range(repeticoes):
+        app.processar_pdf.clear()
+        inicio = time.perf_counter()
+        df = app.processar_pdf(io.BytesIO(pdf))
+        tempos.append(time.perf_counter() - inicio)
+
+    lidas = [] if df is None else df.to_dict('records')
+    mediana = statistics.median(tempos)
+    return {
+        'paginas': paginas,
+        'tamanho_pdf_bytes': len(pdf),
+        'repeticoes': repeticoes,
+        'mediana_ms': round(mediana * 1000, 3),
+        'min_ms': round(min(tempos) * 1000, 3),
+        'paginas_por_segundo': round(paginas / mediana, 2),
+        'transacoes_por_segundo': round(len(lidas) / mediana, 1),
+        **avaliar(lidas, esperadas)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paginas', default='1,5,20', help='Quantidades de páginas separadas por vírgulas (padrão: 1,5,20)')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--semente', type=int, default=7)
+    parser.add_argument('--saida', help='Grava o JSON neste arquivo em vez da saída padrão')
+    args = parser.parse_args()
+
+    app, _ = importar_app()
+    resultados = []
+    for paginas in (int(p) for p in args.paginas.split(',')):
+        resultado = medir(app, paginas, args.repeticoes, args.semente)
+        resultados.append(resultado)
+        print(f"{paginas:>4} página(s): {resultado['mediana_ms']:>9.1f} ms, "
+              f"{resultado['paginas_por_segundo']:>7.1f} pág/s, {resultado['transacoes_por_segundo']:>8.1f} transações/s, "
+              f"precisão {resultado['precisao']:.3f}, revocação {resultado['revocacao']:.3f}, "
+              f"≥ R$ 1.000: {resultado['milhar_corretas']}/{resultado['milhar_esperadas']}", file=sys.stderr)
+
+    relatorio = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'commit': versao_codigo(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'semente': args.semente,
+        'resultados': resultados
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        Path(args.saida).write_text(texto + '\n', encoding='utf-8')
+    else:
+        print(texto)
+
+if __name__ == '__main__':
+    main()
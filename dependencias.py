@@ -0,0 +1,34 @@
+"""
+Acesso às dependências pesadas, importadas apenas no primeiro uso.
+
+A tela de login não precisa de pandas, Plotly nem pdfplumber; importá-los
+só quando uma aba ou o upload os usa reduz o tempo de abertura de cada
+nova sessão. Depois do primeiro uso o módulo fica em sys.modules e a
+chamada custa apenas uma consulta ao dicionário.
+"""
+
+def pandas():
+    """Retorna o módulo pandas"""
+    import pandas
+    return pandas
+
+def plotly_go():
+    """Retorna o módulo plotly.graph_objects"""
+    import plotly.graph_objects
+    return plotly.graph_objects
+
+def pdfplumber():
+    """Retorna o módulo pdfplumber"""
+    import pdfplumber
+    return pdfplumber
+
+def openpyxl():
+    """Retorna o módulo openpyxl"""
+    import openpyxl
+    return openpyxl
+
+def pyarrow():
+    """Retorna o módulo pyarrow com o suporte a Parquet (pyarrow.parquet)"""
+    import pyarrow
+    import pyarrow.parquet
+    return pyarrow
@@ -0,0 +1,489 @@
+"""
+Leitura das faturas em PDF e preparação do envio em segundo plano.
+
+O envio passa por etapas fora da thread do script (ver tarefas.py):
+leitura do PDF, classificação, marcação de duplicadas e preparação.
+O resultado preparado fica guardado pelo hash do conteúdo, então reenviar
+o mesmo arquivo ou voltar à aba não refaz a leitura, e salvar a fatura
+só grava o que já está pronto.
+
+No envio em lote (preparar_lote), os PDFs são lidos em paralelo em
+processos separados, o mês de cada fatura é deduzido do próprio texto
+e todas as transações são classificadas de uma vez.
+"""
+import copy
+import hashlib
+import io
+import os
+import re
+import multiprocessing
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import streamlit as st
+from dependencias import pdfplumber
+from historico_faturas import (
+    carregar_dados, obter_versao_dados, resolver_data_transacao, resolver_datas_fatura, MESES_ABREVIADOS
+)
+
+# Valores na fatura: "R$ 45,90" ou, a partir de mil, "R$ 1.234,56" (ponto separa os milhares)
+PADRAO_VALOR = r'R\$ (?:\d{1,3}(?:\.\d{3})+,\d{2}|\d+[.,]\d{2})'
+PADRAO_DATA = r'\d{2} [A-Z]{3}'
+# Linhas com data que não são transações
+TERMOS_IGNORADOS = ['iof de', 'total de', 'pagamento em']
+# Arquivos cujas mudanças alteram a classificação já preparada
+ARQUIVOS_CLASSIFICACAO = ['regras_classificacao.json', 'classificacoes.json']
+# Mês da fatura no texto: data de vencimento ("Vencimento: 15 JUN 2025") ou cabeçalho ("Fatura de MAI 2025")
+PADRAO_VENCIMENTO = r'(?i:vencimento)\D{0,20}\d{2} ([A-Za-z]{3}) (\d{4})'
+PADRAO_MES_ANO = r'\b([A-Za-z]{3})[ /](\d{4})\b'
+# Faturas preparadas guardadas (as menos usadas saem primeiro); cabe um lote de dois anos
+MAXIMO_PREPARADAS = 32
+# Abaixo disso o lote é lido na própria thread: abrir processos custa mais que a leitura
+MINIMO_PARA_PROCESSOS = 3
+MAXIMO_PROCESSOS = 4
+
+def converter_valor(texto):
+    """Converte um valor da fatura (ex: "R$ 1.234,56") em centavos (123456), sem passar por float"""
+    numero = texto.replace('R$ ', '')
+    if ',' in numero:
+        numero = numero.replace('.', '').replace(',', '.')
+    reais, centavos = numero.split('.')
+    return int(reais) * 100 + int(centavos)
+
+def extrair_transacao(linha):
+    """
+    Interpreta uma linha de texto da fatura.
+
+    Returns:
+        dict|None: data, descricao e valor (em centavos), ou None se a linha não for uma transação
+    """
+    if not re.search(PADRAO_DATA, linha):
+        return None
+    # Ignorar linhas de IOF e totais
+    if any(termo in linha.lower() for termo in TERMOS_IGNORADOS):
+        return None
+
+    data = re.search(PADRAO_DATA, linha).group()
+    valor = re.search(PADRAO_VALOR, linha)
+    if not valor:
+        return None
+    descricao = re.sub(PADRAO_DATA + '|' + PADRAO_VALOR, '', linha).strip()
+    # Limpar números de cartão da descrição
+    descricao = re.sub(r'•{4} \d{4}', '', descricao).strip()
+    # Ignorar se a descrição estiver vazia após limpeza
+    if not descricao:
+        return None
+    return {'data': data, 'descricao': descricao, 'valor': converter_valor(valor.group())}
+
+def inferir_mes_ano(texto):
+    """
+    Deduz o mês da fatura pelo texto do PDF: a data de vencimento, se houver;
+    senão, o primeiro "MMM AAAA" com um mês válido (ex: o cabeçalho).
+
+    Returns:
+        tuple|None: (ano, mes), ou None se o texto não indicar o mês
+    """
+    candidatos = re.findall(PADRAO_VENCIMENTO, texto) + re.findall(PADRAO_MES_ANO, texto)
+    for abreviacao, ano in candidatos:
+        mes = MESES_ABREVIADOS.get(abreviacao.upper())
+        if mes:
+            return int(ano), mes
+    return None
+
+def ler_transacoes_pdf(arquivo_pdf, ao_ler_pagina=None):
+    """
+    Lê as transações do PDF da fatura, sem mostrar nada na tela.
+
+    Args:
+        arquivo_pdf: Caminho ou arquivo aberto (ex: o retorno do st.file_uploader)
+        ao_ler_pagina (callable): Chamada com (páginas lidas, total de páginas)
+
+    Returns:
+        tuple: (transações, linhas que não puderam ser interpretadas,
+        (ano, mes) deduzido do texto). Se só as datas das transações indicarem
+        o mês, o ano vem None; se nem elas, a referência inteira é None.
+    """
+    transacoes = []
+    linhas_com_erro = []
+    referencia = None
+    with pdfplumber().open(arquivo_pdf) as pdf:
+        total = len(pdf.pages)
+        for numero, pagina in enumerate(pdf.pages, start=1):
+            texto = pagina.extract_text() or ''
+            if referencia is None:
+                referencia = inferir_mes_ano(texto)
+            for linha in texto.split('\n'):
+                try:
+                    transacao = extrair_transacao(linha)
+                except Exception:
+                    linhas_com_erro.append(linha)
+                    continue
+                if transacao:
+                    transacoes.append(transacao)
+            if ao_ler_pagina:
+                ao_ler_pagina(numero, total)
+    if referencia is None:
+        referencia = _mes_mais_frequente(transacoes)
+    return transacoes, linhas_com_erro, referencia
+
+def _mes_mais_frequente(transacoes):
+    """Sem mês no texto: o mês mais comum nas datas das transações (o ano fica em aberto)"""
+    meses = Counter(MESES_ABREVIADOS.get(t['data'][-3:].upper()) for t in transacoes)
+    meses.pop(None, None)
+    if not meses:
+        return None
+    return None, meses.most_common(1)[0][0]
+
+def ler_fatura(conteudo):
+    """
+    Lê o PDF a partir do conteúdo. Fica no nível do módulo para poder rodar
+    em outro processo (ver preparar_lote).
+
+    Returns:
+        dict: transacoes, linhas_com_erro, referencia e paginas
+    """
+    paginas = []
+    transacoes, linhas_com_erro, referencia = ler_transacoes_pdf(
+        io.BytesIO(conteudo), lambda lidas, total: paginas.append(lidas)
+    )
+    return {
+        'transacoes': transacoes,
+        'linhas_com_erro': linhas_com_erro,
+        'referencia': referencia,
+        'paginas': len(paginas)
+    }
+
+def hash_conteudo(conteudo):
+    """Identifica o arquivo enviado pelo conteúdo"""
+    return hashlib.sha256(conteudo).hexdigest()
+
+def assinatura_classificacao():
+    """Muda sempre que as regras ou as classificações salvas mudam"""
+    assinatura = []
+    for nome in ARQUIVOS_CLASSIFICACAO:
+        try:
+            assinatura.append(os.stat(nome).st_mtime_ns)
+        except FileNotFoundError:
+            assinatura.append(0)
+    return tuple(assinatura)
+
+@st.cache_resource
+def _preparadas():
+    """Faturas lidas e classificadas, por (hash do conteúdo, assinatura da classificação)"""
+    return OrderedDict(), threading.Lock()
+
+def _guardada(chave):
+    """Leitura já classificada deste conteúdo, se ainda estiver guardada"""
+    preparadas, trava = _preparadas()
+    with trava:
+        guardada = preparadas.get(chave)
+        if guardada:
+            preparadas.move_to_end(chave)
+        return guardada
+
+def _guardar(chave, leitura):
+    """Guarda a leitura classificada, descartando as menos usadas"""
+    preparadas, trava = _preparadas()
+    guardada = dict(leitura, hash=chave[0])
+    with trava:
+        preparadas[chave] = guardada
+        while len(preparadas) > MAXIMO_PREPARADAS:
+            preparadas.popitem(last=False)
+    return guardada
+
+def classificar_lote(transacoes, classificar, ao_progredir=None):
+    """
+    Classifica as transações de uma vez: cada descrição distinta passa uma
+    única vez pelo classificador, mesmo que se repita em várias faturas.
+
+    Args:
+        transacoes (list): Transações a classificar (recebem 'categoria')
+        classificar (callable): Função que recebe a descrição e devolve a categoria
+        ao_progredir (callable): Chamada com (descrições classificadas, total)
+    """
+    descricoes = list(dict.fromkeys(t['descricao'] for t in transacoes))
+    categorias = {}
+    for i, descricao in enumerate(descricoes):
+        categorias[descricao] = classificar(descricao)
+        if ao_progredir and i % 50 == 0:
+            ao_progredir(i, len(descricoes))
+    for transacao in transacoes:
+        transacao['categoria'] = categorias[transacao['descricao']]
+
+def _sem_transacoes(nome):
+    mensagem = ("Não foi possível encontrar transações no arquivo. "
+                "Certifique-se de que este é um arquivo de fatura do Nubank.")
+    return ValueError(f"{nome}: {mensagem}" if nome else mensagem)
+
+def indexar_salvas(dados):
+    """Índice (data completa, descrição, valor) -> meses onde a transação já está salva"""
+    salvas = {}
+    for fatura in dados.get('faturas', []):
+        for transacao in fatura.get('transacoes', []):
+            data_completa = transacao.get('data_completa') or resolver_data_transacao(
+                transacao.get('data'), fatura['mes'], fatura['ano']
+            )
+            chave = (data_completa, transacao['descricao'], transacao['valor'])
+            salvas.setdefault(chave, set()).add((fatura['ano'], fatura['mes']))
+    return salvas
+
+def marcar_duplicadas(transacoes, dados, mes, ano, salvas=None):
+    """
+    Procura as transações que já estão salvas em alguma fatura (mesma data,
+    descrição e valor).
+
+    A data do PDF não tem ano ("15 MAI"); ela é resolvida como se a fatura
+    fosse gravada em mes/ano, para que a assinatura anual do ano anterior
+    não seja tomada por repetida.
+
+    Args:
+        mes, ano (int): Mês da fatura onde as transações serão gravadas
+        salvas (dict): Índice de indexar_salvas(dados), para conferir várias faturas sem refazê-lo
+
+    Returns:
+        dict: posição da transação -> lista de (ano, mes) onde ela já existe
+    """
+    if salvas is None:
+        salvas = indexar_salvas(dados)
+    fatura = {'mes': mes, 'ano': ano, 'transacoes': [{'data': t.get('data')} for t in transacoes]}
+    resolver_datas_fatura(fatura)
+    duplicadas = {}
+    for i, (transacao, resolvida) in enumerate(zip(transacoes, fatura['transacoes'])):
+        meses = salvas.get((resolvida['data_completa'], transacao['descricao'], transacao['valor']))
+        if meses:
+            duplicadas[i] = sorted(meses)
+    return duplicadas
+
+def _conferir_na_preparacao(preparada, dados, mes=None, ano=None, salvas=None):
+    """Marca as duplicadas para o mês informado ou, sem ele, para o mês deduzido do PDF"""
+    if not (mes and ano):
+        ano, mes = preparada['referencia'] or (None, None)
+    preparada['mes_duplicadas'] = (ano, mes) if mes and ano else None
+    preparada['duplicadas'] = (
+        marcar_duplicadas(preparada['transacoes'], dados, mes, ano, salvas)
+        if preparada['mes_duplicadas'] else {}
+    )
+
+def duplicadas_atuais(preparada, snapshot, mes, ano):
+    """
+    Duplicadas da fatura preparada para o mês escolhido; conferidas de novo
+    só se os dados ou o mês mudaram desde a preparação.
+    """
+    if preparada['versao'] == snapshot.versao and preparada['mes_duplicadas'] == (ano, mes):
+        return preparada['duplicadas']
+    return marcar_duplicadas(preparada['transacoes'], snapshot.dados, mes, ano)
+
+def duplicadas_do_lote(lote, snapshot, meses):
+    """
+    Duplicadas de cada fatura do lote para o mês escolhido na revisão.
+
+    Args:
+        meses (list): (ano, mes) de cada fatura do lote, ou None se ainda não foi escolhido
+
+    Returns:
+        list: Duplicadas de cada fatura ({} para as que estão sem mês); as
+        que precisam ser conferidas de novo compartilham um único índice
+    """
+    salvas = None
+    todas = []
+    for preparada, mes_escolhido in zip(lote['faturas'], meses):
+        if mes_escolhido is None:
+            todas.append({})
+        elif lote['versao'] == snapshot.versao and preparada['mes_duplicadas'] == mes_escolhido:
+            todas.append(preparada['duplicadas'])
+        else:
+            if salvas is None:
+                salvas = indexar_salvas(snapshot.dados)
+            ano, mes = mes_escolhido
+            todas.append(marcar_duplicadas(preparada['transacoes'], snapshot.dados, mes, ano, salvas))
+    return todas
+
+def transacoes_para_salvar(preparada, mes, ano, duplicadas):
+    """
+    Transações da fatura preparada que devem ser gravadas no mês escolhido:
+    ficam de fora as que já estão salvas em outro mês (a fatura do próprio
+    mês é substituída ao salvar).
+    """
+    return [
+        dict(transacao) for i, transacao in enumerate(preparada['transacoes'])
+        if not any(chave != (ano, mes) for chave in duplicadas.get(i, []))
+    ]
+
+def preparar_fatura(conteudo, nome, arquivo_dados, classificar, mes=None, ano=None, tarefa=None):
+    """
+    Etapas do envio: ler o PDF, classificar, marcar duplicadas e preparar.
+
+    Roda como tarefa em segundo plano. A leitura e a classificação ficam
+    guardadas pelo hash do conteúdo; as duplicadas são sempre conferidas
+    com os dados atuais.
+
+    Args:
+        conteudo (bytes): Conteúdo do PDF
+        nome (str): Nome do arquivo enviado
+        arquivo_dados: Caminho do arquivo de dados do usuário
+        classificar (callable): Função que recebe a descrição e devolve a categoria
+        mes, ano (int): Mês escolhido para a fatura; sem ele, vale o deduzido do PDF
+        tarefa (Tarefa): Recebe o progresso e atende o cancelamento
+
+    Returns:
+        dict: hash, nome, paginas, transacoes (com categoria), linhas_com_erro,
+        referencia (ver ler_transacoes_pdf), duplicadas, o (ano, mes) e a
+        versao dos dados usados para conferi-las
+    """
+    def informar(progresso, mensagem):
+        if tarefa:
+            tarefa.informar(progresso, mensagem)
+
+    chave = (hash_conteudo(conteudo), assinatura_classificacao())
+    guardada = _guardada(chave)
+
+    if guardada is None:
+        informar(0.0, "lendo o PDF")
+        paginas = []
+
+        def ao_ler_pagina(lidas, total):
+            paginas.append(lidas)
+            informar(0.8 * lidas / total, f"lendo o PDF (página {lidas} de {total})")
+
+        transacoes, linhas_com_erro, referencia = ler_transacoes_pdf(io.BytesIO(conteudo), ao_ler_pagina)
+        if not transacoes:
+            raise _sem_transacoes(None)
+
+        informar(0.8, f"classificando {len(transacoes)} transações")
+        classificar_lote(transacoes, classificar, lambda feitas, total: informar(
+            0.8 + 0.15 * feitas / total, f"classificando {len(transacoes)} transações"
+        ))
+        guardada = _guardar(chave, {
+            'paginas': len(paginas),
+            'transacoes': transacoes,
+            'linhas_com_erro': linhas_com_erro,
+            'referencia': referencia
+        })
+
+    informar(0.95, "procurando transações já salvas")
+    preparada = dict(guardada, nome=nome, transacoes=copy.deepcopy(guardada['transacoes']))
+    preparada['versao'] = obter_versao_dados(arquivo_dados)
+    _conferir_na_preparacao(preparada, carregar_dados(arquivo_dados), mes, ano)
+    if tarefa:
+        tarefa.mensagem = f"{len(preparada['transacoes'])} transações prontas para salvar"
+    return preparada
+
+def _ler_em_paralelo(pendentes, informar):
+    """
+    Lê os PDFs pendentes, em processos separados quando são vários.
+
+    Args:
+        pendentes (dict): hash -> (nome, conteúdo)
+        informar (callable): Recebe (arquivos lidos, total) a cada leitura terminada
+
+    Returns:
+        dict: hash -> leitura (ver ler_fatura) ou a exceção da leitura
+    """
+    leituras = {}
+    if len(pendentes) < MINIMO_PARA_PROCESSOS:
+        for lidos, (hash_arquivo, (_, conteudo)) in enumerate(pendentes.items(), start=1):
+            try:
+                leituras[hash_arquivo] = ler_fatura(conteudo)
+            except Exception as e:
+                leituras[hash_arquivo] = e
+            informar(lidos, len(pendentes))
+        return leituras
+
+    # spawn: o processo do Streamlit tem threads, e copiá-lo com fork não é seguro
+    executor = ProcessPoolExecutor(
+        max_workers=min(MAXIMO_PROCESSOS, os.cpu_count() or 1, len(pendentes)),
+        mp_context=multiprocessing.get_context('spawn')
+    )
+    try:
+        futuros = {executor.submit(ler_fatura, conteudo): h for h, (_, conteudo) in pendentes.items()}
+        for lidos, futuro in enumerate(as_completed(futuros), start=1):
+            try:
+                leituras[futuros[futuro]] = futuro.result()
+            except Exception as e:
+                leituras[futuros[futuro]] = e
+            informar(lidos, len(pendentes))
+    finally:
+        # No cancelamento, as leituras ainda na fila são descartadas
+        executor.shutdown(wait=False, cancel_futures=True)
+    return leituras
+
+def preparar_lote(arquivos, arquivo_dados, classificar, tarefa=None):
+    """
+    Envio de várias faturas de uma vez: lê os PDFs em paralelo, deduz o mês
+    de cada uma pelo texto, classifica todas as transações numa só passada
+    e confere as duplicadas com os dados atuais.
+
+    Cada fatura fica guardada pelo hash, como em preparar_fatura: um arquivo
+    já enviado (sozinho ou em outro lote) não é lido de novo. Um arquivo
+    ilegível não impede o resto do lote; ele aparece em 'erros'.
+
+    Args:
+        arquivos (list): (nome, conteúdo) de cada PDF
+        arquivo_dados: Caminho do arquivo de dados do usuário
+        classificar (callable): Função que recebe a descrição e devolve a categoria
+        tarefa (Tarefa): Recebe o progresso e atende o cancelamento
+
+    Returns:
+        dict: faturas (uma preparada por arquivo, como em preparar_fatura),
+        erros [(nome, mensagem)], repetidos (nomes de arquivos com o mesmo
+        conteúdo de outro do lote) e a versao dos dados
+    """
+    def informar(progresso, mensagem):
+        if tarefa:
+            tarefa.informar(progresso, mensagem)
+
+    assinatura = assinatura_classificacao()
+    unicos = OrderedDict()
+    repetidos = []
+    for nome, conteudo in arquivos:
+        hash_arquivo = hash_conteudo(conteudo)
+        if hash_arquivo in unicos:
+            repetidos.append(nome)
+        else:
+            unicos[hash_arquivo] = (nome, conteudo)
+
+    guardadas = {h: _guardada((h, assinatura)) for h in unicos}
+    pendentes = OrderedDict((h, arquivo) for h, arquivo in unicos.items() if guardadas[h] is None)
+
+    erros = []
+    if pendentes:
+        informar(0.0, f"lendo {len(pendentes)} PDFs")
+        leituras = _ler_em_paralelo(pendentes, lambda lidos, total: informar(
+            0.7 * lidos / total, f"lendo os PDFs ({lidos} de {total})"
+        ))
+        novas = {}
+        for hash_arquivo, leitura in leituras.items():
+            nome = pendentes[hash_arquivo][0]
+            if isinstance(leitura, Exception):
+                erros.append((nome, f"Erro ao processar o PDF: {leitura}"))
+            elif not leitura['transacoes']:
+                erros.append((nome, str(_sem_transacoes(None))))
+            else:
+                novas[hash_arquivo] = leitura
+
+        todas = [t for leitura in novas.values() for t in leitura['transacoes']]
+        informar(0.7, f"classificando {len(todas)} transações")
+        classificar_lote(todas, classificar, lambda feitas, total: informar(
+            0.7 + 0.2 * feitas / total, f"classificando {len(todas)} transações"
+        ))
+        for hash_arquivo, leitura in novas.items():
+            guardadas[hash_arquivo] = _guardar((hash_arquivo, assinatura), leitura)
+
+    informar(0.9, "procurando transações já salvas")
+    versao = obter_versao_dados(arquivo_dados)
+    dados = carregar_dados(arquivo_dados)
+    salvas = indexar_salvas(dados)
+    faturas = []
+    for hash_arquivo, (nome, _) in unicos.items():
+        guardada = guardadas.get(hash_arquivo)
+        if guardada is None:
+            continue
+        preparada = dict(guardada, nome=nome, versao=versao,
+                         transacoes=copy.deepcopy(guardada['transacoes']))
+        _conferir_na_preparacao(preparada, dados, salvas=salvas)
+        faturas.append(preparada)
+
+    if tarefa:
+        total = sum(len(f['transacoes']) for f in faturas)
+        tarefa.mensagem = f"{len(faturas)} faturas ({total} transações) prontas para salvar"
+    return {'faturas': faturas, 'erros': erros, 'repetidos': repetidos, 'versao': versao}
@@ -0,0 +1,326 @@
+"""
+Exportação dos dados do usuário em CSV, XLSX e Parquet.
+
+Exporta as transações das faturas, as entradas, as parcelas e os gastos
+fixos de um intervalo de meses. As linhas são geradas uma a uma a partir
+dos dados e gravadas direto no arquivo, sem montar DataFrames: o CSV é
+escrito linha a linha, o XLSX usa o modo write-only do openpyxl e o
+Parquet é gravado em lotes com o ParquetWriter do pyarrow. Assim a
+memória usada na gravação não cresce com o número de linhas. Os valores,
+guardados em centavos, saem em reais.
+
+CSV e Parquet geram um arquivo por tabela, reunidos em um .zip; o XLSX
+tem uma planilha por tabela. No app, a exportação roda como tarefa em
+segundo plano (painel_exportacao, na barra lateral).
+
+Uso:
+    python exportacao.py --usuario anavarela --formato xlsx --saida dados.xlsx
+    python exportacao.py --arquivo data/anavarela/faturas.json --formato parquet \\
+        --inicio 2024-01 --fim 2025-12 --saida dados.zip
+"""
+import argparse
+import csv
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+import streamlit as st
+from dependencias import openpyxl, pyarrow
+from historico_faturas import (
+    carregar_dados, ordinal_mes, mes_do_ordinal, gerar_cronograma_parcelas, valor_da_parcela, para_reais
+)
+
+# Formato -> (rótulo, extensão, tipo MIME)
+FORMATOS = {
+    'xlsx': ("Excel (XLSX)", '.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ("CSV (zip)", '.zip', 'application/zip'),
+    'parquet': ("Parquet (zip)", '.zip', 'application/zip')
+}
+# Colunas de cada tabela e o tipo usado no Parquet
+TABELAS = {
+    'transacoes': [('id', 'str'), ('ano', 'int'), ('mes', 'int'), ('data_completa', 'str'), ('data', 'str'),
+                   ('descricao', 'str'), ('valor', 'float'), ('categoria', 'str')],
+    'entradas': [('ano', 'int'), ('mes', 'int'), ('descricao', 'str'), ('valor', 'float'), ('tipo', 'str')],
+    'parcelas': [('ano', 'int'), ('mes', 'int'), ('descricao', 'str'), ('parcela', 'int'),
+                 ('total_parcelas', 'int'), ('valor_parcela', 'float'), ('paga', 'bool')],
+    'gastos_fixos': [('descricao', 'str'), ('valor', 'float'), ('categoria', 'str'), ('data_adicao', 'str')]
+}
+# Linhas por lote gravado no Parquet
+LOTE_PARQUET = 10000
+# Linhas entre duas atualizações do progresso
+INTERVALO_PROGRESSO = 5000
+
+def _limites(inicio, fim):
+    """Intervalo de (ano, mes) convertido em ordinais de mês, inclusive nas duas pontas"""
+    return (ordinal_mes(*inicio) if inicio else 0,
+            ordinal_mes(*fim) if fim else float('inf'))
+
+def _linhas_transacoes(dados, inicio, fim):
+    primeiro, ultimo = _limites(inicio, fim)
+    for fatura in dados.get('faturas', []):
+        if not primeiro <= ordinal_mes(fatura['ano'], fatura['mes']) <= ultimo:
+            continue
+        for transacao in fatura.get('transacoes', []):
+            yield (transacao['id'], fatura['ano'], fatura['mes'], transacao.get('data_completa'), transacao.get('data'),
+                   transacao['descricao'], para_reais(transacao['valor']), transacao.get('categoria'))
+
+def _linhas_entradas(dados, inicio, fim):
+    primeiro, ultimo = _limites(inicio, fim)
+    for entrada in dados.get('entradas', []):
+        if primeiro <= ordinal_mes(entrada['ano'], entrada['mes']) <= ultimo:
+            yield (entrada['ano'], entrada['mes'], entrada['descricao'], para_reais(entrada['valor']),
+                   entrada.get('tipo', 'Outros'))
+
+def _linhas_parcelas(dados, inicio, fim):
+    primeiro, ultimo = _limites(inicio, fim)
+    for compra in dados.get('parcelas', []):
+        for ordinal, numero, paga in gerar_cronograma_parcelas(compra, primeiro):
+            if ordinal > ultimo:
+                break
+            ano, mes = mes_do_ordinal(ordinal)
+            yield (ano, mes, compra['descricao'], numero, compra['num_parcelas'],
+                   para_reais(valor_da_parcela(compra, numero)), paga)
+
+def _linhas_gastos_fixos(dados, inicio, fim):
+    # Gastos fixos valem para todos os meses: saem todos, independentemente do intervalo
+    for gasto in dados.get('gastos_fixos', []):
+        yield (gasto['descricao'], para_reais(gasto['valor']), gasto.get('categoria'), gasto.get('data_adicao'))
+
+GERADORES = {
+    'transacoes': _linhas_transacoes,
+    'entradas': _linhas_entradas,
+    'parcelas': _linhas_parcelas,
+    'gastos_fixos': _linhas_gastos_fixos
+}
+
+def contar_linhas(dados, inicio=None, fim=None):
+    """Quantidade de linhas de cada tabela no intervalo (usada para o progresso)"""
+    return {nome: sum(1 for _ in gerador(dados, inicio, fim)) for nome, gerador in GERADORES.items()}
+
+class _Progresso:
+    """Conta as linhas gravadas e avisa a cada INTERVALO_PROGRESSO"""
+
+    def __init__(self, total, informar):
+        self.total = max(total, 1)
+        self.gravadas = 0
+        self.informar = informar
+
+    def contar(self, linhas):
+        for linha in linhas:
+            self.gravadas += 1
+            if self.informar and self.gravadas % INTERVALO_PROGRESSO == 0:
+                self.informar(self.gravadas / self.total, f"{self.gravadas} de {self.total} linhas gravadas")
+            yield linha
+
+def _escrever_csv(destino, linhas_por_tabela):
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as pacote:
+        for nome, linhas in linhas_por_tabela:
+            with pacote.open(f"{nome}.csv", 'w') as bruto:
+                # utf-8-sig: o Excel reconhece os acentos ao abrir o CSV
+                texto = io.TextIOWrapper(bruto, encoding='utf-8-sig', newline='')
+                escritor = csv.writer(texto)
+                escritor.writerow([coluna for coluna, _ in TABELAS[nome]])
+                escritor.writerows(linhas)
+                texto.flush()
+                texto.detach()
+
+def _escrever_xlsx(destino, linhas_por_tabela):
+    # Modo write-only: cada linha vai para o arquivo temporário da planilha assim que é adicionada
+    livro = openpyxl().Workbook(write_only=True)
+    for nome, linhas in linhas_por_tabela:
+        planilha = livro.create_sheet(title=nome)
+        planilha.append([coluna for coluna, _ in TABELAS[nome]])
+        for linha in linhas:
+            planilha.append(linha)
+    livro.save(destino)
+
+def _escrever_parquet(destino, linhas_por_tabela):
+    pa = pyarrow()
+    tipos = {'int': pa.int32(), 'float': pa.float64(), 'str': pa.string(), 'bool': pa.bool_()}
+    pasta = tempfile.mkdtemp(prefix='exportacao-')
+    try:
+        with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED) as pacote:
+            for nome, linhas in linhas_por_tabela:
+                esquema = pa.schema([(coluna, tipos[tipo]) for coluna, tipo in TABELAS[nome]])
+                caminho = os.path.join(pasta, f"{nome}.parquet")
+                with pa.parquet.ParquetWriter(caminho, esquema, compression='zstd') as escritor:
+                    lote = []
+                    for linha in linhas:
+                        lote.append(linha)
+                        if len(lote) == LOTE_PARQUET:
+                            escritor.write_batch(_lote_arrow(pa, esquema, lote))
+                            lote = []
+                    if lote:
+                        escritor.write_batch(_lote_arrow(pa, esquema, lote))
+                # O Parquet já é comprimido: vai para o zip sem nova compressão
+                pacote.write(caminho, f"{nome}.parquet")
+                os.remove(caminho)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+def _lote_arrow(pa, esquema, lote):
+    colunas = list(zip(*lote))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)], schema=esquema
+    )
+
+ESCRITORES = {'csv': _escrever_csv, 'xlsx': _escrever_xlsx, 'parquet': _escrever_parquet}
+
+def exportar(dados, formato, destino, inicio=None, fim=None, informar=None):
+    """
+    Grava as tabelas exportadas no arquivo de destino.
+
+    Args:
+        dados (dict): Dados do usuário (como em carregar_dados)
+        formato (str): 'csv', 'xlsx' ou 'parquet'
+        destino: Caminho do arquivo a gravar
+        inicio (tuple): (ano, mes) inicial, inclusive; None para desde o começo
+        fim (tuple): (ano, mes) final, inclusive; None para até o fim
+        informar (callable): Recebe (progresso de 0 a 1, mensagem)
+
+    Returns:
+        dict: Linhas gravadas em cada tabela
+    """
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato desconhecido: {formato}")
+    contagens = contar_linhas(dados, inicio, fim)
+    progresso = _Progresso(sum(contagens.values()), informar)
+    linhas_por_tabela = (
+        (nome, progresso.contar(gerador(dados, inicio, fim))) for nome, gerador in GERADORES.items()
+    )
+    ESCRITORES[formato](destino, linhas_por_tabela)
+    return contagens
+
+def nome_arquivo(formato, inicio=None, fim=None):
+    """Nome sugerido para o arquivo exportado (ex: fatura_2024-01_2025-12.xlsx)"""
+    partes = ['fatura']
+    if inicio:
+        partes.append(f"{inicio[0]}-{inicio[1]:02d}")
+    if fim:
+        partes.append(f"{fim[0]}-{fim[1]:02d}")
+    if formato != 'xlsx':
+        partes.append(formato)
+    return '_'.join(partes) + FORMATOS[formato][1]
+
+# Pastas de exportações ainda em andamento, que a limpeza não pode apagar
+_em_andamento = set()
+_trava_em_andamento = threading.Lock()
+
+def _limpar_anteriores(base, pasta):
+    """Apaga as pastas das exportações iniciadas antes desta que já terminaram"""
+    with _trava_em_andamento:
+        for anterior in base.iterdir():
+            if anterior.name < pasta.name and anterior not in _em_andamento:
+                shutil.rmtree(anterior, ignore_errors=True)
+
+def exportar_arquivo(arquivo_dados, formato, inicio=None, fim=None, tarefa=None):
+    """
+    Exportação como tarefa em segundo plano. Cada exportação grava na sua
+    própria pasta temporária (exportações simultâneas não se atrapalham);
+    depois de gravado o arquivo, as pastas das exportações anteriores do
+    usuário são apagadas.
+
+    Returns:
+        dict: caminho, nome, mime e linhas (por tabela)
+    """
+    informar = tarefa.informar if tarefa else None
+    base = Path(tempfile.gettempdir()) / f"fatura-exportacao-{hashlib.md5(str(arquivo_dados).encode()).hexdigest()[:8]}"
+    base.mkdir(parents=True, exist_ok=True)
+    # O prefixo com o instante de início ordena as pastas para a limpeza
+    pasta = Path(tempfile.mkdtemp(prefix=f"{time.time_ns():020d}-", dir=base))
+    with _trava_em_andamento:
+        _em_andamento.add(pasta)
+
+    nome = nome_arquivo(formato, inicio, fim)
+    caminho = pasta / nome
+    try:
+        contagens = exportar(carregar_dados(arquivo_dados), formato, caminho, inicio, fim, informar)
+    except BaseException:
+        shutil.rmtree(pasta, ignore_errors=True)
+        raise
+    finally:
+        with _trava_em_andamento:
+            _em_andamento.discard(pasta)
+    _limpar_anteriores(base, pasta)
+    if tarefa:
+        tarefa.mensagem = f"{sum(contagens.values())} linhas exportadas"
+    return {'caminho': str(caminho), 'nome': nome, 'mime': FORMATOS[formato][2], 'linhas': contagens}
+
+def _ler_arquivo(caminho):
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+def painel_exportacao(usuario, arquivo_dados, meses_com_fatura):
+    """
+    Seção da barra lateral: escolha do formato e do período, geração em
+    segundo plano e botão de download do arquivo gerado.
+    """
+    from tarefas import iniciar_tarefa, obter_tarefa
+
+    with st.expander("📤 Exportar dados"):
+        formato = st.selectbox("Formato", list(FORMATOS), format_func=lambda f: FORMATOS[f][0],
+                               key="exportacao_formato")
+        inicio = fim = None
+        ordinais = sorted(ordinal_mes(ano, mes) for ano, mes in meses_com_fatura)
+        if len(ordinais) > 1:
+            primeiro, ultimo = st.select_slider(
+                "Período", options=ordinais, value=(ordinais[0], ordinais[-1]),
+                format_func=lambda o: "{1:02d}/{0}".format(*mes_do_ordinal(o)), key="exportacao_periodo"
+            )
+            inicio, fim = mes_do_ordinal(primeiro), mes_do_ordinal(ultimo)
+
+        if st.button("Gerar arquivo", key="exportacao_gerar", use_container_width=True):
+            tarefa = iniciar_tarefa(usuario, f"exportar_{formato}_{inicio}_{fim}", f"Exportação {FORMATOS[formato][0]}",
+                                    exportar_arquivo, arquivo_dados, formato, inicio, fim)
+            st.session_state['exportacao_tarefa'] = tarefa.id
+
+        # O arquivo gerado é lido só quando o usuário clica em baixar
+        tarefa = obter_tarefa(usuario, st.session_state.get('exportacao_tarefa'))
+        if tarefa and tarefa.estado == 'concluída' and os.path.exists(tarefa.resultado['caminho']):
+            resultado = tarefa.resultado
+            st.download_button(
+                f"⬇️ Baixar {resultado['nome']}", lambda: _ler_arquivo(resultado['caminho']),
+                file_name=resultado['nome'], mime=resultado['mime'], on_click='ignore',
+                key="exportacao_baixar", use_container_width=True
+            )
+
+def _mes_ano(texto):
+    """Converte "AAAA-MM" em (ano, mes)"""
+    ano, mes = texto.split('-')
+    if not 1 <= int(mes) <= 12:
+        raise argparse.ArgumentTypeError(f"mês inválido: {texto}")
+    return int(ano), int(mes)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument('--usuario', help='Usuário cujos dados exportar (data/<usuario>/faturas.json)')
+    origem.add_argument('--arquivo', help='Caminho do arquivo de dados')
+    parser.add_argument('--formato', choices=sorted(FORMATOS), default='xlsx')
+    parser.add_argument('--inicio', type=_mes_ano, help='Primeiro mês, AAAA-MM (padrão: desde o começo)')
+    parser.add_argument('--fim', type=_mes_ano, help='Último mês, AAAA-MM (padrão: até o fim)')
+    parser.add_argument('--saida', help='Arquivo a gravar (padrão: nome gerado no diretório atual)')
+    args = parser.parse_args()
+
+    arquivo_dados = Path(args.arquivo) if args.arquivo else Path('data') / args.usuario / 'faturas.json'
+    if not arquivo_dados.exists():
+        print(f"Arquivo de dados não encontrado: {arquivo_dados}", file=sys.stderr)
+        return 1
+    saida = args.saida or nome_arquivo(args.formato, args.inicio, args.fim)
+
+    def informar(progresso, mensagem):
+        print(f"{progresso:6.1%} {mensagem}", file=sys.stderr)
+
+    contagens = exportar(carregar_dados(arquivo_dados), args.formato, saida, args.inicio, args.fim, informar)
+    resumo = ', '.join(f"{quantidade} {tabela}" for tabela, quantidade in contagens.items())
+    print(f"{saida}: {resumo}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
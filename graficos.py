@@ -0,0 +1,41 @@
+import threading
+from collections import OrderedDict
+import streamlit as st
+
+# Quantidade máxima de figuras guardadas (as menos usadas saem primeiro)
+MAXIMO_FIGURAS = 32
+
+@st.cache_resource
+def _armazenamento_figuras():
+    """Cache de figuras compartilhado pelo processo, com uma trava para acesso concorrente"""
+    return OrderedDict(), threading.Lock()
+
+def obter_figura(chave, construir):
+    """
+    Retorna a figura Plotly guardada para a chave ou a constrói e guarda.
+
+    A chave deve incluir a versão dos dados (que já identifica o usuário pelo
+    caminho do arquivo), o tipo do gráfico e os parâmetros de exibição.
+    As figuras guardadas não devem ser alteradas por quem as recebe.
+
+    Args:
+        chave (tuple): Identificador da figura
+        construir (callable): Função sem argumentos que monta a figura
+
+    Returns:
+        go.Figure: Figura pronta para st.plotly_chart
+    """
+    figuras, trava = _armazenamento_figuras()
+    with trava:
+        if chave in figuras:
+            figuras.move_to_end(chave)
+            return figuras[chave]
+
+    figura = construir()
+
+    with trava:
+        figuras[chave] = figura
+        figuras.move_to_end(chave)
+        while len(figuras) > MAXIMO_FIGURAS:
+            figuras.popitem(last=False)
+    return figura
@@ -1,10 +1,34 @@
 import json
 import os
+import re
+import bisect
+import threading
+import hashlib
+import uuid
 import streamlit as st
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime, date
 import calendar
-import pandas as pd
+from perfil import contar
+from dependencias import pandas
+
+# Abreviações de mês usadas nas faturas do Nubank (ex: "02 MAI")
+MESES_ABREVIADOS = {
+    'JAN': 1, 'FEV': 2, 'MAR': 3, 'ABR': 4, 'MAI': 5, 'JUN': 6,
+    'JUL': 7, 'AGO': 8, 'SET': 9, 'OUT': 10, 'NOV': 11, 'DEZ': 12
+}
+# Versão do formato do arquivo de dados. Na versão 2 todos os valores
+# monetários são inteiros em centavos (ver _migrar_centavos); na versão 3
+# toda transação tem um 'id' estável (ver _migrar_ids)
+VERSAO_ESQUEMA = 3
+
+def para_centavos(reais):
+    """Converte um valor em reais (float, texto ou Decimal) em centavos inteiros"""
+    return int(round(float(reais) * 100))
+
+def para_reais(centavos):
+    """Converte centavos em reais, só para exibir (gráficos, tabelas, exportação)"""
+    return centavos / 100
 
 def get_user_data_file():
     """Retorna o caminho do arquivo de dados do usuário atual"""
@@ -13,11 +37,15 @@ def get_user_data_file():
     user_dir = Path(st.session_state['user_data_dir'])
     return user_dir / 'faturas.json'
 
-def carregar_dados():
-    """Carrega os dados do arquivo JSON do usuário"""
-    arquivo = get_user_data_file()
+@contar
+def carregar_dados(arquivo=None):
+    """
+    Carrega os dados do arquivo JSON do usuário.
+    Fora da thread do script (ex: tarefas em segundo plano) o caminho deve ser informado.
+    """
+    arquivo = Path(arquivo) if arquivo else get_user_data_file()
     if not arquivo.exists():
-        return {'faturas': [], 'gastos_fixos': [], 'entradas': [], 'parcelas': []}
+        return {'versao_esquema': VERSAO_ESQUEMA, 'faturas': [], 'gastos_fixos': [], 'entradas': [], 'parcelas': []}
     
     with open(arquivo) as f:
         dados = json.load(f)
@@ -25,90 +53,296 @@ def carregar_dados():
             dados['entradas'] = []
         if 'parcelas' not in dados:
             dados['parcelas'] = []
+        _migrar_parcelas(dados)
+        _migrar_centavos(dados)
+        _migrar_ids(dados)
         return dados
 
-def salvar_dados(dados):
-    """Salva os dados no arquivo JSON do usuário"""
-    arquivo = get_user_data_file()
+@contar
+def salvar_dados(dados, arquivo=None):
+    """
+    Salva os dados no arquivo JSON do usuário.
+    A gravação é feita em um arquivo temporário e trocada de uma vez, para que
+    uma leitura simultânea nunca encontre o arquivo pela metade.
+    """
+    arquivo = Path(arquivo) if arquivo else get_user_data_file()
     arquivo.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(arquivo, 'w') as f:
-        json.dump(dados, f, indent=4)
+    with trava_dados(arquivo):
+        temporario = arquivo.with_name(arquivo.name + '.tmp')
+        atribuir_ids(dados)
+        dados['versao_esquema'] = VERSAO_ESQUEMA
+        with open(temporario, 'w') as f:
+            json.dump(dados, f, indent=4)
+        os.replace(temporario, arquivo)
+
+_travas_dados = {}
+_travas_dados_criacao = threading.Lock()
+
+def trava_dados(arquivo=None):
+    """Retorna a trava (reentrante, por arquivo) que serializa as gravações dos dados"""
+    caminho = str(Path(arquivo) if arquivo else get_user_data_file())
+    with _travas_dados_criacao:
+        return _travas_dados.setdefault(caminho, threading.RLock())
+
+def atualizar_dados(funcao, arquivo=None):
+    """
+    Relê os dados, aplica a função e grava, tudo sob a trava do arquivo.
+
+    Usado para gravar o resultado de operações longas: o cálculo é feito
+    sobre uma cópia, sem travar o arquivo, e só a aplicação das alterações
+    sobre os dados atuais fica dentro da trava.
+
+    Args:
+        funcao (callable): Recebe os dados atuais e os altera no lugar
+        arquivo: Caminho do arquivo de dados (padrão: o do usuário da sessão)
+
+    Returns:
+        O valor devolvido pela função
+    """
+    with trava_dados(arquivo):
+        dados = carregar_dados(arquivo)
+        resultado = funcao(dados)
+        salvar_dados(dados, arquivo)
+    return resultado
+
+def obter_versao_dados(arquivo=None):
+    """
+    Retorna um identificador da versão atual dos dados do usuário.
+    Muda a cada gravação e serve como chave de cache.
+    """
+    arquivo = Path(arquivo) if arquivo else get_user_data_file()
+    try:
+        info = arquivo.stat()
+    except FileNotFoundError:
+        return (str(arquivo), 0, 0)
+    return (str(arquivo), info.st_mtime_ns, info.st_size)
+
+class SnapshotDados:
+    """
+    Dados do usuário lidos uma única vez por rerun e compartilhados entre as abas,
+    com acesso direto às faturas e entradas de cada mês.
+    """
+
+    def __init__(self):
+        self.recarregar()
+
+    def recarregar(self):
+        """Relê o arquivo de dados; deve ser chamado depois de uma gravação"""
+        self.versao = obter_versao_dados()
+        self.dados = carregar_dados()
+        self._faturas_por_mes = {}
+        for fatura in self.dados.get('faturas', []):
+            self._faturas_por_mes[(fatura['ano'], fatura['mes'])] = fatura
+        self._entradas_por_mes = {}
+        for entrada in self.dados.get('entradas', []):
+            self._entradas_por_mes.setdefault((entrada['ano'], entrada['mes']), []).append(entrada)
+        return self
+
+    def sincronizar(self):
+        """Recarrega apenas se o arquivo mudou desde a leitura (ex: rerun de um fragmento após gravar)"""
+        if obter_versao_dados() != self.versao:
+            self.recarregar()
+        return self
+
+    @property
+    def faturas(self):
+        return self.dados.get('faturas', [])
+
+    @property
+    def gastos_fixos(self):
+        return self.dados.get('gastos_fixos', [])
+
+    @property
+    def parcelas(self):
+        return self.dados.get('parcelas', [])
+
+    def fatura(self, mes, ano):
+        """Retorna a fatura de um mês específico ou None se não existir"""
+        return self._faturas_por_mes.get((ano, mes))
+
+    def tem_fatura(self, mes, ano):
+        """Indica se há fatura salva para o mês"""
+        return (ano, mes) in self._faturas_por_mes
+
+    def entradas(self, mes, ano):
+        """Retorna as entradas de um mês específico"""
+        return list(self._entradas_por_mes.get((ano, mes), []))
+
+    def disponibilidade(self):
+        """Retorna o índice de disponibilidade dos meses desta versão dos dados"""
+        return _disponibilidade_em_cache(self.versao, self.dados)
+
+    def localizar(self, id_transacao):
+        """Retorna (fatura, posição) da transação com este id, ou (None, None)"""
+        return localizar_transacao(self.dados, id_transacao, indice_por_id(self.dados, self.versao))
+
+def _construir_disponibilidade(dados):
+    """
+    Percorre os dados uma única vez e resume o que existe em cada mês.
+
+    Returns:
+        dict: 'meses_com_fatura' (frozenset de (ano, mes)), 'contagens'
+        ((ano, mes) -> transacoes, entradas e fixos do mês), 'gastos_fixos'
+        (total cadastrado) e 'anos' (anos com algum dado, em ordem)
+    """
+    fixos = {
+        (gasto['descricao'], gasto['valor'])
+        for gasto in dados.get('gastos_fixos', [])
+    }
+    contagens = {}
+
+    def contagem(ano, mes):
+        return contagens.setdefault((ano, mes), {'transacoes': 0, 'entradas': 0, 'fixos': 0})
+
+    meses_com_fatura = set()
+    for fatura in dados.get('faturas', []):
+        chave = (fatura['ano'], fatura['mes'])
+        meses_com_fatura.add(chave)
+        item = contagem(*chave)
+        for transacao in fatura.get('transacoes', []):
+            item['transacoes'] += 1
+            if (transacao['descricao'], transacao['valor']) in fixos:
+                item['fixos'] += 1
+
+    for entrada in dados.get('entradas', []):
+        contagem(entrada['ano'], entrada['mes'])['entradas'] += 1
+
+    return {
+        'meses_com_fatura': frozenset(meses_com_fatura),
+        'contagens': contagens,
+        'gastos_fixos': len(dados.get('gastos_fixos', [])),
+        'anos': sorted({ano for ano, _ in contagens})
+    }
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _disponibilidade_em_cache(versao, _dados):
+    """Guarda o índice de disponibilidade de uma versão específica dos dados"""
+    return _construir_disponibilidade(_dados)
+
+def ordinal_mes(ano, mes):
+    """Converte (ano, mês) em um número inteiro de meses"""
+    return ano * 12 + (mes - 1)
+
+def mes_do_ordinal(ordinal):
+    """Converte um número inteiro de meses de volta para (ano, mês)"""
+    ano, resto = divmod(ordinal, 12)
+    return ano, resto + 1
+
+def _migrar_parcelas(dados):
+    """
+    Converte compras parceladas no formato antigo (uma entrada por parcela)
+    para o formato compacto: mês inicial, quantidade, valor e máscara de pagas.
+    """
+    for compra in dados.get('parcelas', []):
+        if 'parcelas' not in compra:
+            continue
+        
+        data_inicio = datetime.strptime(compra['data_inicio'], '%Y-%m-%d')
+        pagas = 0
+        for parcela in compra['parcelas']:
+            if parcela.get('paga', False):
+                pagas |= 1 << (parcela['numero'] - 1)
+        
+        compra['mes_inicio'] = ordinal_mes(data_inicio.year, data_inicio.month)
+        compra['pagas'] = pagas
+        del compra['parcelas']
+
+def _migrar_centavos(dados):
+    """
+    Converte os valores em reais (float) do formato antigo para centavos
+    inteiros: transações, entradas, gastos fixos e compras parceladas.
+    A conversão vale para a leitura; o arquivo passa para o formato novo
+    na próxima gravação.
+    """
+    if dados.get('versao_esquema', 1) >= 2:
+        return
+    for fatura in dados.get('faturas', []):
+        for transacao in fatura.get('transacoes', []):
+            transacao['valor'] = para_centavos(transacao['valor'])
+    for item in dados.get('entradas', []) + dados.get('gastos_fixos', []):
+        item['valor'] = para_centavos(item['valor'])
+    for compra in dados.get('parcelas', []):
+        compra['valor_total'] = para_centavos(compra['valor_total'])
+        compra['valor_parcela'] = para_centavos(compra['valor_parcela'])
+    dados['versao_esquema'] = 2
+
+def gerar_cronograma_parcelas(compra, a_partir_de=0):
+    """
+    Gera sob demanda o cronograma de uma compra parcelada.
+    Produz tuplas (ordinal do mês, número da parcela, paga) a partir do
+    ordinal de mês informado.
+    """
+    inicio = compra['mes_inicio']
+    pagas = compra.get('pagas', 0)
+    for i in range(max(0, a_partir_de - inicio), compra['num_parcelas']):
+        yield inicio + i, i + 1, bool(pagas >> i & 1)
+
+def valor_da_parcela(compra, numero):
+    """
+    Valor em centavos da parcela de número informado (a partir de 1). A
+    primeira parcela fica com os centavos que sobram da divisão, para que a
+    soma das parcelas seja exatamente o valor_total.
+    """
+    if numero == 1:
+        return compra['valor_total'] - compra['valor_parcela'] * (compra['num_parcelas'] - 1)
+    return compra['valor_parcela']
 
 def adicionar_parcela(descricao, valor_total, num_parcelas, data_inicio):
-    """Adiciona uma nova compra parcelada"""
-    dados = carregar_dados()
-    if 'parcelas' not in dados:
-        dados['parcelas'] = []
-    
+    """Adiciona uma nova compra parcelada (valor_total em centavos)"""
     # Converter data_inicio para objetos datetime
     if isinstance(data_inicio, str):
         data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d')
     
-    valor_parcela = valor_total / num_parcelas
-    parcelas = []
-    
-    for i in range(num_parcelas):
-        data_parcela = data_inicio + timedelta(days=30 * i)
-        parcelas.append({
-            'numero': i + 1,
-            'valor': valor_parcela,
-            'data': data_parcela.strftime('%Y-%m-%d'),
-            'paga': False
-        })
-    
     compra_parcelada = {
         'descricao': descricao,
         'valor_total': valor_total,
         'num_parcelas': num_parcelas,
-        'valor_parcela': valor_parcela,
+        # Centavos que sobram da divisão ficam na primeira parcela (ver valor_da_parcela)
+        'valor_parcela': valor_total // num_parcelas,
         'data_inicio': data_inicio.strftime('%Y-%m-%d'),
-        'parcelas': parcelas
+        'mes_inicio': ordinal_mes(data_inicio.year, data_inicio.month),
+        'pagas': 0
     }
     
-    dados['parcelas'].append(compra_parcelada)
-    salvar_dados(dados)
+    atualizar_dados(lambda dados: dados.setdefault('parcelas', []).append(compra_parcelada))
 
 def remover_parcela(descricao, valor_total, data_inicio):
     """Remove uma compra parcelada"""
-    dados = carregar_dados()
-    dados['parcelas'] = [p for p in dados['parcelas'] 
-                        if not (p['descricao'] == descricao and 
-                               abs(float(p['valor_total']) - valor_total) < 0.01 and
-                               p['data_inicio'] == data_inicio)]
-    salvar_dados(dados)
+    def remover(dados):
+        dados['parcelas'] = [p for p in dados['parcelas'] 
+                            if not (p['descricao'] == descricao and 
+                                   p['valor_total'] == valor_total and
+                                   p['data_inicio'] == data_inicio)]
+
+    atualizar_dados(remover)
 
 def marcar_parcela_paga(descricao, numero_parcela):
     """Marca uma parcela específica como paga"""
-    dados = carregar_dados()
-    for compra in dados['parcelas']:
-        if compra['descricao'] == descricao:
-            for parcela in compra['parcelas']:
-                if parcela['numero'] == numero_parcela:
-                    parcela['paga'] = True
-                    break
-    salvar_dados(dados)
+    def marcar(dados):
+        for compra in dados['parcelas']:
+            if compra['descricao'] == descricao and 1 <= numero_parcela <= compra['num_parcelas']:
+                compra['pagas'] = compra.get('pagas', 0) | (1 << (numero_parcela - 1))
+
+    atualizar_dados(marcar)
 
 def obter_parcelas_mes(mes, ano):
     """Retorna todas as parcelas de um mês específico"""
     dados = carregar_dados()
     parcelas_mes = []
-    
-    data_alvo = datetime(ano, mes, 1)
-    primeiro_dia = data_alvo.replace(day=1)
-    ultimo_dia = data_alvo.replace(day=calendar.monthrange(ano, mes)[1])
+    alvo = ordinal_mes(ano, mes)
     
     for compra in dados.get('parcelas', []):
-        for parcela in compra['parcelas']:
-            data_parcela = datetime.strptime(parcela['data'], '%Y-%m-%d')
-            if primeiro_dia <= data_parcela <= ultimo_dia:
-                parcelas_mes.append({
-                    'descricao': compra['descricao'],
-                    'valor_parcela': parcela['valor'],
-                    'numero': parcela['numero'],
-                    'total_parcelas': compra['num_parcelas'],
-                    'paga': parcela.get('paga', False)
-                })
+        # A parcela do mês é determinada diretamente pelo deslocamento em meses
+        i = alvo - compra['mes_inicio']
+        if 0 <= i < compra['num_parcelas']:
+            parcelas_mes.append({
+                'descricao': compra['descricao'],
+                'valor_parcela': valor_da_parcela(compra, i + 1),
+                'numero': i + 1,
+                'total_parcelas': compra['num_parcelas'],
+                'paga': bool(compra.get('pagas', 0) >> i & 1)
+            })
     
     return parcelas_mes
 
@@ -121,13 +355,19 @@ def calcular_total_parcelas_futuras(mes_atual=None, ano_atual=None):
     
     dados = carregar_dados()
     total = 0
-    data_referencia = datetime(ano_atual, mes_atual, 1)
+    referencia = ordinal_mes(ano_atual, mes_atual)
     
     for compra in dados.get('parcelas', []):
-        for parcela in compra['parcelas']:
-            data_parcela = datetime.strptime(parcela['data'], '%Y-%m-%d')
-            if data_parcela >= data_referencia and not parcela.get('paga', False):
-                total += parcela['valor']
+        primeira = max(0, referencia - compra['mes_inicio'])
+        restantes = compra['num_parcelas'] - primeira
+        if restantes <= 0:
+            continue
+        # Parcelas restantes menos as já pagas (bits a partir da primeira futura)
+        pagas = (compra.get('pagas', 0) >> primeira).bit_count()
+        total += (restantes - pagas) * compra['valor_parcela']
+        # A primeira parcela, se ainda em aberto, leva os centavos da divisão
+        if primeira == 0 and not compra.get('pagas', 0) & 1:
+            total += valor_da_parcela(compra, 1) - compra['valor_parcela']
     
     return total
 
@@ -140,33 +380,111 @@ def obter_parcelas_futuras(mes_atual=None, ano_atual=None):
     
     dados = carregar_dados()
     parcelas_futuras = {}
-    data_referencia = datetime(ano_atual, mes_atual, 1)
+    referencia = ordinal_mes(ano_atual, mes_atual)
     
     for compra in dados.get('parcelas', []):
-        for parcela in compra['parcelas']:
-            data_parcela = datetime.strptime(parcela['data'], '%Y-%m-%d')
-            if data_parcela >= data_referencia and not parcela.get('paga', False):
-                mes_ano = data_parcela.strftime('%Y-%m')
-                if mes_ano not in parcelas_futuras:
-                    parcelas_futuras[mes_ano] = []
-                
-                parcelas_futuras[mes_ano].append({
-                    'descricao': compra['descricao'],
-                    'valor': parcela['valor'],
-                    'numero': parcela['numero'],
-                    'total_parcelas': compra['num_parcelas']
-                })
+        for ordinal, numero, paga in gerar_cronograma_parcelas(compra, referencia):
+            if paga:
+                continue
+            ano, mes = mes_do_ordinal(ordinal)
+            mes_ano = f"{ano}-{mes:02d}"
+            if mes_ano not in parcelas_futuras:
+                parcelas_futuras[mes_ano] = []
+            
+            parcelas_futuras[mes_ano].append({
+                'descricao': compra['descricao'],
+                'valor': valor_da_parcela(compra, numero),
+                'numero': numero,
+                'total_parcelas': compra['num_parcelas']
+            })
     
     return parcelas_futuras
 
+def novo_id_transacao():
+    """Gera o id de uma transação nova"""
+    return uuid.uuid4().hex[:12]
+
+def atribuir_ids(dados):
+    """Dá um id novo às transações que ainda não têm (ex: recém-lidas de um PDF)"""
+    for fatura in dados.get('faturas', []):
+        for transacao in fatura.get('transacoes', []):
+            if 'id' not in transacao:
+                transacao['id'] = novo_id_transacao()
+
+def _migrar_ids(dados):
+    """
+    Dá um id às transações do formato antigo. O id é derivado do mês, da
+    posição e do conteúdo, para que leituras repetidas do arquivo ainda não
+    regravado devolvam os mesmos ids; a partir da próxima gravação ele fica
+    salvo e não muda mais, mesmo que a transação mude de posição.
+    """
+    if dados.get('versao_esquema', 1) >= 3:
+        return
+    for fatura in dados.get('faturas', []):
+        for i, transacao in enumerate(fatura.get('transacoes', [])):
+            if 'id' not in transacao:
+                origem = f"{fatura['ano']}-{fatura['mes']}-{i}-{transacao['descricao']}-{transacao['valor']}"
+                transacao['id'] = hashlib.md5(origem.encode()).hexdigest()[:12]
+    dados['versao_esquema'] = 3
+
+def _construir_indice_ids(dados):
+    """Mapeia o id de cada transação para (posição da fatura, posição na fatura)"""
+    indice = {}
+    for i, fatura in enumerate(dados.get('faturas', [])):
+        for j, transacao in enumerate(fatura.get('transacoes', [])):
+            indice[transacao['id']] = (i, j)
+    return indice
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _indice_ids_em_cache(versao, _dados):
+    """Guarda o índice de ids de uma versão específica dos dados"""
+    return _construir_indice_ids(_dados)
+
+def indice_por_id(dados, versao=None):
+    """
+    Retorna o índice id -> (posição da fatura, posição na fatura).
+    Com a versão dos dados, o índice é montado uma vez por versão e reaproveitado.
+    """
+    if versao is None:
+        return _construir_indice_ids(dados)
+    return _indice_ids_em_cache(versao, dados)
+
+def localizar_transacao(dados, id_transacao, indice=None):
+    """
+    Encontra uma transação pelo id.
+
+    A posição do índice é conferida antes de ser usada: se os dados foram
+    alterados em memória depois de o índice ser montado, a transação é
+    procurada diretamente.
+
+    Args:
+        dados (dict): Dados do usuário
+        id_transacao (str): Id da transação
+        indice (dict): Índice de indice_por_id() (padrão: montado na hora)
+
+    Returns:
+        tuple: (fatura, posição da transação), ou (None, None) se não existir
+    """
+    faturas = dados.get('faturas', [])
+    if indice is None:
+        indice = _construir_indice_ids(dados)
+    i, j = indice.get(id_transacao, (None, None))
+    if i is not None and i < len(faturas):
+        transacoes = faturas[i].get('transacoes', [])
+        if j < len(transacoes) and transacoes[j].get('id') == id_transacao:
+            return faturas[i], j
+    for fatura in faturas:
+        for j, transacao in enumerate(fatura.get('transacoes', [])):
+            if transacao.get('id') == id_transacao:
+                return fatura, j
+    return None, None
+
 def adicionar_fatura(df=None, mes=None, ano=None, fatura=None):
     """
     Adiciona uma nova fatura ao histórico.
     Pode receber um DataFrame com as transações + mês e ano,
     ou um dicionário de fatura já formatado.
     """
-    dados = carregar_dados()
-    
     if fatura is not None:
         # Se recebeu uma fatura já formatada
         nova_fatura = fatura
@@ -181,7 +499,7 @@ def adicionar_fatura(df=None, mes=None, ano=None, fatura=None):
             transacao = {
                 'data': row['data'],
                 'descricao': row['descricao'],
-                'valor': float(row['valor']),
+                'valor': int(row['valor']),
                 'categoria': classificar_transacao(row['descricao'])
             }
             transacoes.append(transacao)
@@ -193,18 +511,21 @@ def adicionar_fatura(df=None, mes=None, ano=None, fatura=None):
             'transacoes': transacoes
         }
     
-    # Verificar se já existe uma fatura para este mês/ano
-    for i, f in enumerate(dados['faturas']):
-        if f['mes'] == nova_fatura['mes'] and f['ano'] == nova_fatura['ano']:
-            # Atualizar fatura existente
-            dados['faturas'][i] = nova_fatura
-            salvar_dados(dados)
-            return dados
+    resolver_datas_fatura(nova_fatura)
     
-    # Adicionar nova fatura
-    dados['faturas'].append(nova_fatura)
-    salvar_dados(dados)
-    return dados
+    def adicionar(dados):
+        # Verificar se já existe uma fatura para este mês/ano
+        for i, f in enumerate(dados['faturas']):
+            if f['mes'] == nova_fatura['mes'] and f['ano'] == nova_fatura['ano']:
+                # Atualizar fatura existente
+                dados['faturas'][i] = nova_fatura
+                return dados
+        
+        # Adicionar nova fatura
+        dados['faturas'].append(nova_fatura)
+        return dados
+    
+    return atualizar_dados(adicionar)
 
 def obter_fatura_anterior(mes_atual):
     """Obtém a fatura do mês anterior"""
@@ -234,32 +555,29 @@ def limpar_historico():
 
 def limpar_fatura(mes):
     """Remove uma fatura específica do histórico"""
-    dados = carregar_dados()
-    dados['faturas'] = [f for f in dados['faturas'] if f['mes'] != mes]
-    salvar_dados(dados)
+    def remover(dados):
+        dados['faturas'] = [f for f in dados['faturas'] if f['mes'] != mes]
+
+    atualizar_dados(remover)
 
 def adicionar_gasto_fixo(gasto):
     """Adiciona um novo gasto fixo"""
-    dados = carregar_dados()
-    if 'gastos_fixos' not in dados:
-        dados['gastos_fixos'] = []
-    dados['gastos_fixos'].append(gasto)
-    salvar_dados(dados)
+    atualizar_dados(lambda dados: dados.setdefault('gastos_fixos', []).append(gasto))
 
 def remover_gasto_fixo(descricao, valor):
     """Remove um gasto fixo"""
-    dados = carregar_dados()
-    dados['gastos_fixos'] = [g for g in dados['gastos_fixos'] 
-                            if not (g['descricao'] == descricao and abs(float(g['valor']) - valor) < 0.01)]
-    salvar_dados(dados)
+    def remover(dados):
+        dados['gastos_fixos'] = [g for g in dados['gastos_fixos'] 
+                                if not (g['descricao'] == descricao and g['valor'] == valor)]
+
+    atualizar_dados(remover)
 
 def obter_gastos_fixos():
     """Retorna a lista de gastos fixos"""
     return carregar_dados().get('gastos_fixos', []) 
 
 def adicionar_entrada(mes, ano, valor, descricao, tipo):
-    """Adiciona uma nova entrada ao mês"""
-    dados = carregar_dados()
+    """Adiciona uma nova entrada ao mês (valor em centavos)"""
     entrada = {
         'mes': mes,
         'ano': ano,
@@ -267,25 +585,147 @@ def adicionar_entrada(mes, ano, valor, descricao, tipo):
         'descricao': descricao,
         'tipo': tipo
     }
-    dados['entradas'].append(entrada)
-    salvar_dados(dados)
+    atualizar_dados(lambda dados: dados['entradas'].append(entrada))
 
 def remover_entrada(mes, ano, valor, descricao, tipo):
     """Remove uma entrada específica"""
-    dados = carregar_dados()
-    dados['entradas'] = [e for e in dados['entradas'] 
-                        if not (e['mes'] == mes and 
-                               e['ano'] == ano and 
-                               abs(float(e['valor']) - valor) < 0.01 and
-                               e['descricao'] == descricao and
-                               e.get('tipo', 'Outros') == tipo)]
-    salvar_dados(dados)
+    def remover(dados):
+        dados['entradas'] = [e for e in dados['entradas'] 
+                            if not (e['mes'] == mes and 
+                                   e['ano'] == ano and 
+                                   e['valor'] == valor and
+                                   e['descricao'] == descricao and
+                                   e.get('tipo', 'Outros') == tipo)]
+
+    atualizar_dados(remover)
 
 def obter_entradas(mes, ano):
     """Retorna todas as entradas de um mês específico"""
-    dados = carregar_dados()
-    return [e for e in dados['entradas'] 
-            if e['mes'] == mes and e['ano'] == ano] 
+    indice = obter_indice_transacoes()
+    return list(indice['entradas_por_mes'].get((ano, mes), []))
+
+def obter_fatura(mes, ano):
+    """Retorna a fatura de um mês específico ou None se não existir"""
+    indice = obter_indice_transacoes()
+    return indice['faturas_por_mes'].get((ano, mes))
+
+def resolver_data_transacao(data, mes_fatura, ano_fatura):
+    """
+    Converte a data da transação ("02 MAI", sem ano) em uma data completa.
+    Meses posteriores ao da fatura pertencem ao ano anterior (ex: compra de
+    dezembro na fatura de janeiro).
+    
+    Returns:
+        str: Data no formato YYYY-MM-DD
+    """
+    try:
+        dia, abreviacao = data.split()
+        mes = MESES_ABREVIADOS[abreviacao.upper()]
+        dia = int(dia)
+    except (AttributeError, ValueError, KeyError):
+        # Data ilegível: usar o primeiro dia do mês da fatura
+        return date(ano_fatura, mes_fatura, 1).isoformat()
+    
+    ano = ano_fatura - 1 if mes > mes_fatura else ano_fatura
+    dia = min(max(dia, 1), calendar.monthrange(ano, mes)[1])
+    return date(ano, mes, dia).isoformat()
+
+def resolver_datas_fatura(fatura):
+    """Preenche a data completa de todas as transações da fatura que ainda não a têm"""
+    for transacao in fatura.get('transacoes', []):
+        if 'data_completa' not in transacao:
+            transacao['data_completa'] = resolver_data_transacao(
+                transacao.get('data'), fatura['mes'], fatura['ano']
+            )
+
+def normalizar_estabelecimento(descricao):
+    """
+    Reduz a descrição da transação ao nome do estabelecimento, para agrupar
+    cobranças do mesmo lugar (ex: "OpenAI *ChatGPT Subscr" -> "openai chatgpt subscr").
+    """
+    nome = descricao.lower()
+    # Remover indicação de parcela ("- parcela 2/3", "2 de 3")
+    nome = re.sub(r'(?:parcela\s+)?\d{1,2}(?:\s*/\s*|\s+de\s+)\d{1,2}', ' ', nome)
+    # Manter apenas letras (inclusive acentuadas) e espaços
+    nome = re.sub(r'[^a-zà-ÿ ]+', ' ', nome)
+    return ' '.join(nome.split())
+
+def _construir_indice_transacoes(dados):
+    """
+    Monta o índice de transações ordenado por data, além de acessos diretos
+    às faturas e entradas de cada mês.
+    """
+    registros = []
+    faturas_por_mes = {}
+    for fatura in dados.get('faturas', []):
+        faturas_por_mes[(fatura['ano'], fatura['mes'])] = fatura
+        for transacao in fatura.get('transacoes', []):
+            data_completa = transacao.get('data_completa') or resolver_data_transacao(
+                transacao.get('data'), fatura['mes'], fatura['ano']
+            )
+            registro = dict(transacao)
+            registro['data_completa'] = data_completa
+            registro['mes_fatura'] = fatura['mes']
+            registro['ano_fatura'] = fatura['ano']
+            registros.append((date.fromisoformat(data_completa).toordinal(), registro))
+    
+    # Ordenação estável: transações do mesmo dia mantêm a ordem da fatura
+    registros.sort(key=lambda item: item[0])
+    
+    entradas_por_mes = {}
+    for entrada in dados.get('entradas', []):
+        entradas_por_mes.setdefault((entrada['ano'], entrada['mes']), []).append(entrada)
+    
+    return {
+        'datas': [ordinal for ordinal, _ in registros],
+        'transacoes': [registro for _, registro in registros],
+        'faturas_por_mes': faturas_por_mes,
+        'entradas_por_mes': entradas_por_mes
+    }
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _indice_em_cache(versao):
+    """Guarda o índice de transações de uma versão específica dos dados"""
+    return _construir_indice_transacoes(carregar_dados())
+
+def obter_indice_transacoes():
+    """Retorna o índice de transações, reconstruindo apenas quando os dados mudam"""
+    return _indice_em_cache(obter_versao_dados())
+
+def _para_data(valor):
+    """Aceita date, datetime ou texto YYYY-MM-DD e retorna um date"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(valor)
+
+def consultar(inicio, fim, categoria=None, texto=None):
+    """
+    Retorna as transações entre inicio e fim (inclusive), em ordem de data.
+    
+    Args:
+        inicio, fim: date, datetime ou texto YYYY-MM-DD
+        categoria (str|None): Filtra pela categoria exata
+        texto (str|None): Filtra pelas descrições que contêm o texto (sem diferenciar maiúsculas)
+        
+    Returns:
+        list: Cópias das transações com data_completa, mes_fatura e ano_fatura
+    """
+    indice = obter_indice_transacoes()
+    esquerda = bisect.bisect_left(indice['datas'], _para_data(inicio).toordinal())
+    direita = bisect.bisect_right(indice['datas'], _para_data(fim).toordinal())
+    
+    texto = texto.lower() if texto else None
+    resultado = []
+    for registro in indice['transacoes'][esquerda:direita]:
+        if categoria is not None and registro.get('categoria') != categoria:
+            continue
+        if texto and texto not in registro['descricao'].lower():
+            continue
+        resultado.append(dict(registro))
+    
+    return resultado
 
 def obter_historico_gastos_mensais():
     """Retorna o histórico de gastos mensais"""
@@ -301,7 +741,7 @@ def obter_historico_gastos_mensais():
         total_gastos = sum(t['valor'] for t in fatura['transacoes'])
         
         # Calcular gastos por categoria
-        df = pd.DataFrame(fatura['transacoes'])
+        df = pandas().DataFrame(fatura['transacoes'])
         if not df.empty:
             df['categoria'] = df['descricao'].apply(classificar_transacao)
             gastos_categoria = df.groupby('categoria')['valor'].sum().to_dict()
@@ -338,21 +778,32 @@ def obter_historico_categorias():
         ano = fatura['ano']
         chave = f"{ano}-{mes:02d}"
         
-        df = pd.DataFrame(fatura['transacoes'])
+        df = pandas().DataFrame(fatura['transacoes'])
         if not df.empty:
-            df['categoria'] = df['descricao'].apply(classificar_transacao)
+            # Usar a categoria já salva e classificar apenas o que não tiver
+            df['categoria'] = [
+                t.get('categoria') or classificar_transacao(t['descricao'])
+                for t in fatura['transacoes']
+            ]
             historico[chave] = df.groupby('categoria')['valor'].sum().to_dict()
         else:
             historico[chave] = {}
     
     return historico
 
-def obter_media_gastos_categoria():
-    """Calcula a média de gastos por categoria"""
+def obter_media_gastos_categoria(ultimos_meses=None):
+    """
+    Calcula a média de gastos por categoria.
+    Se ultimos_meses for informado, considera apenas os meses mais recentes (média móvel).
+    """
     historico = obter_historico_categorias()
     if not historico:
         return {}
     
+    if ultimos_meses:
+        chaves_recentes = sorted(historico.keys())[-ultimos_meses:]
+        historico = {chave: historico[chave] for chave in chaves_recentes}
+    
     # Inicializar dicionário para somar gastos
     soma_categorias = {}
     contagem_categorias = {}
@@ -405,6 +856,7 @@ def aplicar_regras_classificacao(descricao):
     
     return None
 
+@contar
 def classificar_transacao(descricao):
     """
     Classifica automaticamente uma transação com base em sua descrição.
@@ -0,0 +1,324 @@
+"""
+Importação do formato antigo (dados_historico.json) para os dados do usuário.
+
+No formato antigo, 'faturas' é um dicionário por "AAAA-MM" com totais já
+calculados (total_gasto e gastos_por_categoria) e transações com chaves
+em maiúsculas (Data, Descrição, Valor, Categoria); 'entradas' também é
+um dicionário por mês (salario_fixo, renda_extra, total).
+
+O arquivo é lido em fluxo: o objeto principal e os dicionários por mês
+são percorridos chave a chave com JSONDecoder.raw_decode, e só um mês
+fica decodificado na memória de cada vez. A conversão para centavos,
+a soma dos valores e a conferência com os totais do arquivo acontecem na
+mesma passada. Os totais do arquivo servem de referência: o total do mês
+deve bater com a soma das transações; diferenças por categoria são
+relatadas (no formato antigo as categorias podiam ser editadas sem
+recalcular os totais). A gravação é uma só, no fim, com atualizar_dados().
+
+Uso:
+    python importador_legado.py dados_historico.json --usuario anavarela
+    python importador_legado.py dados_historico.json --usuario anavarela --simular
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from historico_faturas import carregar_dados, atualizar_dados, resolver_datas_fatura, para_centavos, para_reais
+
+# Caracteres lidos do arquivo a cada vez (cresce se um valor não couber)
+TAMANHO_BLOCO = 64 * 1024
+# Diferença tolerada, em centavos, entre o total do arquivo e a soma das transações
+TOLERANCIA = 1
+# Transações que o app registra como entradas, não como gastos (ver adicionar_faturas)
+TERMOS_ENTRADA = ['estorno', 'desconto']
+
+class ErroImportacao(Exception):
+    """Arquivo fora do formato esperado, ou totais que não batem no modo estrito"""
+
+class _LeitorJson:
+    """Percorre um objeto JSON chave a chave, sem carregar o arquivo inteiro"""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.decodificador = json.JSONDecoder()
+        self.texto = ''
+        self.posicao = 0
+        self.fim_arquivo = False
+        self.bloco = TAMANHO_BLOCO
+        self.valores_lidos = 0
+
+    def _ler_mais(self):
+        parte = self.arquivo.read(self.bloco)
+        if not parte:
+            self.fim_arquivo = True
+            return False
+        # Descarta o que já foi consumido antes de juntar o novo bloco
+        self.texto = self.texto[self.posicao:] + parte
+        self.posicao = 0
+        return True
+
+    def _pular_espacos(self):
+        while True:
+            while self.posicao < len(self.texto) and self.texto[self.posicao] in ' \t\r\n':
+                self.posicao += 1
+            if self.posicao < len(self.texto) or not self._ler_mais():
+                return
+
+    def _proximo_caractere(self):
+        self._pular_espacos()
+        if self.posicao >= len(self.texto):
+            raise ErroImportacao("Fim inesperado do arquivo")
+        return self.texto[self.posicao]
+
+    def _esperar(self, caractere):
+        if self._proximo_caractere() != caractere:
+            raise ErroImportacao(f"Esperado '{caractere}' na posição {self.posicao} do bloco atual")
+        self.posicao += 1
+
+    def valor(self):
+        """Decodifica o próximo valor JSON completo"""
+        self._pular_espacos()
+        while True:
+            try:
+                valor, fim = self.decodificador.raw_decode(self.texto, self.posicao)
+            except json.JSONDecodeError:
+                # Valor incompleto no bloco: ler mais (com blocos maiores) e tentar de novo
+                self.bloco *= 2
+                if not self._ler_mais():
+                    raise ErroImportacao("Arquivo JSON incompleto ou inválido")
+                continue
+            # Um número no fim do bloco pode continuar no próximo
+            if fim == len(self.texto) and not self.fim_arquivo:
+                self._ler_mais()
+                continue
+            self.posicao = fim
+            self.valores_lidos += 1
+            return valor
+
+    def pares(self):
+        """Percorre as chaves do próximo objeto, devolvendo (chave, leitor posicionado no valor)"""
+        self._esperar('{')
+        if self._proximo_caractere() == '}':
+            self.posicao += 1
+            return
+        while True:
+            chave = self.valor()
+            self._esperar(':')
+            lidos = self.valores_lidos
+            yield chave, self
+            # Se quem recebeu o par não leu o valor, ele é lido e descartado aqui
+            if self.valores_lidos == lidos:
+                self.valor()
+            separador = self._proximo_caractere()
+            self.posicao += 1
+            if separador == '}':
+                return
+            if separador != ',':
+                raise ErroImportacao(f"Esperado ',' ou '}}' após a chave {chave!r}")
+
+def _mes_ano(chave):
+    """Converte a chave "AAAA-MM" em (ano, mes)"""
+    try:
+        ano, mes = (int(parte) for parte in chave.split('-'))
+    except ValueError:
+        raise ErroImportacao(f"Chave de mês inválida: {chave!r}")
+    if not 1 <= mes <= 12:
+        raise ErroImportacao(f"Chave de mês inválida: {chave!r}")
+    return ano, mes
+
+def converter_fatura(chave, antiga):
+    """
+    Converte a fatura de um mês e confere os totais do arquivo com as transações.
+
+    Returns:
+        tuple: (fatura no formato atual, entradas vindas de estornos/descontos,
+        conferência com total, soma e divergências por categoria)
+    """
+    ano, mes = _mes_ano(chave)
+    transacoes = []
+    entradas = []
+    soma = 0
+    por_categoria = {}
+    for antiga_transacao in antiga.get('transacoes', []):
+        valor = para_centavos(antiga_transacao['Valor'])
+        categoria = antiga_transacao.get('Categoria') or 'Outros'
+        descricao = antiga_transacao['Descrição']
+        soma += valor
+        por_categoria[categoria] = por_categoria.get(categoria, 0) + valor
+        if any(termo in descricao.lower() for termo in TERMOS_ENTRADA):
+            entradas.append({'descricao': descricao, 'valor': valor, 'mes': mes, 'ano': ano})
+        else:
+            transacoes.append({
+                'data': antiga_transacao.get('Data'),
+                'descricao': descricao,
+                'valor': valor,
+                'categoria': categoria
+            })
+
+    fatura = {'mes': mes, 'ano': ano, 'transacoes': transacoes}
+    resolver_datas_fatura(fatura)
+
+    total_arquivo = antiga.get('total_gasto')
+    categorias_arquivo = antiga.get('gastos_por_categoria') or {}
+    divergencias = {}
+    for categoria in sorted(set(categorias_arquivo) | set(por_categoria)):
+        esperado = para_centavos(categorias_arquivo.get(categoria, 0))
+        encontrado = por_categoria.get(categoria, 0)
+        if abs(esperado - encontrado) > TOLERANCIA:
+            divergencias[categoria] = (esperado, encontrado)
+    conferencia = {
+        'mes': chave,
+        'transacoes': len(antiga.get('transacoes', [])),
+        'total_arquivo': None if total_arquivo is None else para_centavos(total_arquivo),
+        'soma_transacoes': soma,
+        'total_confere': total_arquivo is None or abs(para_centavos(total_arquivo) - soma) <= TOLERANCIA,
+        'categorias_divergentes': divergencias
+    }
+    return fatura, entradas, conferencia
+
+def converter_entradas(chave, antiga):
+    """Converte as entradas de um mês (salário fixo e renda extra) no formato atual"""
+    ano, mes = _mes_ano(chave)
+    entradas = []
+    if antiga.get('salario_fixo'):
+        entradas.append({'mes': mes, 'ano': ano, 'valor': para_centavos(antiga['salario_fixo']),
+                         'descricao': 'Salário fixo', 'tipo': 'Salário'})
+    if antiga.get('renda_extra'):
+        entradas.append({'mes': mes, 'ano': ano, 'valor': para_centavos(antiga['renda_extra']),
+                         'descricao': 'Renda extra', 'tipo': 'Freelance'})
+    return entradas
+
+def ler_legado(caminho, ao_converter_mes=None):
+    """
+    Lê e converte o arquivo antigo em uma passada.
+
+    Args:
+        caminho: Caminho do dados_historico.json
+        ao_converter_mes (callable): Chamada com a conferência de cada fatura convertida
+
+    Returns:
+        dict: faturas, entradas e gastos_fixos no formato atual, e as conferências
+    """
+    convertido = {'faturas': [], 'entradas': [], 'gastos_fixos': [], 'conferencias': []}
+    with open(caminho, encoding='utf-8') as arquivo:
+        leitor = _LeitorJson(arquivo)
+        for secao, _ in leitor.pares():
+            if secao == 'faturas':
+                for chave, _ in leitor.pares():
+                    fatura, entradas, conferencia = converter_fatura(chave, leitor.valor())
+                    convertido['faturas'].append(fatura)
+                    convertido['entradas'].extend(entradas)
+                    convertido['conferencias'].append(conferencia)
+                    if ao_converter_mes:
+                        ao_converter_mes(conferencia)
+            elif secao == 'entradas':
+                for chave, _ in leitor.pares():
+                    convertido['entradas'].extend(converter_entradas(chave, leitor.valor()))
+            elif secao == 'gastos_fixos':
+                convertido['gastos_fixos'] = [
+                    dict(gasto, valor=para_centavos(gasto['valor'])) for gasto in leitor.valor()
+                ]
+    return convertido
+
+def importar_legado(caminho, arquivo_dados, substituir=False, estrito=False, simular=False):
+    """
+    Importa o arquivo antigo para os dados do usuário, com uma única gravação.
+
+    Args:
+        caminho: Caminho do dados_historico.json
+        arquivo_dados: Caminho do arquivo de dados do usuário
+        substituir (bool): Substitui faturas e entradas de meses que já existem
+            (por padrão esses meses são mantidos e ficam de fora da importação)
+        estrito (bool): Não grava nada se o total de algum mês não bater
+        simular (bool): Converte e confere, sem gravar
+
+    Returns:
+        dict: conferencias, meses importados e ignorados, entradas e gastos fixos adicionados
+    """
+    convertido = ler_legado(caminho)
+    relatorio = {
+        'conferencias': convertido['conferencias'],
+        'meses_importados': [],
+        'meses_ignorados': [],
+        'entradas_adicionadas': 0,
+        'gastos_fixos_adicionados': 0
+    }
+    sem_conferir = [c['mes'] for c in convertido['conferencias'] if not c['total_confere']]
+    if estrito and sem_conferir:
+        raise ErroImportacao(f"Total diferente da soma das transações em: {', '.join(sem_conferir)}")
+
+    def aplicar(dados):
+        existentes = {(f['ano'], f['mes']): i for i, f in enumerate(dados['faturas'])}
+        importados = set()
+        for fatura in convertido['faturas']:
+            chave = (fatura['ano'], fatura['mes'])
+            rotulo = f"{chave[0]}-{chave[1]:02d}"
+            if chave in existentes and not substituir:
+                relatorio['meses_ignorados'].append(rotulo)
+                continue
+            if chave in existentes:
+                dados['faturas'][existentes[chave]] = fatura
+            else:
+                dados['faturas'].append(fatura)
+            importados.add(chave)
+            relatorio['meses_importados'].append(rotulo)
+
+        # Entradas: as dos meses importados; nos demais, só se o mês ainda não tiver entradas
+        com_entradas = {(e['ano'], e['mes']) for e in dados['entradas']}
+        if substituir:
+            substituidos = importados | {(e['ano'], e['mes']) for e in convertido['entradas']}
+            dados['entradas'] = [e for e in dados['entradas'] if (e['ano'], e['mes']) not in substituidos]
+            com_entradas -= substituidos
+        for entrada in convertido['entradas']:
+            if (entrada['ano'], entrada['mes']) not in com_entradas:
+                dados['entradas'].append(entrada)
+                relatorio['entradas_adicionadas'] += 1
+
+        gastos = dados.setdefault('gastos_fixos', [])
+        ja_cadastrados = {(g['descricao'], g['valor']) for g in gastos}
+        for gasto in convertido['gastos_fixos']:
+            if (gasto['descricao'], gasto['valor']) not in ja_cadastrados:
+                gastos.append(gasto)
+                relatorio['gastos_fixos_adicionados'] += 1
+
+    if simular:
+        aplicar(carregar_dados(arquivo_dados))
+    else:
+        atualizar_dados(aplicar, arquivo_dados)
+    return relatorio
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('origem', nargs='?', default='dados_historico.json', help='Arquivo no formato antigo')
+    destino = parser.add_mutually_exclusive_group(required=True)
+    destino.add_argument('--usuario', help='Usuário que recebe os dados (data/<usuario>/faturas.json)')
+    destino.add_argument('--arquivo', help='Caminho do arquivo de dados de destino')
+    parser.add_argument('--substituir', action='store_true', help='Substitui os meses que já existem')
+    parser.add_argument('--estrito', action='store_true', help='Não importa se algum total não bater')
+    parser.add_argument('--simular', action='store_true', help='Converte e confere, sem gravar')
+    args = parser.parse_args()
+
+    arquivo_dados = Path(args.arquivo) if args.arquivo else Path('data') / args.usuario / 'faturas.json'
+    try:
+        relatorio = importar_legado(args.origem, arquivo_dados, args.substituir, args.estrito, args.simular)
+    except (ErroImportacao, OSError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+
+    for conferencia in relatorio['conferencias']:
+        situacao = "ok" if conferencia['total_confere'] else "TOTAL DIFERENTE"
+        total_arquivo = conferencia['total_arquivo']
+        total_arquivo = '-' if total_arquivo is None else f"{para_reais(total_arquivo):.2f}"
+        print(f"{conferencia['mes']}: {conferencia['transacoes']} transações, total do arquivo "
+              f"{total_arquivo}, soma {para_reais(conferencia['soma_transacoes']):.2f} ({situacao})")
+        for categoria, (esperado, encontrado) in conferencia['categorias_divergentes'].items():
+            print(f"    {categoria}: arquivo {para_reais(esperado):.2f}, transações {para_reais(encontrado):.2f}")
+    acao = "seriam importados" if args.simular else "importados"
+    print(f"Meses {acao}: {', '.join(relatorio['meses_importados']) or 'nenhum'}")
+    if relatorio['meses_ignorados']:
+        print(f"Meses já existentes, mantidos: {', '.join(relatorio['meses_ignorados'])} (use --substituir)")
+    print(f"Entradas: {relatorio['entradas_adicionadas']}; gastos fixos: {relatorio['gastos_fixos_adicionados']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
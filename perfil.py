@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import streamlit as st
+
+# Ativa o perfil em todos os reruns (também é possível ativar com ?perfil=1 na URL)
+VARIAVEL_AMBIENTE = 'FATURA_PROFILE'
+# Arquivo JSON-lines onde as seções de cada rerun são gravadas
+ARQUIVO_PADRAO = 'perfil.jsonl'
+
+_estado = threading.local()
+
+def _rerun_atual():
+    """Retorna o registro do rerun em andamento nesta thread, ou None se o perfil estiver desligado"""
+    return getattr(_estado, 'rerun', None)
+
+def perfil_ativo():
+    """Indica se o perfil foi pedido por variável de ambiente ou parâmetro na URL"""
+    if os.environ.get(VARIAVEL_AMBIENTE, '') not in ('', '0'):
+        return True
+    try:
+        return st.query_params.get('perfil', '0') not in ('', '0')
+    except Exception:
+        return False
+
+def iniciar_rerun(fragmento=None):
+    """
+    Começa a medir um rerun; sem o perfil ativo não faz nada.
+
+    Args:
+        fragmento (str): Nome do fragmento, quando só ele é executado
+    """
+    if not perfil_ativo():
+        _estado.rerun = None
+        return
+    _estado.rerun = {
+        'inicio': datetime.now().isoformat(timespec='milliseconds'),
+        'fragmento': fragmento,
+        't0': time.perf_counter(),
+        'pilha': [],
+        'secoes': [],
+        'contadores': {}
+    }
+
+@contextmanager
+def secao(nome):
+    """Mede o tempo de um trecho do app; seções dentro de seções ficam com o caminho completo"""
+    rerun = _rerun_atual()
+    if rerun is None:
+        yield
+        return
+
+    rerun['pilha'].append(nome)
+    caminho = ' / '.join(rerun['pilha'])
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        fim = time.perf_counter()
+        rerun['secoes'].append({
+            'secao': caminho,
+            'nivel': len(rerun['pilha']) - 1,
+            'inicio_ms': round((inicio - rerun['t0']) * 1000, 2),
+            'duracao_ms': round((fim - inicio) * 1000, 2)
+        })
+        rerun['pilha'].pop()
+
+def contar(funcao):
+    """Decorador que conta as chamadas da função no rerun em andamento"""
+    @wraps(funcao)
+    def contada(*args, **kwargs):
+        rerun = _rerun_atual()
+        if rerun is not None:
+            contadores = rerun['contadores']
+            contadores[funcao.__name__] = contadores.get(funcao.__name__, 0) + 1
+        return funcao(*args, **kwargs)
+    return contada
+
+def _gravar(rerun, total_ms):
+    """Acrescenta as seções e o resumo do rerun ao arquivo JSON-lines"""
+    arquivo = os.environ.get(f'{VARIAVEL_AMBIENTE}_ARQUIVO', ARQUIVO_PADRAO)
+    usuario = st.session_state.get('username')
+    with open(arquivo, 'a', encoding='utf-8') as f:
+        for registro in rerun['secoes']:
+            f.write(json.dumps({'tipo': 'secao', 'rerun': rerun['inicio'], 'usuario': usuario, **registro}, ensure_ascii=False) + '\n')
+        f.write(json.dumps({
+            'tipo': 'rerun',
+            'rerun': rerun['inicio'],
+            'usuario': usuario,
+            'fragmento': rerun['fragmento'],
+            'duracao_ms': total_ms,
+            'contadores': rerun['contadores']
+        }, ensure_ascii=False) + '\n')
+
+def finalizar_rerun():
+    """
+    Encerra a medição, grava o arquivo e mostra o painel na barra lateral.
+    Deve rodar num finally: reruns interrompidos por st.rerun() também são gravados.
+    """
+    rerun = _rerun_atual()
+    if rerun is None:
+        return
+    _estado.rerun = None
+
+    total_ms = round((time.perf_counter() - rerun['t0']) * 1000, 2)
+    try:
+        _gravar(rerun, total_ms)
+    except OSError as e:
+        if rerun['fragmento'] is None:
+            st.sidebar.warning(f"Não foi possível gravar o perfil: {e}")
+    # Um fragmento não pode escrever na barra lateral; o rerun dele fica só no arquivo
+    if rerun['fragmento'] is not None:
+        return
+
+    with st.sidebar.expander(f"⏱️ Perfil do rerun ({total_ms:.0f} ms)"):
+        linhas = [
+            {
+                'Seção': '· ' * s['nivel'] + s['secao'].split(' / ')[-1],
+                'ms': s['duracao_ms'],
+                '%': round(s['duracao_ms'] / total_ms * 100, 1) if total_ms else 0.0
+            }
+            for s in sorted(rerun['secoes'], key=lambda s: s['inicio_ms'])
+        ]
+        st.dataframe(linhas, hide_index=True, use_container_width=True)
+        if rerun['contadores']:
+            st.write("**Chamadas neste rerun**")
+            for nome, quantidade in sorted(rerun['contadores'].items()):
+                st.write(f"• `{nome}`: {quantidade}")
+
+def medir_fragmento(funcao):
+    """
+    Decorador para as funções de fragmento (abaixo do @st.fragment). Dentro
+    de um rerun completo não faz nada; quando o fragmento roda sozinho, mede
+    esse rerun parcial e o grava com o nome do fragmento.
+    """
+    @wraps(funcao)
+    def medida(*args, **kwargs):
+        if _rerun_atual() is not None:
+            return funcao(*args, **kwargs)
+        iniciar_rerun(fragmento=funcao.__name__)
+        try:
+            with secao(f"Fragmento {funcao.__name__}"):
+                return funcao(*args, **kwargs)
+        finally:
+            finalizar_rerun()
+    return medida
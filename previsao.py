@@ -0,0 +1,152 @@
+import numpy as np
+import streamlit as st
+from historico_faturas import ordinal_mes, mes_do_ordinal, valor_da_parcela
+
+def _projetar_parcelas(compras, inicio, horizonte):
+    """
+    Soma, mês a mês, as parcelas ainda não pagas dentro do horizonte.
+    Expande todos os cronogramas de uma vez em vetores de ordinais de mês.
+    """
+    if not compras:
+        return np.zeros(horizonte, dtype=np.int64)
+
+    meses_inicio = np.array([c['mes_inicio'] for c in compras], dtype=np.int64)
+    quantidades = np.array([c['num_parcelas'] for c in compras], dtype=np.int64)
+    valores = np.array([c['valor_parcela'] for c in compras], dtype=np.int64)
+    # A primeira parcela leva os centavos que sobram da divisão
+    primeiras = np.array([valor_da_parcela(c, 1) for c in compras], dtype=np.int64)
+    # Máscaras como objetos Python para suportar compras com mais de 63 parcelas
+    pagas = np.array([c.get('pagas', 0) for c in compras], dtype=object)
+
+    # Deslocamento de cada parcela dentro da sua compra: 0, 1, ..., n-1
+    total = int(quantidades.sum())
+    primeiros = np.repeat(np.cumsum(quantidades) - quantidades, quantidades)
+    deslocamentos = np.arange(total) - primeiros
+
+    ordinais = np.repeat(meses_inicio, quantidades) + deslocamentos
+    pagas_parcela = (np.repeat(pagas, quantidades) >> deslocamentos) & 1
+    em_aberto = ~pagas_parcela.astype(bool)
+
+    indices = ordinais - inicio
+    dentro = em_aberto & (indices >= 0) & (indices < horizonte)
+    # Soma em centavos inteiros (bincount com pesos somaria em float)
+    totais = np.zeros(horizonte, dtype=np.int64)
+    valores_parcela = np.where(deslocamentos == 0, np.repeat(primeiras, quantidades), np.repeat(valores, quantidades))
+    np.add.at(totais, indices[dentro], valores_parcela[dentro])
+    return totais
+
+def _compras_detectadas(compras_parceladas):
+    """
+    Converte as compras parceladas encontradas nas descrições das faturas
+    (ver obter_compras_parceladas no app) para o formato de _projetar_parcelas.
+    Como na aba de parcelas, a parcela n cai n-1 meses depois do mês da
+    primeira parcela encontrada, e as já vistas em alguma fatura estão pagas.
+    """
+    return [{
+        'mes_inicio': ordinal_mes(compra['primeira_parcela']['ano'], compra['primeira_parcela']['mes']),
+        'num_parcelas': compra['total_parcelas'],
+        'valor_total': compra['valor_parcela'] * compra['total_parcelas'],
+        'valor_parcela': compra['valor_parcela'],
+        'pagas': sum(1 << (numero - 1) for numero in compra['parcelas_vistas'])
+    } for compra in compras_parceladas.values()]
+
+def _media_entradas(entradas, janela):
+    """Calcula a média mensal de entradas nos últimos meses com registros"""
+    totais = {}
+    for entrada in entradas:
+        chave = ordinal_mes(entrada['ano'], entrada['mes'])
+        totais[chave] = totais.get(chave, 0) + entrada['valor']
+    if not totais:
+        return 0.0
+
+    recentes = [totais[chave] for chave in sorted(totais)[-janela:]]
+    return float(np.mean(recentes))
+
+def _medias_categoria(faturas, janela, classificar, parcelas_ids):
+    """
+    Média mensal de gastos de cada categoria nas últimas faturas. Como em
+    obter_media_gastos_categoria, cada categoria é dividida só pelos meses
+    em que aparece. As parcelas (parcelas_ids) ficam de fora: elas já
+    entram pelo cronograma e seriam contadas duas vezes.
+    """
+    recentes = sorted(faturas, key=lambda fatura: (fatura['ano'], fatura['mes']))[-janela:]
+    somas = {}
+    meses = {}
+    for fatura in recentes:
+        do_mes = {}
+        for transacao in fatura.get('transacoes', []):
+            if transacao.get('id') in parcelas_ids:
+                continue
+            categoria = transacao.get('categoria') or classificar(transacao['descricao'])
+            do_mes[categoria] = do_mes.get(categoria, 0) + transacao['valor']
+        for categoria, valor in do_mes.items():
+            somas[categoria] = somas.get(categoria, 0) + valor
+            meses[categoria] = meses.get(categoria, 0) + 1
+    return {categoria: somas[categoria] / meses[categoria] for categoria in somas}
+
+def projetar_fluxo_caixa(dados, compras_parceladas, classificar, mes, ano, horizonte=12, janela=6):
+    """
+    Projeta os gastos comprometidos e esperados para os próximos meses.
+
+    Combina gastos fixos, o cronograma das parcelas, a média móvel de gastos
+    por categoria e a média de entradas. Todos os componentes são vetores
+    com um valor por mês, a partir de (mes, ano), em centavos.
+
+    Args:
+        dados (dict): Dados do usuário já carregados (ex: SnapshotDados.dados)
+        compras_parceladas (dict): Compras parceladas encontradas nas descrições,
+            como na aba de parcelas (com os ids das transações de cada uma)
+        classificar (callable): Classificador do app, para transações sem categoria
+
+    Returns:
+        dict: ordinais e rótulos dos meses, componentes por mês, total e saldo
+    """
+    inicio = ordinal_mes(ano, mes)
+    meses = np.arange(inicio, inicio + horizonte)
+
+    fixos_categoria = {}
+    for gasto in dados.get('gastos_fixos', []):
+        categoria = gasto.get('categoria', 'Roupas')
+        fixos_categoria[categoria] = fixos_categoria.get(categoria, 0) + gasto['valor']
+    fixos = np.full(horizonte, sum(fixos_categoria.values()), dtype=np.int64)
+
+    parcelas = _projetar_parcelas(_compras_detectadas(compras_parceladas), inicio, horizonte)
+
+    # Gastos variáveis: média recente de cada categoria, descontando o que já é fixo
+    parcelas_ids = set().union(*(compra['ids'] for compra in compras_parceladas.values()))
+    medias = _medias_categoria(dados.get('faturas', []), janela, classificar, parcelas_ids)
+    por_categoria = {
+        categoria: np.full(horizonte, max(media - fixos_categoria.get(categoria, 0), 0.0))
+        for categoria, media in medias.items()
+    }
+    variavel = sum(por_categoria.values(), np.zeros(horizonte))
+
+    entradas = np.full(horizonte, _media_entradas(dados.get('entradas', []), janela))
+
+    total = fixos + parcelas + variavel
+    rotulos = []
+    for ordinal in meses:
+        ano_mes, num_mes = mes_do_ordinal(int(ordinal))
+        rotulos.append(f"{num_mes:02d}/{ano_mes}")
+
+    return {
+        'meses': meses,
+        'rotulos': rotulos,
+        'fixos': fixos,
+        'parcelas': parcelas,
+        'variavel': variavel,
+        'por_categoria': por_categoria,
+        'entradas': entradas,
+        'total': total,
+        'saldo': entradas - total
+    }
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _previsao_em_cache(versao, _dados, _compras_parceladas, _classificar, mes, ano, horizonte, janela):
+    """Guarda a projeção calculada para uma versão específica dos dados"""
+    return projetar_fluxo_caixa(_dados, _compras_parceladas, _classificar, mes, ano, horizonte, janela)
+
+def obter_previsao_fluxo(snapshot, compras_parceladas, classificar, mes, ano, horizonte=12, janela=6):
+    """Retorna a projeção de fluxo de caixa dos dados do rerun, recalculando apenas quando eles mudam"""
+    return _previsao_em_cache(snapshot.versao, snapshot.dados, compras_parceladas, classificar,
+                              mes, ano, horizonte, janela)
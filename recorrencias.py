@@ -0,0 +1,263 @@
+import json
+import os
+import zlib
+import numpy as np
+import streamlit as st
+from historico_faturas import (
+    carregar_dados, atualizar_dados, get_user_data_file, obter_versao_dados, trava_dados,
+    normalizar_estabelecimento, ordinal_mes, mes_do_ordinal
+)
+
+# Largura relativa de cada faixa de valor (cobranças dentro de ~15% caem na mesma faixa)
+LARGURA_FAIXA = 0.15
+# Mínimo de meses com a cobrança para sugerir como gasto fixo
+MINIMO_MESES = 3
+# Pontuação mínima de periodicidade (0 a 1) para sugerir
+PONTUACAO_MINIMA = 0.6
+# Média máxima de cobranças por mês (acima disso é um estabelecimento frequente, não uma assinatura)
+MAXIMO_COBRANCAS_MES = 1.5
+
+def get_arquivo_recorrencias():
+    """Retorna o caminho do arquivo com o estado do detector de recorrências"""
+    return get_user_data_file().parent / 'recorrencias.json'
+
+def _carregar_estado():
+    """Carrega o estado acumulado do detector"""
+    arquivo = get_arquivo_recorrencias()
+    if not arquivo.exists():
+        return {'faturas': {}, 'grupos': {}}
+    with open(arquivo, encoding='utf-8') as f:
+        return json.load(f)
+
+def _salvar_estado(estado):
+    """
+    Salva o estado acumulado do detector. Como em salvar_dados, grava em um
+    arquivo temporário e troca de uma vez, sob a trava do arquivo.
+    """
+    arquivo = get_arquivo_recorrencias()
+    arquivo.parent.mkdir(parents=True, exist_ok=True)
+    with trava_dados(arquivo):
+        temporario = arquivo.with_name(arquivo.name + '.tmp')
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(estado, f, ensure_ascii=False)
+        os.replace(temporario, arquivo)
+
+def _assinatura_fatura(fatura):
+    """
+    Resumo barato da fatura, usado para saber se ela mudou desde o último
+    processamento. Inclui as categorias, para que uma recategorização
+    também refaça os grupos do mês.
+    """
+    transacoes = fatura.get('transacoes', [])
+    categorias = '|'.join(t.get('categoria', '') for t in transacoes)
+    return [len(transacoes), sum(t['valor'] for t in transacoes), zlib.crc32(categorias.encode())]
+
+def _remover_mes(estado, chave_mes):
+    """Retira de todos os grupos a contribuição de um mês"""
+    for chave in list(estado['grupos']):
+        grupo = estado['grupos'][chave]
+        grupo['meses'].pop(chave_mes, None)
+        if not grupo['meses']:
+            del estado['grupos'][chave]
+
+def _adicionar_fatura(estado, fatura):
+    """
+    Agrupa as transações da fatura por estabelecimento e faixa de valor
+    e soma o resultado ao estado.
+    """
+    transacoes = [t for t in fatura.get('transacoes', []) if t['valor'] > 0]
+    if not transacoes:
+        return
+
+    chave_mes = str(ordinal_mes(fatura['ano'], fatura['mes']))
+    estabelecimentos = np.array([normalizar_estabelecimento(t['descricao']) for t in transacoes])
+    valores = np.array([t['valor'] for t in transacoes], dtype=np.int64)
+    # Faixas calculadas em reais, para as chaves dos grupos não dependerem da unidade guardada
+    faixas = np.floor(np.log(valores / 100) / np.log1p(LARGURA_FAIXA)).astype(np.int64)
+
+    # Agrupar por (estabelecimento, faixa) de uma vez
+    chaves = np.char.add(np.char.add(estabelecimentos, '|'), faixas.astype(str))
+    unicas, primeiros, codigos = np.unique(chaves, return_index=True, return_inverse=True)
+    contagens = np.bincount(codigos)
+    # Somas exatas em centavos (bincount com pesos somaria em float)
+    somas = np.zeros(len(unicas), dtype=np.int64)
+    np.add.at(somas, codigos, valores)
+
+    for i, chave in enumerate(unicas):
+        chave = str(chave)
+        if not estabelecimentos[primeiros[i]]:
+            continue
+        exemplo = transacoes[primeiros[i]]
+        grupo = estado['grupos'].setdefault(chave, {
+            'estabelecimento': str(estabelecimentos[primeiros[i]]),
+            'meses': {}
+        })
+        # Descrição e categoria acompanham o mês mais recente do grupo
+        if all(int(chave_mes) >= int(outro) for outro in grupo['meses']):
+            grupo['descricao'] = exemplo['descricao']
+            grupo['categoria'] = exemplo.get('categoria', 'Roupas')
+        grupo['meses'][chave_mes] = [int(contagens[i]), int(somas[i])]
+
+def _atualizar_estado(estado, dados):
+    """
+    Refaz no estado apenas os meses novos, alterados ou removidos desde o
+    último processamento.
+
+    Returns:
+        bool: Se o estado mudou
+    """
+    atuais = {}
+    for fatura in dados.get('faturas', []):
+        atuais[str(ordinal_mes(fatura['ano'], fatura['mes']))] = fatura
+
+    alterado = False
+    for chave_mes in list(estado['faturas']):
+        if chave_mes not in atuais:
+            _remover_mes(estado, chave_mes)
+            del estado['faturas'][chave_mes]
+            alterado = True
+
+    for chave_mes, fatura in atuais.items():
+        assinatura = _assinatura_fatura(fatura)
+        if estado['faturas'].get(chave_mes) == assinatura:
+            continue
+        _remover_mes(estado, chave_mes)
+        _adicionar_fatura(estado, fatura)
+        estado['faturas'][chave_mes] = assinatura
+        alterado = True
+    return alterado
+
+def sincronizar_recorrencias(dados=None):
+    """
+    Atualiza o estado gravado do detector processando apenas as faturas
+    novas ou alteradas desde a última execução. A leitura, a atualização e
+    a gravação ficam sob a trava do arquivo de estado.
+
+    Returns:
+        dict: Estado atualizado
+    """
+    if dados is None:
+        dados = carregar_dados()
+    with trava_dados(get_arquivo_recorrencias()):
+        estado = _carregar_estado()
+        if _atualizar_estado(estado, dados):
+            _salvar_estado(estado)
+    return estado
+
+def pontuar_grupos(estado):
+    """
+    Calcula a pontuação de periodicidade de todos os grupos de uma vez.
+
+    A pontuação combina a cobertura (meses com cobrança no intervalo em que o
+    grupo aparece), a regularidade (intervalos de exatamente um mês) e a
+    estabilidade do valor mensal.
+
+    Returns:
+        list: Um dicionário por grupo com chave, meses, valor médio (em centavos) e pontuação
+    """
+    chaves = list(estado['grupos'])
+    if not chaves:
+        return []
+
+    grupo_ids, meses, contagens, somas = [], [], [], []
+    for i, chave in enumerate(chaves):
+        for chave_mes, (contagem, soma) in estado['grupos'][chave]['meses'].items():
+            grupo_ids.append(i)
+            meses.append(int(chave_mes))
+            contagens.append(contagem)
+            somas.append(soma)
+
+    grupo_ids = np.array(grupo_ids)
+    meses = np.array(meses)
+    contagens = np.array(contagens, dtype=float)
+    somas = np.array(somas)
+    ordem = np.lexsort((meses, grupo_ids))
+    grupo_ids, meses, contagens, somas = grupo_ids[ordem], meses[ordem], contagens[ordem], somas[ordem]
+
+    num_grupos = len(chaves)
+    num_meses = np.bincount(grupo_ids, minlength=num_grupos)
+    primeiro = np.full(num_grupos, np.iinfo(np.int64).max)
+    ultimo = np.full(num_grupos, np.iinfo(np.int64).min)
+    np.minimum.at(primeiro, grupo_ids, meses)
+    np.maximum.at(ultimo, grupo_ids, meses)
+    cobertura = num_meses / (ultimo - primeiro + 1)
+
+    # Intervalos entre meses consecutivos do mesmo grupo
+    mesmo_grupo = grupo_ids[1:] == grupo_ids[:-1]
+    mensais = np.bincount(grupo_ids[1:][mesmo_grupo & (np.diff(meses) == 1)], minlength=num_grupos)
+    regularidade = np.divide(mensais, num_meses - 1, out=np.zeros(num_grupos), where=num_meses > 1)
+
+    # Estabilidade: coeficiente de variação do valor mensal
+    soma_total = np.bincount(grupo_ids, weights=somas, minlength=num_grupos)
+    media = soma_total / num_meses
+    quadrados = np.bincount(grupo_ids, weights=somas ** 2, minlength=num_grupos)
+    desvio = np.sqrt(np.maximum(quadrados / num_meses - media ** 2, 0))
+    variacao = np.minimum(desvio / media, 1)
+
+    cobrancas_mes = np.bincount(grupo_ids, weights=contagens, minlength=num_grupos) / num_meses
+    pontuacao = cobertura * (0.5 + 0.5 * regularidade) * (1 - variacao)
+
+    return [
+        {
+            'chave': chave,
+            'estabelecimento': estado['grupos'][chave]['estabelecimento'],
+            'descricao': estado['grupos'][chave]['descricao'],
+            'categoria': estado['grupos'][chave]['categoria'],
+            'meses': int(num_meses[i]),
+            'ultimo_mes': mes_do_ordinal(int(ultimo[i])),
+            'valor_medio': int(round(media[i])),
+            'cobrancas_mes': float(cobrancas_mes[i]),
+            'pontuacao': float(pontuacao[i])
+        }
+        for i, chave in enumerate(chaves)
+    ]
+
+def sugerir_gastos_fixos(dados=None):
+    """
+    Sugere como gastos fixos as cobranças que se repetem todo mês e ainda
+    não estão cadastradas nem foram ignoradas pelo usuário.
+
+    Parte do estado gravado e atualiza só em memória os meses alterados;
+    quem grava o estado é sincronizar_recorrencias, ao salvar faturas.
+    """
+    if dados is None:
+        dados = carregar_dados()
+    estado = _carregar_estado()
+    _atualizar_estado(estado, dados)
+    if not estado['faturas']:
+        return []
+
+    ultimo_mes_dados = max(int(chave) for chave in estado['faturas'])
+    ja_fixos = {normalizar_estabelecimento(g['descricao']) for g in dados.get('gastos_fixos', [])}
+    ignorados = set(dados.get('recorrencias_ignoradas', []))
+
+    sugestoes = []
+    for grupo in pontuar_grupos(estado):
+        ativo = ordinal_mes(*grupo['ultimo_mes']) >= ultimo_mes_dados - 1
+        if (grupo['meses'] >= MINIMO_MESES and
+                grupo['pontuacao'] >= PONTUACAO_MINIMA and
+                grupo['cobrancas_mes'] <= MAXIMO_COBRANCAS_MES and
+                ativo and
+                grupo['estabelecimento'] not in ja_fixos and
+                grupo['chave'] not in ignorados):
+            sugestoes.append(grupo)
+
+    return sorted(sugestoes, key=lambda g: g['pontuacao'], reverse=True)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _sugestoes_em_cache(versao):
+    """Guarda as sugestões calculadas para uma versão específica dos dados"""
+    return sugerir_gastos_fixos()
+
+def obter_sugestoes_gastos_fixos():
+    """Retorna as sugestões de gastos fixos, recalculando apenas quando os dados mudam"""
+    return _sugestoes_em_cache(obter_versao_dados())
+
+def ignorar_sugestao(chave):
+    """Registra que o usuário não quer ver mais uma sugestão"""
+    def ignorar(dados):
+        ignorados = dados.setdefault('recorrencias_ignoradas', [])
+        if chave not in ignorados:
+            ignorados.append(chave)
+
+    atualizar_dados(ignorar)
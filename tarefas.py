@@ -0,0 +1,231 @@
+"""
+Execução de operações longas em segundo plano.
+
+As tarefas rodam em um pool de threads compartilhado pelo processo, fora
+da thread do script do Streamlit: a interface continua respondendo e a
+tarefa sobrevive a um rerun ou a um recarregamento da página. Cada usuário
+tem sua tabela de tarefas, com progresso, resultado parcial e pedido de
+cancelamento. A interface consulta o estado com painel_tarefas().
+
+As funções executadas não têm acesso ao st.session_state: devem receber
+explicitamente o caminho do arquivo de dados e gravar o resultado no fim
+com atualizar_dados(), sem manter o arquivo travado durante o cálculo.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from perfil import medir_fragmento
+
+# Tarefas executadas ao mesmo tempo no processo (as demais esperam na fila)
+MAXIMO_TRABALHADORES = 2
+# Tarefas terminadas mantidas na tabela de cada usuário
+MAXIMO_TERMINADAS = 5
+# Intervalo de atualização do painel enquanto há tarefas ativas (segundos)
+INTERVALO_PAINEL = 1
+
+class TarefaCancelada(Exception):
+    """Levantada dentro da tarefa quando o usuário pede o cancelamento"""
+
+class Tarefa:
+    """Estado de uma tarefa, compartilhado entre a thread de trabalho e a interface"""
+
+    def __init__(self, usuario, nome, titulo, painel=True):
+        self.id = uuid.uuid4().hex[:8]
+        self.usuario = usuario
+        self.nome = nome
+        self.titulo = titulo
+        # Tarefas acompanhadas em outro lugar (ex: envio de fatura na própria aba) ficam fora do painel
+        self.painel = painel
+        self.estado = 'na fila'  # na fila, executando, concluída, cancelada, erro
+        self.progresso = 0.0
+        self.mensagem = ''
+        self.parcial = None
+        self.resultado = None
+        self.erro = None
+        self.criada_em = time.time()
+        self.terminada_em = None
+        # Indica se a interface já mostrou o fim da tarefa (e recarregou os dados)
+        self.avisada = False
+        self._cancelamento = threading.Event()
+
+    @property
+    def ativa(self):
+        return self.estado in ('na fila', 'executando')
+
+    def informar(self, progresso, mensagem=None, parcial=None):
+        """
+        Atualiza o progresso (0 a 1), a mensagem e o resultado parcial.
+        Deve ser chamada periodicamente pela tarefa: é onde o cancelamento é atendido.
+        """
+        if self._cancelamento.is_set():
+            raise TarefaCancelada()
+        self.progresso = min(max(progresso, 0.0), 1.0)
+        if mensagem is not None:
+            self.mensagem = mensagem
+        if parcial is not None:
+            self.parcial = parcial
+
+    def cancelar(self):
+        """Pede o cancelamento; a tarefa para no próximo informar()"""
+        self._cancelamento.set()
+
+@st.cache_resource
+def _gerenciador():
+    """Pool de threads e tabela de tarefas por usuário, compartilhados pelo processo"""
+    executor = ThreadPoolExecutor(max_workers=MAXIMO_TRABALHADORES, thread_name_prefix='tarefa')
+    return executor, {}, threading.Lock()
+
+def _executar(tarefa, funcao, args, kwargs):
+    """Roda a função da tarefa na thread de trabalho e registra o desfecho"""
+    if tarefa._cancelamento.is_set():
+        tarefa.estado = 'cancelada'
+        tarefa.terminada_em = time.time()
+        return
+    tarefa.estado = 'executando'
+    try:
+        tarefa.resultado = funcao(*args, tarefa=tarefa, **kwargs)
+        tarefa.progresso = 1.0
+        tarefa.estado = 'concluída'
+    except TarefaCancelada:
+        tarefa.estado = 'cancelada'
+    except Exception as e:
+        tarefa.erro = f"{type(e).__name__}: {e}"
+        tarefa.estado = 'erro'
+    finally:
+        tarefa.terminada_em = time.time()
+
+def iniciar_tarefa(usuario, nome, titulo, funcao, *args, painel=True, reaproveitar=False, **kwargs):
+    """
+    Coloca uma tarefa na fila do pool.
+
+    Se o usuário já tem uma tarefa ativa com o mesmo nome, ela é devolvida
+    em vez de começar outra igual.
+
+    Args:
+        usuario (str): Dono da tarefa
+        nome (str): Identificador da tarefa (ex: 'reaplicar_regras')
+        titulo (str): Texto mostrado no painel
+        funcao (callable): Recebe *args, **kwargs e tarefa=Tarefa
+        painel (bool): Se a tarefa aparece no painel da barra lateral
+        reaproveitar (bool): Devolve também uma tarefa já concluída com o mesmo
+            nome, em vez de executar de novo (canceladas e com erro rodam outra vez)
+
+    Returns:
+        Tarefa: A tarefa criada (ou a já existente)
+    """
+    executor, tabela, trava = _gerenciador()
+    with trava:
+        tarefas = tabela.setdefault(usuario, OrderedDict())
+        for existente in tarefas.values():
+            if existente.nome == nome and (existente.ativa or (reaproveitar and existente.estado == 'concluída')):
+                return existente
+
+        tarefa = Tarefa(usuario, nome, titulo, painel)
+        tarefas[tarefa.id] = tarefa
+        terminadas = [t.id for t in tarefas.values() if not t.ativa]
+        for antiga in terminadas[:max(0, len(terminadas) - MAXIMO_TERMINADAS)]:
+            del tarefas[antiga]
+
+    executor.submit(_executar, tarefa, funcao, args, kwargs)
+    return tarefa
+
+def tarefas_do_usuario(usuario, somente_painel=False):
+    """Retorna as tarefas do usuário, da mais antiga para a mais recente"""
+    _, tabela, trava = _gerenciador()
+    with trava:
+        tarefas = list(tabela.get(usuario, {}).values())
+    if somente_painel:
+        return [t for t in tarefas if t.painel]
+    return tarefas
+
+def obter_tarefa(usuario, id_tarefa):
+    """Retorna uma tarefa do usuário pelo id, ou None se ela já saiu da tabela"""
+    _, tabela, trava = _gerenciador()
+    with trava:
+        return tabela.get(usuario, {}).get(id_tarefa)
+
+def dispensar_terminadas(usuario):
+    """Remove da tabela as tarefas do usuário que já terminaram"""
+    _, tabela, trava = _gerenciador()
+    with trava:
+        tarefas = tabela.get(usuario, {})
+        for id_tarefa in [t.id for t in tarefas.values() if t.painel and not t.ativa]:
+            del tarefas[id_tarefa]
+
+def _mostrar_tarefa(tarefa):
+    """Linha do painel para uma tarefa"""
+    if tarefa.ativa:
+        texto = f"{tarefa.titulo}: {tarefa.mensagem}" if tarefa.mensagem else tarefa.titulo
+        st.progress(tarefa.progresso, text=texto)
+        # Resultado parcial informado pela tarefa (ex: {'atualizadas': 12})
+        if isinstance(tarefa.parcial, dict) and tarefa.parcial:
+            st.caption("Até agora: " + ", ".join(f"{valor} {chave}" for chave, valor in tarefa.parcial.items()))
+        if st.button("Cancelar", key=f"cancelar_tarefa_{tarefa.id}"):
+            tarefa.cancelar()
+    elif tarefa.estado == 'concluída':
+        st.success(f"✓ {tarefa.titulo}: {tarefa.mensagem or 'concluída'}")
+    elif tarefa.estado == 'cancelada':
+        st.info(f"{tarefa.titulo}: cancelada, nada foi alterado")
+    else:
+        st.error(f"{tarefa.titulo}: {tarefa.erro}")
+
+@st.fragment(run_every=INTERVALO_PAINEL)
+@medir_fragmento
+def _painel_ativo(usuario):
+    """Painel atualizado periodicamente enquanto há tarefas ativas"""
+    tarefas = tarefas_do_usuario(usuario, somente_painel=True)
+    for tarefa in tarefas:
+        _mostrar_tarefa(tarefa)
+    # Uma tarefa terminou: rerun completo para recarregar os dados gravados por ela
+    # e trocar para o painel sem atualização periódica
+    terminou = [t for t in tarefas if not t.ativa and not t.avisada]
+    if terminou or not any(t.ativa for t in tarefas):
+        for tarefa in terminou:
+            tarefa.avisada = True
+        st.rerun()
+
+def painel_tarefas(usuario):
+    """
+    Mostra as tarefas do usuário. Só consulta o estado periodicamente
+    enquanto alguma tarefa está ativa.
+    """
+    tarefas = tarefas_do_usuario(usuario, somente_painel=True)
+    if not tarefas:
+        return
+    st.write("**Tarefas em segundo plano**")
+    if any(t.ativa for t in tarefas):
+        _painel_ativo(usuario)
+        return
+    for tarefa in tarefas:
+        tarefa.avisada = True
+        _mostrar_tarefa(tarefa)
+    if st.button("Dispensar", key="dispensar_tarefas"):
+        dispensar_terminadas(usuario)
+        st.rerun()
+
+@st.fragment(run_every=INTERVALO_PAINEL)
+@medir_fragmento
+def _acompanhar_ativa(usuario, id_tarefa):
+    """Progresso de uma tarefa, atualizado periodicamente até ela terminar"""
+    tarefa = obter_tarefa(usuario, id_tarefa)
+    if tarefa is None:
+        return
+    _mostrar_tarefa(tarefa)
+    if not tarefa.ativa and not tarefa.avisada:
+        tarefa.avisada = True
+        st.rerun()
+
+def acompanhar_tarefa(tarefa):
+    """
+    Mostra uma tarefa no lugar onde foi iniciada (ex: dentro de uma aba).
+    Enquanto ela está ativa, só este trecho é atualizado; ao terminar, a página
+    inteira roda de novo para usar o resultado.
+    """
+    if tarefa.ativa:
+        _acompanhar_ativa(tarefa.usuario, tarefa.id)
+    else:
+        tarefa.avisada = True
+        _mostrar_tarefa(tarefa)